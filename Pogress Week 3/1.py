@@ -5,12 +5,20 @@ import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import os
+import sys
+
+# agar paket harmonica di root repository bisa diimport
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harmonica.gui import ComputeWorker
+
 matplotlib.use("TkAgg")
 
 
 # Variabel global & konstanta
 sources = []         # daftar tuple: (nama, x, z, rho)
 cbar = None
+worker = None        # worker latar belakang (dibuat setelah root)
 G = 6.67430e-11      # konstanta gravitasi (SI)
 # Jika ingin range warna tetap, isi ini; jika tidak biarkan None untuk autoscale
 COLOR_MIN = None
@@ -26,21 +34,20 @@ def gravity_anomaly_xy(x, y, z, rho):
 
 
 # Memperbarui / Menggambar Plot
+# perhitungan dilakukan di thread latar belakang agar jendela tidak hang;
+# hasilnya digambar di thread Tk lewat polling root.after
 def update_plot():
-    global cbar, fig, ax_map, ax_profile
-
-    ax_map.cla()
-    ax_profile.cla()
-
-    # Jika belum ada sumber, tampilkan pesan
     if not sources:
-        ax_map.text(0.5, 0.5, "Belum ada sumber ditambahkan",
-                    ha='center', va='center', transform=ax_map.transAxes,
-                    fontsize=14, color='gray')
-        ax_map.set_xticks([]); ax_map.set_yticks([])
-        canvas.draw_idle()
+        worker.cancel()  # buang hasil perhitungan yang masih berjalan
+        draw_field(None)
         return
 
+    # kirim salinan daftar sumber: permintaan lama otomatis digantikan
+    worker.submit(list(sources))
+
+
+def compute_field(snapshot):
+    # berjalan di thread worker: jangan menyentuh widget Tk di sini
     # grid (grid kasar untuk perhitungan model)
     x = np.linspace(-200, 200, 600)
     y = np.linspace(-200, 200, 600)
@@ -48,14 +55,34 @@ def update_plot():
     Z_total = np.zeros_like(X)
 
     # penjumlahan kontribusi semua sumber (superposisi)
-    for (_, x0, z0, rho0) in sources:
+    for (_, x0, z0, rho0) in snapshot:
         Z_total += gravity_anomaly_xy(X - x0, Y, z0, rho0)
 
     # profil anomali pada garis y=0
     g_profile = np.zeros_like(x)
-    for (_, x0, z0, rho0) in sources:
+    for (_, x0, z0, rho0) in snapshot:
         g_profile += gravity_anomaly_xy(x - x0, 0, z0, rho0)
 
+    return snapshot, x, y, Z_total, g_profile
+
+
+def draw_field(result):
+    global cbar, fig, ax_map, ax_profile
+
+    ax_map.cla()
+    ax_profile.cla()
+
+    # Jika belum ada sumber, tampilkan pesan
+    if result is None:
+        ax_map.text(0.5, 0.5, "Belum ada sumber ditambahkan",
+                    ha='center', va='center', transform=ax_map.transAxes,
+                    fontsize=14, color='gray')
+        ax_map.set_xticks([]); ax_map.set_yticks([])
+        canvas.draw_idle()
+        return
+
+    snapshot, x, y, Z_total, g_profile = result
+
     # autoscale vmin/vmax kecuali user menentukan sendiri
     if COLOR_MIN is None or COLOR_MAX is None:
         vmin = np.min(Z_total)
@@ -75,7 +102,7 @@ def update_plot():
     ax_map.set_xlabel("X (m)"); ax_map.set_ylabel("Y (m)")
 
     # gambar posisi sumber
-    for (name, x0, z0, rho0) in sources:
+    for (name, x0, z0, rho0) in snapshot:
         ax_map.scatter(x0, 0, color='black', s=40, zorder=5)
         ax_map.text(x0 + 5, 5,
                     f"{name}\nx={x0:.1f}, z={z0:.1f}, ρ={rho0:.0f}",
@@ -214,6 +241,9 @@ def on_right_configure(event):
 root = tk.Tk()
 root.title("Forward Modelling Gravitasi (Interaktif, Multi-Sumber)")
 
+# worker latar belakang untuk perhitungan medan
+worker = ComputeWorker(root, compute_field, draw_field)
+
 # buka jendela dengan mode diperbesar
 try:
     root.state("zoomed")
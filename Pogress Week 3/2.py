@@ -11,97 +11,171 @@ import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import csv
 import os
+import sys
+
+# make the harmonica package in the repository root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harmonica.gui import (BufferPool, ComputeWorker, FrameScheduler, ProfileEditor,
+                           SourceList, viewport_resolution)
+from harmonica.export import write_grid, write_sources
+from harmonica.sources import SourceHistory, SourceStore, read_sources
+from harmonica.superposition import FieldLayerCache, gravity_grid_blocks, sample_polyline
 
 matplotlib.use("TkAgg")
 
 # -------------------------------
 # Configuration / Globals
 # -------------------------------
-sources = []         # list of tuples: (name, x, z, rho)
+sources = SourceStore()  # columnar (name, x, z, rho) store, indexed like a list of tuples
+history = SourceHistory(sources)  # undo / redo of the source edits (copy-on-write snapshots)
 cbar = None
-G = 6.67430e-11      # gravitational constant (SI)
+map_image = None      # persistent map artists, created once by init_artists()
+source_markers = None
+source_labels = []
+profile_lines = []    # one line per profile on ax_profile
+empty_text = None
 COLOR_MIN = None
 COLOR_MAX = None
+buffers = BufferPool()  # preallocated map / profile outputs, reused between redraws
+worker = None        # background ComputeWorker, created with the root window
+layers = FieldLayerCache()  # per-source map layers + running total (worker thread only)
+resizing = False     # True while the window is being resized
+scheduler = None     # FrameScheduler: resize / compute / draw at most once per frame
+profile_editor = None  # ProfileEditor: profile polylines drawn on the map with the mouse
 
 # default plotting params
 DEFAULT_CMAP = 'viridis'
 DEFAULT_INTERP = 'bicubic'  # or 'nearest'
+MAX_RES = 1024       # max grid points per axis (map pixels beyond it are interpolated)
+RESIZE_RES = 128     # max grid points per axis while the window is being resized
+MAX_LABELS = 50      # source labels are only drawn for up to this many sources
+RESIZE_SETTLE_MS = 200  # resize is over after this long without <Configure> events
+PROFILE_SAMPLES = 512  # points per profile (independent of the map resolution)
 
 # -------------------------------
-# Physics: point-mass vertical component (mGal)
+# Plotting / UI logic
 # -------------------------------
 
-def gravity_anomaly_xy(x, y, z, rho):
-    """Return g_z in mGal for point mass/density rho at relative offset (x,y,z).
+def sample_profiles(profile_list, extent):
+    """Sample the profiles densely, independently of the map resolution.
 
-    Note: z should be the vertical separation (obs_z - source_z). If you store
-    source.depth as positive down, remember to convert when calling.
+    profile_list: drawn polylines (easting, northing vertices); when empty,
+    the y=0 line across the map is used
+    returns: px, py (points), axis (X, or distance along each drawn profile)
+    and owner (index of the profile of each point), concatenated over profiles
     """
-    r3 = (x**2 + y**2 + z**2) ** 1.5
-    # avoid division by zero singularity by small epsilon
-    r3 = np.where(r3 == 0, 1e-20, r3)
-    return G * rho * z / r3 * 1e5
+    if not profile_list:
+        px, py, _ = sample_polyline([-extent, extent], [0.0, 0.0], size=PROFILE_SAMPLES)
+        return px, py, px, np.zeros(px.size, dtype=int)
+    samples = [sample_polyline(vx, vy, size=PROFILE_SAMPLES) for vx, vy in profile_list]
+    px, py, axis = (np.concatenate(i) for i in zip(*samples))
+    owner = np.repeat(np.arange(len(samples)), PROFILE_SAMPLES)
+    return px, py, axis, owner
 
 
-# -------------------------------
-# Plotting / UI logic
-# -------------------------------
-
-def compute_field(resolution, extent=200, interpolation=DEFAULT_INTERP, cmap=DEFAULT_CMAP):
+def compute_field(resolution, extent=200, interpolation=DEFAULT_INTERP, cmap=DEFAULT_CMAP,
+                  source_list=None, profile_list=()):
     """Compute grid (X,Y) and total Z_total from current sources.
-    resolution: int, number of points per axis
+    resolution: (nx, ny), number of points along x and y (see viewport_resolution)
     extent: half-width in meters for both +X and +Y
-    returns: x, y, X, Y, Z_total, g_profile
+    source_list: snapshot of the sources (default: the global `sources`)
+    profile_list: snapshot of the drawn profiles (see sample_profiles)
+    returns: x, y, X, Y, Z_total, g_profile, profile_axis, profile_owner
     """
-    # create observation grid
-    x = np.linspace(-extent, extent, resolution)
-    y = np.linspace(-extent, extent, resolution)
-    X, Y = np.meshgrid(x, y)
-    Z_total = np.zeros_like(X)
+    # create observation grid (sparse: only x and y are needed for the map)
+    nx, ny = resolution
+    x = np.linspace(-extent, extent, nx)
+    y = np.linspace(-extent, extent, ny)
+    X, Y = np.meshgrid(x, y, sparse=True)
 
-    # sum contributions
-    for (_, x0, z0, rho0) in sources:
-        Z_total += gravity_anomaly_xy(X - x0, Y - 0.0, z0, rho0)
+    if source_list is None:
+        source_list = sources
 
-    # profile along y=0
-    g_profile = np.zeros_like(x)
-    for (_, x0, z0, rho0) in sources:
-        g_profile += gravity_anomaly_xy(x - x0, 0.0, z0, rho0)
+    # map + all profiles in the same batch: only the sources added, edited or
+    # deleted since the last redraw are evaluated (full compiled pass when the
+    # grid or the profiles change), copied into buffers reused between redraws
+    px, py, profile_axis, profile_owner = sample_profiles(profile_list, extent)
+    Z_total, g_profile = buffers.take((ny, nx), px.size)
+    grid, profile = layers.total(
+        x, y, (source_list.x, source_list.y, source_list.z, source_list.rho),
+        profile=(px, py))
+    np.copyto(Z_total, grid)
+    np.copyto(g_profile, profile)
 
-    return x, y, X, Y, Z_total, g_profile
+    return x, y, X, Y, Z_total, g_profile, profile_axis, profile_owner
 
 
 def update_plot():
-    """Refresh matplotlib axes with current sources and UI parameters."""
-    global cbar
-    ax_map.cla()
-    ax_profile.cla()
-
+    """Request a redraw: the field is computed by the background worker."""
     if not sources:
-        ax_map.text(0.5, 0.5, "Belum ada sumber ditambahkan",
-                    ha='center', va='center', transform=ax_map.transAxes,
-                    fontsize=14, color='gray')
-        ax_map.set_xticks([]); ax_map.set_yticks([])
-        canvas.draw_idle()
+        worker.cancel()
+        draw_field(None)
         return
 
     # read UI controls
     try:
-        res = int(scale_res.get())
         extent = float(entry_extent.get())
     except Exception:
-        res = 400
         extent = 200
 
-    cmap = cmap_var.get() or DEFAULT_CMAP
-    interp_on = interp_var.get()
-    interp = 'bicubic' if interp_on else 'nearest'
+    # as many grid points as the map has pixels on screen
+    res = viewport_resolution(ax_map, max_size=RESIZE_RES if resizing else MAX_RES)
+
+    # snapshot the sources: they may be edited while the worker computes
+    worker.submit(sources.copy(), res, extent, list(profile_editor.profiles))
+
 
-    # compute field
-    x, y, X, Y, Z_total, g_profile = compute_field(resolution=res, extent=extent,
-                                                    interpolation=interp, cmap=cmap)
+def compute_request(snapshot, res, extent, profile_list):
+    """Runs on the worker thread: compute the field (no Tk calls here)."""
+    field = compute_field(resolution=res, extent=extent, source_list=snapshot,
+                          profile_list=profile_list)
+    return snapshot, len(profile_list), field
+
+
+def current_style():
+    """Colormap and interpolation chosen in the UI (styling only, no recompute)."""
+    return cmap_var.get() or DEFAULT_CMAP, DEFAULT_INTERP
+
+
+def init_artists():
+    """Create the map, colorbar and profile artists once; redraws update them in place."""
+    global map_image, cbar, source_markers, empty_text
+    cmap, interp = current_style()
+    map_image = ax_map.imshow(np.zeros((2, 2)), extent=[-200, 200, -200, 200],
+                              origin='lower', cmap=cmap, interpolation=interp,
+                              aspect='auto', visible=False)
+    cbar = fig.colorbar(map_image, ax=ax_map, fraction=0.046, pad=0.04)
+    cbar.set_label('g_z (mGal)')
+    source_markers = ax_map.scatter([], [], color='black', s=40, zorder=5)
+    empty_text = ax_map.text(0.5, 0.5, "Belum ada sumber ditambahkan",
+                             ha='center', va='center', transform=ax_map.transAxes,
+                             fontsize=14, color='gray')
+    ax_map.set_title("Peta Anomali Gravitasi (g_z) [mGal]")
+    ax_map.set_xlabel("X (m)"); ax_map.set_ylabel("Y (m)")
+
+    ax_profile.set_title("Profil g_z Sepanjang Sumbu X (Y=0)")
+    ax_profile.set_xlabel("X (m)"); ax_profile.set_ylabel("g_z (mGal)")
+    ax_profile.grid(True, linestyle="--", alpha=0.5)
+
+
+def draw_field(request):
+    """Runs on the Tk thread: update the artists with a computed field, or show the empty message."""
+    global source_labels
+    for label in source_labels:
+        label.remove()
+    source_labels = []
+
+    if request is None:
+        map_image.set_visible(False)
+        source_markers.set_offsets(np.empty((0, 2)))
+        for line in profile_lines:
+            line.set_data([], [])
+        empty_text.set_visible(True)
+        scheduler.request('draw', canvas.draw)
+        return
+
+    snapshot, drawn, (x, y, X, Y, Z_total, g_profile, profile_axis, profile_owner) = request
 
     # vmin/vmax handling
     if COLOR_MIN is None or COLOR_MAX is None:
@@ -112,100 +186,150 @@ def update_plot():
     else:
         vmin = COLOR_MIN; vmax = COLOR_MAX
 
-    # draw heatmap
-    im = ax_map.imshow(Z_total, extent=[x.min(), x.max(), y.min(), y.max()],
-                       origin='lower', cmap=cmap, interpolation=interp,
-                       vmin=vmin, vmax=vmax, aspect='auto')
+    # update the heatmap in place (set_data keeps its own copy of the grid)
+    cmap, interp = current_style()
+    extent = [x.min(), x.max(), y.min(), y.max()]
+    map_image.set_data(Z_total)
+    map_image.set_extent(extent)
+    map_image.set_clim(vmin, vmax)
+    map_image.set_cmap(cmap)
+    map_image.set_interpolation(interp)
+    map_image.set_visible(True)
+    empty_text.set_visible(False)
+    ax_map.set_xlim(extent[:2]); ax_map.set_ylim(extent[2:])
+
+    # sources markers and labels
+    source_markers.set_offsets(np.column_stack([snapshot.x, snapshot.y]))
+    for (name, x0, z0, rho0) in (snapshot if len(snapshot) <= MAX_LABELS else ()):
+        source_labels.append(ax_map.text(
+            x0 + 0.02 * (x.max()-x.min()), 0.02 * (y.max()-y.min()),
+            f"{name}\nx={x0:.1f}, z={z0:.1f}, ρ={rho0:.0f}",
+            color='white', fontsize=8, weight='bold', zorder=6,
+            bbox=dict(facecolor='black', alpha=0.0, pad=0)))
+
+    # profile lines: one per drawn profile (same colors as on the map), or y=0
+    count = max(drawn, 1)
+    while len(profile_lines) < count:
+        profile_lines.append(ax_profile.plot([], [], linewidth=2)[0])
+    while len(profile_lines) > count:
+        profile_lines.pop().remove()
+    for i, line in enumerate(profile_lines):
+        line.set_data(profile_axis[profile_owner == i], g_profile[profile_owner == i])
+        line.set_color(ProfileEditor.color(i) if drawn else 'purple')
+    if drawn:
+        ax_profile.set_title(f"Profil g_z Sepanjang Lintasan P1-P{drawn}")
+        ax_profile.set_xlabel("Jarak sepanjang profil (m)")
+    else:
+        ax_profile.set_title("Profil g_z Sepanjang Sumbu X (Y=0)")
+        ax_profile.set_xlabel("X (m)")
+    ax_profile.set_xlim(profile_axis.min(), profile_axis.max())
+    ax_profile.relim(); ax_profile.autoscale_view()
+    ax_profile.set_ylim(bottom=min(0.0, np.nanmin(g_profile)), auto=None)
 
-    ax_map.set_title("Peta Anomali Gravitasi (g_z) [mGal]")
-    ax_map.set_xlabel("X (m)"); ax_map.set_ylabel("Y (m)")
+    scheduler.request('draw', canvas.draw)
+    # the artists keep copies of the data, so the buffers can be reused
+    buffers.give(Z_total, g_profile)
 
-    # plot sources markers and labels
-    for (name, x0, z0, rho0) in sources:
-        ax_map.scatter(x0, 0, color='black', s=40, zorder=5)
-        ax_map.text(x0 + 0.02 * (x.max()-x.min()), 0.02 * (y.max()-y.min()),
-                    f"{name}\nx={x0:.1f}, z={z0:.1f}, ρ={rho0:.0f}",
-                    color='white', fontsize=8, weight='bold', zorder=6,
-                    bbox=dict(facecolor='black', alpha=0.0, pad=0))
-
-    # persistent single colorbar: remove old then create new
-    if cbar is not None:
-        try:
-            cbar.remove()
-        except Exception:
-            pass
-        cbar = None
-
-    cbar = fig.colorbar(im, ax=ax_map, fraction=0.046, pad=0.04)
-    cbar.set_label('g_z (mGal)')
 
-    # profile plot
-    ax_profile.plot(x, g_profile, color='purple', linewidth=2)
-    ax_profile.set_title("Profil g_z Sepanjang Sumbu X (Y=0)")
-    ax_profile.set_xlabel("X (m)"); ax_profile.set_ylabel("g_z (mGal)")
-    ax_profile.grid(True, linestyle="--", alpha=0.5)
-    ax_profile.set_ylim(bottom=min(0.0, np.nanmin(g_profile)))
+def restyle(event=None):
+    """Apply colormap / interpolation changes to the drawn map without recomputing the field."""
+    cmap, interp = current_style()
+    map_image.set_cmap(cmap)
+    map_image.set_interpolation(interp)
+    blit_map()
 
-    canvas.draw_idle()
 
+def blit_map():
+    """Redraw only the map, its overlays and the colorbar (blitting), not the whole figure."""
+    if not map_image.get_visible():
+        return
+    try:
+        for artist in (map_image, source_markers, *source_labels):
+            ax_map.draw_artist(artist)
+        cbar.ax.draw_artist(cbar.solids)
+        canvas.blit(ax_map.bbox)
+        canvas.blit(cbar.ax.bbox)
+    except Exception:
+        scheduler.request('draw', canvas.draw)
 
 # -------------------------------
-# File IO: import/export simple CSV format
-# CSV format expected: name,x,z,rho  (header optional)
+# File IO: import CSV/TXT/Excel (name,x,z,rho, header optional),
+# export sources (CSV or binary) and the map grid (binary)
 # -------------------------------
 
 def import_sources():
-    fname = filedialog.askopenfilename(title='Import sources (CSV/TXT)',
-                                       filetypes=[('CSV files','*.csv'), ('Text files','*.txt'), ('All','*.*')])
+    fname = filedialog.askopenfilename(title='Import sources (CSV/TXT/Excel)',
+                                       filetypes=[('CSV files','*.csv'), ('Text files','*.txt'),
+                                                  ('Excel files','*.xlsx *.xls'), ('All','*.*')])
     if not fname:
         return
     try:
-        new = []
-        with open(fname, 'r', newline='') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                if not row:
-                    continue
-                # allow header: detect non-numeric in 2nd column
-                try:
-                    name = row[0].strip()
-                    x = float(row[1]); z = float(row[2]); rho = float(row[3])
-                except Exception:
-                    # skip header or malformed
-                    continue
-                new.append((name, x, z, rho))
-        if not new:
-            messagebox.showwarning('Import', 'Tidak menemukan data sumber yang valid di file.')
-            return
-        # append to existing list and update listbox
-        start = len(sources)
-        sources.extend(new)
-        for (name,x,z,rho) in new:
-            listbox.insert(tk.END, f"{name}: x={x:.1f}, z={z:.1f}, ρ={rho:.0f}")
-        update_plot()
-        messagebox.showinfo('Import', f'Berhasil mengimpor {len(new)} sumber dari:\n{os.path.basename(fname)}')
+        # whole columns parsed and validated at once (header optional)
+        names, x, z, rho, bad_rows = read_sources(fname)
     except Exception as e:
         messagebox.showerror('Import error', str(e))
+        return
+    if bad_rows.size:
+        shown = ', '.join(str(i) for i in bad_rows[:10]) + (', ...' if bad_rows.size > 10 else '')
+        messagebox.showwarning('Import', f'{bad_rows.size} baris tidak valid dilewati (baris data {shown}).')
+    if not x.size:
+        messagebox.showwarning('Import', 'Tidak menemukan data sumber yang valid di file.')
+        return
+    # append to the store in one go (the list only formats its visible rows)
+    history.record()
+    sources.extend_arrays(names, x, z, rho)
+    source_table.refresh()
+    update_plot()
+    messagebox.showinfo('Import', f'Berhasil mengimpor {x.size} sumber dari:\n{os.path.basename(fname)}')
 
 
 def export_sources():
     if not sources:
         messagebox.showerror('Export', 'Tidak ada sumber untuk diexport.')
         return
-    fname = filedialog.asksaveasfilename(defaultextension='.csv', filetypes=[('CSV','*.csv')])
+    fname = filedialog.asksaveasfilename(defaultextension='.csv',
+                                         filetypes=[('CSV','*.csv'), ('NumPy (biner)','*.npz'),
+                                                    ('NetCDF / HDF5','*.nc *.h5')])
     if not fname:
         return
     try:
-        with open(fname, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['name','x','z','rho'])
-            for (name,x,z,rho) in sources:
-                writer.writerow([name,x,z,rho])
+        # columns written straight from the store (binary, or CSV in blocks of rows)
+        write_sources(fname, sources)
         messagebox.showinfo('Export', f'Saved sources to:\n{fname}')
     except Exception as e:
         messagebox.showerror('Export error', str(e))
 
 
+def export_grid():
+    """Save the map grid (same extent / resolution as on screen) to a binary file.
+
+    The grid is computed and written block by block of rows, so only the
+    coordinates of the rows / columns and the values are stored and the
+    full grid is never held in memory.
+    """
+    if not sources:
+        messagebox.showerror('Export', 'Tidak ada sumber untuk diexport.')
+        return
+    fname = filedialog.asksaveasfilename(defaultextension='.nc',
+                                         filetypes=[('NetCDF / HDF5','*.nc *.h5'), ('NumPy','*.npz *.npy'),
+                                                    ('Zarr (direktori)','*.zarr')])
+    if not fname:
+        return
+    try:
+        extent = float(entry_extent.get())
+    except Exception:
+        extent = 200.0
+    nx, ny = viewport_resolution(ax_map, max_size=MAX_RES)
+    x = np.linspace(-extent, extent, nx)
+    y = np.linspace(-extent, extent, ny)
+    try:
+        blocks = gravity_grid_blocks(x, y, (sources.x, sources.y, sources.z, sources.rho))
+        write_grid(fname, x, y, blocks)
+        messagebox.showinfo('Export', f'Saved {ny} x {nx} grid to:\n{fname}')
+    except Exception as e:
+        messagebox.showerror('Export error', str(e))
+
+
 # -------------------------------
 # UI callbacks for source management
 # -------------------------------
@@ -227,8 +351,10 @@ def add_point():
         if rho_val == 0:
             messagebox.showerror('Input error', 'Nilai ρ tidak boleh 0')
             return
+        history.record()
         sources.append((name_val, x_val, z_val, rho_val))
-        listbox.insert(tk.END, f"{name_val}: x={x_val:.1f}, z={z_val:.1f}, ρ={rho_val:.0f}")
+        source_table.refresh()
+        source_table.see(len(sources) - 1)
         clear_inputs() 
         update_plot()
     except ValueError:
@@ -236,28 +362,27 @@ def add_point():
 
 
 def delete_selected():
-    sel = listbox.curselection()
+    sel = source_table.curselection()
     if not sel:
         messagebox.showerror('Error', 'Pilih item dulu!')
         return
     idx = sel[0]
+    history.record()
     sources.pop(idx)
-    listbox.delete(idx)
+    source_table.selection_clear()
+    source_table.refresh()
     update_plot()
 
 
 def clear_points():
     if messagebox.askyesno('Confirm', 'Hapus semua sumber?'):
+        history.record()
         sources.clear()
-        listbox.delete(0, tk.END)
+        source_table.refresh()
         update_plot()
 
 
-def on_select(event):
-    sel = listbox.curselection()
-    if not sel:
-        return
-    idx = sel[0]
+def on_select(idx):
     name, x0, z0, rho0 = sources[idx]
     entry_name.delete(0, tk.END); entry_name.insert(0, str(name))
     entry_x.delete(0, tk.END); entry_x.insert(0, str(x0))
@@ -266,7 +391,7 @@ def on_select(event):
 
 
 def update_selected():
-    sel = listbox.curselection()
+    sel = source_table.curselection()
     if not sel:
         messagebox.showerror('Error', 'Pilih item dulu!')
         return
@@ -279,12 +404,20 @@ def update_selected():
     except ValueError:
         messagebox.showerror('Input error', 'Masukkan angka valid!')
         return
+    history.record()
     sources[idx] = (name_val, x_val, z_val, rho_val)
-    listbox.delete(idx)
-    listbox.insert(idx, f"{name_val}: x={x_val:.1f}, z={z_val:.1f}, ρ={rho_val:.0f}")
+    source_table.refresh()
     update_plot()
 
 
+def apply_history(step):
+    """Undo / redo a change to the sources (step: history.undo or history.redo)."""
+    if step():
+        source_table.selection_clear()
+        source_table.refresh()
+        update_plot()
+
+
 # -------------------------------
 # Save figure
 # -------------------------------
@@ -303,14 +436,32 @@ def save_plot():
 # Resize handler
 # -------------------------------
 def on_right_configure(event):
+    # <Configure> comes in bursts while resizing: only the latest size is
+    # applied, at most once per frame
+    scheduler.request('resize', resize_figure, event.width, event.height)
+
+
+def resize_figure(width, height):
+    global resizing
     try:
         dpi = fig.get_dpi()
-        w_in = max(4, event.width / dpi)
-        h_in = max(3, event.height / dpi)
+        w_in = max(4, width / dpi)
+        h_in = max(3, height / dpi)
         fig.set_size_inches(w_in, h_in, forward=True)
-        canvas.draw_idle()
     except Exception:
-        pass
+        return
+    # recompute at the new size: capped while resizing, full once it settles
+    resizing = True
+    scheduler.defer('settle', RESIZE_SETTLE_MS, end_resize)
+    scheduler.request('compute', update_plot)
+    scheduler.request('draw', canvas.draw)
+
+
+def end_resize():
+    """The window stopped resizing: recompute at the full pixel resolution."""
+    global resizing
+    resizing = False
+    update_plot()
 
 
 # -------------------------------
@@ -319,6 +470,11 @@ def on_right_configure(event):
 root = tk.Tk()
 root.title('Forward Modelling Gravitasi (Interaktif) - Variation')
 
+# background worker: computes fields off the Tk thread, results polled with root.after
+worker = ComputeWorker(root, compute_request, draw_field)
+# UI events coalesced into at most one resize, compute and draw per frame
+scheduler = FrameScheduler(root, order=('resize', 'compute', 'draw'))
+
 # try to maximize
 try:
     root.state('zoomed')
@@ -354,12 +510,13 @@ btn_clear = ttk.Button(frame_left, text='Clear Semua', command=clear_points); bt
 
 # import/export controls
 btn_import = ttk.Button(frame_left, text='Import CSV/TXT', command=import_sources); btn_import.grid(row=9, column=0, columnspan=2, pady=(6,2))
-btn_export = ttk.Button(frame_left, text='Export sources', command=export_sources); btn_export.grid(row=10, column=0, columnspan=2)
+btn_export = ttk.Button(frame_left, text='Export sources', command=export_sources); btn_export.grid(row=10, column=0, sticky='e')
+btn_export_grid = ttk.Button(frame_left, text='Export grid', command=export_grid); btn_export_grid.grid(row=10, column=1, sticky='w')
 
-# listbox of sources
-listbox = tk.Listbox(frame_left, width=70, height=12)
-listbox.grid(row=11, column=0, columnspan=2, pady=(8,2))
-listbox.bind('<<ListboxSelect>>', on_select)
+# list of sources: only the visible rows are formatted, with search / filter
+# (e.g. "p1", "x>100", "rho<0 z<=50")
+source_table = SourceList(frame_left, sources, height=12, on_select=on_select)
+source_table.frame.grid(row=11, column=0, columnspan=2, pady=(8,2), sticky='ew')
 
 # colormap and interpolation options
 ttk.Label(frame_left, text='Colormap:').grid(row=12, column=0, sticky='e')
@@ -367,7 +524,7 @@ cmap_var = tk.StringVar(value=DEFAULT_CMAP)
 cmaps = ['viridis','plasma','inferno','magma','cividis','coolwarm','seismic']
 cb_cmap = ttk.Combobox(frame_left, textvariable=cmap_var, values=cmaps, state='readonly', width=16)
 cb_cmap.grid(row=12, column=1, pady=2)
-cb_cmap.bind('<<ComboboxSelected>>', lambda e: update_plot())
+cb_cmap.bind('<<ComboboxSelected>>', restyle)  # styling only: no recompute
 
 ttk.Label(frame_left, text='Map extent (m):').grid(row=15, column=0, sticky='e')
 entry_extent = ttk.Entry(frame_left, width=18); entry_extent.insert(0,'200'); entry_extent.grid(row=15, column=1, pady=2)
@@ -375,6 +532,16 @@ entry_extent = ttk.Entry(frame_left, width=18); entry_extent.insert(0,'200'); en
 # save figure
 btn_save = ttk.Button(frame_left, text='Save Figure', command=save_plot); btn_save.grid(row=16, column=0, columnspan=2, pady=(8,2))
 
+# profiles: click vertices on the map, right click / double click to finish
+btn_profile = ttk.Button(frame_left, text='Gambar Profil', command=lambda: profile_editor.start()); btn_profile.grid(row=17, column=0, columnspan=2, pady=(8,2))
+btn_profile_clear = ttk.Button(frame_left, text='Hapus Profil', command=lambda: profile_editor.clear()); btn_profile_clear.grid(row=18, column=0, columnspan=2)
+
+# undo / redo of the source edits (also Ctrl+Z / Ctrl+Y)
+btn_undo = ttk.Button(frame_left, text='Undo', command=lambda: apply_history(history.undo)); btn_undo.grid(row=19, column=0, pady=(8,2))
+btn_redo = ttk.Button(frame_left, text='Redo', command=lambda: apply_history(history.redo)); btn_redo.grid(row=19, column=1, pady=(8,2))
+root.bind('<Control-z>', lambda e: apply_history(history.undo))
+root.bind('<Control-y>', lambda e: apply_history(history.redo))
+
 # right plot panel
 frame_right = ttk.Frame(root)
 frame_right.grid(row=0, column=1, sticky='nsew')
@@ -388,6 +555,8 @@ ax_map = fig.add_subplot(gs[0]); ax_profile = fig.add_subplot(gs[1])
 canvas = FigureCanvasTkAgg(fig, master=frame_right)
 canvas_widget = canvas.get_tk_widget()
 canvas_widget.pack(fill='both', expand=True)
+init_artists()
+profile_editor = ProfileEditor(ax_map, update_plot, draw=lambda: scheduler.request('draw', canvas.draw))
 
 frame_right.bind('<Configure>', on_right_configure)
 
@@ -6,6 +6,11 @@ import numpy as np                             # operasi numerik dan vektor/matr
 import matplotlib                              # modul utama plotting
 import matplotlib.pyplot as plt                # API plotting seperti MATLAB
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg  # menempel plot ke tkinter
+import os                                      # path folder repo
+import sys                                     # agar paket harmonica bisa di-import
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harmonica.gui import FrameScheduler, viewport_resolution  # penjadwal frame & ukuran peta (piksel)
 
 # Variabel global & konstanta
 sources = []         # menyimpan titik sumber (nama, x, z, rho)
@@ -13,6 +18,11 @@ cbar = None          # menyimpan colorbar agar bisa dihapus/update
 G = 6.67430e-11      # konstanta gravitasi universal
 COLOR_MIN = None     # batas bawah warna (None = autoscale)
 COLOR_MAX = None     # batas atas warna (None = autoscale)
+MAX_RES = 1024       # jumlah titik grid maksimum per sumbu
+RESIZE_RES = 128     # jumlah titik grid maksimum selama window di-resize
+RESIZE_SETTLE_MS = 200  # resize dianggap selesai setelah jeda ini (ms)
+resizing = False     # True selama window sedang di-resize
+scheduler = None     # FrameScheduler: resize/hitung ulang maks. sekali per frame
 
 # Fungsi perhitungan gravitasi sumber titik
 def gravity_anomaly_point(x, y, z, m):        
@@ -38,9 +48,10 @@ def update_plot():
         canvas.draw_idle()
         return
 
-    # grid perhitungan
-    x = np.linspace(-200, 200, 600)             # grid sumbu X
-    y = np.linspace(-200, 200, 600)             # grid sumbu Y
+    # grid perhitungan: sebanyak piksel peta di layar (peta persegi)
+    res = min(viewport_resolution(ax_map, max_size=RESIZE_RES if resizing else MAX_RES))
+    x = np.linspace(-200, 200, res)             # grid sumbu X
+    y = np.linspace(-200, 200, res)             # grid sumbu Y
     X, Y = np.meshgrid(x, y)                    # buat mesh 2D
     Z_total = np.zeros_like(X)                  # inisialisasi anomali total
 
@@ -157,17 +168,31 @@ def save_plot():                               # simpan gambar ke PNG
 
 # Penyesuaian ukuran plot ketika frame kanan di-resize
 def on_right_configure(event):
+    # event <Configure> datang beruntun: hanya ukuran terakhir yang dipakai, maks. sekali per frame
+    scheduler.request("resize", resize_figure, event.width, event.height)
+
+def resize_figure(width, height):
+    global resizing
     try:
         dpi = fig.get_dpi()
-        w_in = max(4, event.width / dpi)
-        h_in = max(3, event.height / dpi)
+        w_in = max(4, width / dpi)
+        h_in = max(3, height / dpi)
         fig.set_size_inches(w_in, h_in, forward=True)
-        canvas.draw_idle()
-    except Exception: pass
+    except Exception: return
+    # hitung ulang sesuai ukuran baru: resolusi dibatasi selama resize
+    resizing = True
+    scheduler.defer("settle", RESIZE_SETTLE_MS, end_resize)
+    scheduler.request("compute", update_plot)  # update_plot juga menggambar ulang
+
+def end_resize():                              # resize selesai -> resolusi penuh
+    global resizing
+    resizing = False
+    update_plot()
 
 # Membangun GUI
 root = tk.Tk()                                 # buat window utama
 root.title("Forward Modelling Gravitasi (Interaktif, Multi-Sumber)")  # judul aplikasi
+scheduler = FrameScheduler(root, order=("resize", "compute"))  # gabungkan event UI per frame
 try: root.state("zoomed")                      # buka window full
 except Exception: pass
 
@@ -7,12 +7,19 @@ from tkinter import ttk, messagebox
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import os
+import sys
+
+# agar paket harmonica (di root repo) bisa di-import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harmonica.gui import viewport_resolution
 
 # -----------------------------------
 # Global variables
 # -----------------------------------
 sources = []      # list: (name, x, z, rho)
 cbar = None       # colorbar global
+MAX_RES = 1024    # jumlah titik grid maksimum per sumbu
 
 # -----------------------------------
 # Fungsi: g_z untuk titik (x,y,z) dengan densitas rho (kg/m³)
@@ -37,9 +44,10 @@ def update_plot():
         canvas.draw()
         return
 
-    # Grid X-Y untuk peta
-    x = np.linspace(-200, 200, 600)
-    y = np.linspace(-200, 200, 600)
+    # Grid X-Y untuk peta: sebanyak piksel peta di layar (peta persegi)
+    res = min(viewport_resolution(axs[0], max_size=MAX_RES))
+    x = np.linspace(-200, 200, res)
+    y = np.linspace(-200, 200, res)
     X, Y = np.meshgrid(x, y)
     Z_total = np.zeros_like(X)
 
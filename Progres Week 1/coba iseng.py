@@ -10,22 +10,26 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import os
+import sys
 
-# Try importing pandas for easy import; fallback to numpy
-try:
-    import pandas as pd
-    PANDAS_AVAILABLE = True
-except Exception:
-    PANDAS_AVAILABLE = False
+# Make the harmonica package in the repository root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from harmonica.export import write_sources
+from harmonica.gui import ComputeWorker, SourceList
+from harmonica.sources import SourceHistory, SourceStore, read_sources
+from harmonica.superposition import gravity_grid
 
 # -----------------------------------
 # Global variables
 # -----------------------------------
-sources = []      # list of tuples: (name, x, z, rho)
+sources = SourceStore(prefix="pt")  # columnar (name, x, z, rho) store, indexed like a list of tuples
+history = SourceHistory(sources)  # undo / redo of the source edits (copy-on-write snapshots)
 cbar = None       # colorbar handle
 fig = None
 axs = None
 canvas = None
+worker = None     # background ComputeWorker (created with the root window)
+MAX_LABELS = 50   # source labels are only drawn for up to this many sources
 
 # -----------------------------------
 # Gravity function (vertical component g_z for point mass)
@@ -40,32 +44,47 @@ def gravity_anomaly_xy(x, y, z, rho):
 # Plot update
 # -----------------------------------
 def update_plot(grid_extent=1000, grid_points=200):
-    """Redraw map + profile from current `sources`."""
+    """Request a redraw of map + profile from current `sources`.
+
+    The field is computed on a background thread so the window stays
+    responsive; a newer request supersedes any pending one.
+    """
+    if not sources:
+        worker.cancel()
+        draw_field(None)
+        return
+    worker.submit(sources.copy(), grid_extent, grid_points)
+
+
+def compute_field(snapshot, grid_extent, grid_points):
+    """Runs on the worker thread (no Tk calls): compute map + profile."""
+    # Create grid (keep it reasonable by default)
+    x = np.linspace(-grid_extent, grid_extent, grid_points)
+    y = np.linspace(-grid_extent, grid_extent, grid_points)
+
+    # Map + profile along Y=0 in one compiled pass over the source columns
+    # (assume all sources lie on Y=0 plane)
+    Z_total, g_profile = gravity_grid(
+        x, y, (snapshot.x, snapshot.y, snapshot.z, snapshot.rho),
+        profile=(x, np.zeros_like(x)))
+
+    return snapshot, grid_extent, x, y, Z_total, g_profile
+
+
+def draw_field(result):
+    """Runs on the Tk thread: draw a computed field (None -> empty message)."""
     global cbar, fig, axs, canvas
 
     for ax in axs:
         ax.clear()
 
-    if not sources:
+    if result is None:
         axs[0].text(0.5, 0.5, "Belum ada sumber ditambahkan",
                     ha='center', va='center', fontsize=12, color='gray')
         canvas.draw()
         return
 
-    # Create grid (keep it reasonable by default)
-    x = np.linspace(-grid_extent, grid_extent, grid_points)
-    y = np.linspace(-grid_extent, grid_extent, grid_points)
-    X, Y = np.meshgrid(x, y)
-    Z_total = np.zeros_like(X)
-
-    # Sum contributions (assume all sources lie on Y=0 plane)
-    for (_, x0, z0, rho0) in sources:
-        Z_total += gravity_anomaly_xy(X - x0, Y - 0, z0, rho0)
-
-    # Profile along Y=0
-    g_profile = np.zeros_like(x)
-    for (_, x0, z0, rho0) in sources:
-        g_profile += gravity_anomaly_xy(x - x0, 0, z0, rho0)
+    snapshot, grid_extent, x, y, Z_total, g_profile = result
 
     # Plot map
     vmax = np.max(np.abs(Z_total))
@@ -77,9 +96,9 @@ def update_plot(grid_extent=1000, grid_points=200):
     axs[0].set_xlabel("X (m)")
     axs[0].set_ylabel("Y (m)")
 
-    # Mark sources on map (at Y=0)
-    for (name, x0, z0, rho0) in sources:
-        axs[0].scatter(x0, 0, color='red', s=40, edgecolor='black', zorder=5)
+    # Mark sources on map (at Y=0), labels only for small models
+    axs[0].scatter(snapshot.x, snapshot.y, color='red', s=40, edgecolor='black', zorder=5)
+    for (name, x0, z0, rho0) in (snapshot if len(snapshot) <= MAX_LABELS else ()):
         axs[0].text(x0 + (grid_extent * 0.02), grid_extent * 0.02,
                     f"{name}\nx={x0:.1f}, z={z0:.1f}\nρ={rho0:.0f}",
                     color='white', fontsize=8, ha='left', va='bottom', weight='bold')
@@ -123,8 +142,10 @@ def add_point():
             messagebox.showerror("Input error", "Nilai ρ tidak boleh 0")
             return
 
+        history.record()
         sources.append((name_val, x_val, z_val, rho_val))
-        listbox.insert(tk.END, f"{name_val}: x={x_val:.1f}, z={z_val:.1f}, ρ={rho_val:.0f}")
+        source_table.refresh()
+        source_table.see(len(sources) - 1)
         clear_inputs()
         update_plot()
 
@@ -132,17 +153,20 @@ def add_point():
         messagebox.showerror("Input error", "Masukkan angka yang valid.")
 
 def delete_selected():
-    if not listbox.curselection():
+    if not source_table.curselection():
         messagebox.showerror("Error", "Pilih item dulu!")
         return
-    idx = listbox.curselection()[0]
+    idx = source_table.curselection()[0]
+    history.record()
     sources.pop(idx)
-    listbox.delete(idx)
+    source_table.selection_clear()
+    source_table.refresh()
     update_plot()
 
 def clear_points():
+    history.record()
     sources.clear()
-    listbox.delete(0, tk.END)
+    source_table.refresh()
     update_plot()
 
 def clear_inputs():
@@ -151,10 +175,7 @@ def clear_inputs():
     entry_z.delete(0, tk.END)
     entry_rho.delete(0, tk.END)
 
-def on_select(event):
-    if not listbox.curselection():
-        return
-    idx = listbox.curselection()[0]
+def on_select(idx):
     name, x, z, rho = sources[idx]
     entry_name.delete(0, tk.END); entry_name.insert(0, str(name))
     entry_x.delete(0, tk.END); entry_x.insert(0, str(x))
@@ -162,10 +183,10 @@ def on_select(event):
     entry_rho.delete(0, tk.END); entry_rho.insert(0, str(rho))
 
 def update_selected():
-    if not listbox.curselection():
+    if not source_table.curselection():
         messagebox.showerror("Error", "Pilih item dulu!")
         return
-    idx = listbox.curselection()[0]
+    idx = source_table.curselection()[0]
     try:
         name_val = entry_name.get().strip()
         x_val = float(entry_x.get())
@@ -174,11 +195,19 @@ def update_selected():
     except ValueError:
         messagebox.showerror("Input error", "Masukkan angka valid!")
         return
+    history.record()
     sources[idx] = (name_val, x_val, z_val, rho_val)
-    listbox.delete(idx)
-    listbox.insert(idx, f"{name_val}: x={x_val:.1f}, z={z_val:.1f}, ρ={rho_val:.0f}")
+    source_table.refresh()
     update_plot()
 
+def apply_history(step):
+    """Undo / redo a change to the sources (step: history.undo or history.redo)."""
+    if step():
+        source_table.selection_clear()
+        source_table.refresh()
+        update_plot()
+
+
 # -----------------------------------
 # Import / Export
 # -----------------------------------
@@ -195,92 +224,26 @@ def import_file():
         return
 
     try:
-        ext = os.path.splitext(path)[1].lower()
-        df = None
-
-        if PANDAS_AVAILABLE:
-            if ext in [".xls", ".xlsx"]:
-                df = pd.read_excel(path)
-            else:
-                # read_csv can normally read .csv and many .txt with delimiter autodetect
-                df = pd.read_csv(path)
-        else:
-            # Fallback: try numpy loadtxt for simple whitespace/comma separated files
-            try:
-                data = np.loadtxt(path, delimiter=None)  # autodetect whitespace/comma
-            except Exception:
-                # try comma
-                data = np.loadtxt(path, delimiter=",")
-            # data is 2D array
-            if data.ndim == 1:
-                data = data[np.newaxis, :]
-            # assume columns x,z,rho or name,x,z,rho
-            if data.shape[1] == 3:
-                # x,z,rho -> create names automatically
-                rows = []
-                for i, row in enumerate(data):
-                    rows.append(("pt"+str(i+1), float(row[0]), float(row[1]), float(row[2])))
-            elif data.shape[1] >= 4:
-                rows = []
-                for i, row in enumerate(data):
-                    rows.append((str(row[0]), float(row[1]), float(row[2]), float(row[3])))
-            else:
-                raise ValueError("File format tidak dikenali (butuh 3 atau 4 kolom).")
-
-            # append rows
-            added = 0
-            for r in rows:
-                name_val, x_val, z_val, rho_val = r
-                sources.append((str(name_val), x_val, z_val, rho_val))
-                listbox.insert(tk.END, f"{name_val}: x={x_val:.1f}, z={z_val:.1f}, ρ={rho_val:.0f}")
-                added += 1
-            update_plot()
-            messagebox.showinfo("Import selesai", f"Berhasil menambahkan {added} titik dari file.")
-            return
-
-        # If we have pandas.DataFrame, normalize columns
-        if df is None:
-            raise ValueError("Gagal membaca file.")
-        # Normalize column names (lower)
-        cols = [c.strip().lower() for c in df.columns]
-        # Try to find columns for x, z, rho and optional name
-        col_x = None; col_z = None; col_rho = None; col_name = None
-        for c, original in zip(cols, df.columns):
-            if c in ("x", "easting", "east", "longitude", "lon"):
-                col_x = original
-            elif c in ("z", "depth", "upward", "height"):
-                col_z = original
-            elif c in ("rho", "density", "dens"):
-                col_rho = original
-            elif c in ("name", "id", "label"):
-                col_name = original
-        # If not found, try positional fallback
-        if col_x is None or col_z is None or col_rho is None:
-            # try positional columns
-            if df.shape[1] >= 3:
-                # assume order: x, z, rho or name,x,z,rho
-                if df.shape[1] == 3:
-                    col_x = df.columns[0]; col_z = df.columns[1]; col_rho = df.columns[2]
-                else:
-                    col_name = df.columns[0]; col_x = df.columns[1]; col_z = df.columns[2]; col_rho = df.columns[3]
-            else:
-                raise ValueError("File harus memiliki minimal 3 kolom (x, z, rho).")
-
-        added = 0
-        for _, row in df.iterrows():
-            name_val = str(row[col_name]) if col_name is not None else f"pt{len(sources)+1}"
-            x_val = float(row[col_x])
-            z_val = float(row[col_z])
-            rho_val = float(row[col_rho])
-            sources.append((name_val, x_val, z_val, rho_val))
-            listbox.insert(tk.END, f"{name_val}: x={x_val:.1f}, z={z_val:.1f}, ρ={rho_val:.0f}")
-            added += 1
-
-        update_plot()
-        messagebox.showinfo("Import selesai", f"Berhasil menambahkan {added} titik dari file.")
-
+        # Whole columns are parsed and validated at once (header optional,
+        # columns found by name or position: x,z,rho or name,x,z,rho)
+        names, x, z, rho, bad_rows = read_sources(path)
     except Exception as e:
         messagebox.showerror("Import error", f"Gagal mengimpor file:\n{e}")
+        return
+
+    if bad_rows.size:
+        shown = ", ".join(str(i) for i in bad_rows[:10]) + (", ..." if bad_rows.size > 10 else "")
+        messagebox.showwarning("Import", f"{bad_rows.size} baris tidak valid dilewati (baris data {shown}).")
+    if not x.size:
+        messagebox.showwarning("Import", "Tidak menemukan titik yang valid di file.")
+        return
+
+    # Append to the store in one go (the list only formats its visible rows)
+    history.record()
+    sources.extend_arrays(names, x, z, rho)
+    source_table.refresh()
+    update_plot()
+    messagebox.showinfo("Import selesai", f"Berhasil menambahkan {x.size} titik dari file.")
 
 def save_plot():
     """Save current figure to image file."""
@@ -296,17 +259,16 @@ def save_plot():
         messagebox.showerror("Save error", f"Gagal menyimpan:\n{e}")
 
 def save_data_csv():
-    """Export current sources to CSV."""
+    """Export current sources to CSV (or a binary .npz / .nc / .h5 file)."""
     path = filedialog.asksaveasfilename(defaultextension=".csv",
-                                        filetypes=[("CSV file", "*.csv")])
+                                        filetypes=[("CSV file", "*.csv"),
+                                                   ("NumPy file", "*.npz"),
+                                                   ("NetCDF / HDF5 file", "*.nc *.h5")])
     if not path:
         return
     try:
-        # write header and rows
-        with open(path, "w", encoding="utf-8") as f:
-            f.write("name,x,z,rho\n")
-            for (name, x, z, rho) in sources:
-                f.write(f"{name},{x},{z},{rho}\n")
+        # columns of the store are written as they are (CSV in blocks of rows)
+        write_sources(path, sources)
         messagebox.showinfo("Simpan berhasil", f"Data sumber disimpan ke:\n{path}")
     except Exception as e:
         messagebox.showerror("Save error", f"Gagal menyimpan data:\n{e}")
@@ -317,6 +279,9 @@ def save_data_csv():
 root = tk.Tk()
 root.title("Forward Modelling Gravitasi (Interaktif)")
 
+# Background worker: fields are computed off the Tk thread and drawn via root.after
+worker = ComputeWorker(root, compute_field, draw_field)
+
 # Left frame: input + controls
 frame_left = ttk.Frame(root, padding=10)
 frame_left.grid(row=0, column=0, sticky="ns")
@@ -346,9 +311,16 @@ ttk.Button(frame_left, text="Simpan data (CSV)", command=save_data_csv).grid(row
 ttk.Button(frame_left, text="Simpan plot (PNG/JPG/PDF)", command=save_plot).grid(row=12, column=0, columnspan=2, pady=4)
 
 # Listbox
-listbox = tk.Listbox(frame_left, width=60, height=15)
-listbox.grid(row=13, column=0, columnspan=2, pady=6)
-listbox.bind("<<ListboxSelect>>", on_select)
+# Source list: only the visible rows are formatted, with search / filter
+# (e.g. "pt1", "x>100", "rho<0 z<=50")
+source_table = SourceList(frame_left, sources, height=15, on_select=on_select)
+source_table.frame.grid(row=13, column=0, columnspan=2, pady=6, sticky="ew")
+
+# Undo / redo of the source edits (also Ctrl+Z / Ctrl+Y)
+ttk.Button(frame_left, text="Undo", command=lambda: apply_history(history.undo)).grid(row=14, column=0, pady=4)
+ttk.Button(frame_left, text="Redo", command=lambda: apply_history(history.redo)).grid(row=14, column=1, pady=4)
+root.bind("<Control-z>", lambda e: apply_history(history.undo))
+root.bind("<Control-y>", lambda e: apply_history(history.redo))
 
 # Right frame: plot area
 frame_right = ttk.Frame(root, padding=8)
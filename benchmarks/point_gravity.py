@@ -0,0 +1,105 @@
+"""
+Benchmark the forward modelling of point masses.
+
+Compares the generic loops, which receive the kernel as an argument and
+apply the sign and unit conversion afterwards, with the loops specialised for
+each field, and the loops parallelised over the computation points with the
+ones parallelised over the point masses on a few computation points. Run with
+``python benchmarks/point_gravity.py``.
+"""
+
+import time
+
+import numpy as np
+
+from harmonica.point import dispatcher, get_field_factor, get_kernel
+
+FIELDS = ("potential", "g_z", "g_zz")
+N_STATIONS = 4_000
+N_SOURCES = 4_000
+N_FEW_STATIONS = 16
+N_MANY_SOURCES = 2_000_000
+REPEATS = 5
+
+
+def best_time(function, *args):
+    """
+    Return the best wall time out of REPEATS calls (after a warm-up call).
+    """
+    function(*args)
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def generic(coordinates, points, masses, field, parallel):
+    result = np.zeros(coordinates[0].size)
+    kernel = get_kernel("cartesian", field)
+    dispatcher("cartesian", parallel)(*coordinates, *points, masses, result, kernel)
+    result *= get_field_factor(field)
+    return result
+
+
+def specialized(coordinates, points, masses, field, parallel):
+    result = np.zeros(coordinates[0].size)
+    dispatcher("cartesian", parallel, field)(*coordinates, *points, masses, result)
+    return result
+
+
+def parallel_over(coordinates, points, masses, field, parallel_over):
+    result = np.zeros(coordinates[0].size)
+    forward = dispatcher("cartesian", True, field, parallel_over)
+    forward(*coordinates, *points, masses, result)
+    return result
+
+
+def random_points(rng, size, upward):
+    return (
+        rng.uniform(-5e3, 5e3, size),
+        rng.uniform(-5e3, 5e3, size),
+        np.full(size, upward) if np.isscalar(upward) else rng.uniform(*upward, size),
+    )
+
+
+def main():
+    rng = np.random.default_rng(42)
+    coordinates = random_points(rng, N_STATIONS, 0.0)
+    points = random_points(rng, N_SOURCES, (-3e3, -5e2))
+    masses = rng.normal(1e7, 5e6, N_SOURCES)
+    print(f"{N_STATIONS} computation points, {N_SOURCES} point masses")
+    print(
+        f"{'field':<10} {'parallel':<9} {'generic':>10} {'specialized':>12} {'speedup':>8}"
+    )
+    for parallel in (False, True):
+        for field in FIELDS:
+            args = (coordinates, points, masses, field, parallel)
+            np.testing.assert_allclose(specialized(*args), generic(*args), rtol=1e-10)
+            time_generic = best_time(generic, *args)
+            time_specialized = best_time(specialized, *args)
+            print(
+                f"{field:<10} {str(parallel):<9} {time_generic:>9.4f}s "
+                f"{time_specialized:>11.4f}s {time_generic / time_specialized:>7.2f}x"
+            )
+    coordinates = random_points(rng, N_FEW_STATIONS, 0.0)
+    points = random_points(rng, N_MANY_SOURCES, (-3e3, -5e2))
+    masses = rng.normal(1e7, 5e6, N_MANY_SOURCES)
+    print(f"\n{N_FEW_STATIONS} computation points, {N_MANY_SOURCES} point masses")
+    print(f"{'field':<10} {'stations':>10} {'sources':>10} {'speedup':>8}")
+    for field in FIELDS:
+        args = (coordinates, points, masses, field)
+        np.testing.assert_allclose(
+            parallel_over(*args, "sources"), parallel_over(*args, "stations")
+        )
+        time_stations = best_time(parallel_over, *args, "stations")
+        time_sources = best_time(parallel_over, *args, "sources")
+        print(
+            f"{field:<10} {time_stations:>9.4f}s {time_sources:>9.4f}s "
+            f"{time_stations / time_sources:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Forward modelling of point masses from asyncio applications.
+"""
+
+import asyncio
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .point import (
+    check_coordinate_system,
+    choose_parallel_over,
+    dispatcher,
+    prepare_arrays,
+)
+
+
+class AsyncPointGravity:
+    """
+    Run :func:`harmonica.point.point_gravity` without blocking the event loop.
+
+    The computation points are split in chunks and the jitted forward model
+    of each chunk runs on a thread pool. The jitted functions release the GIL,
+    so the event loop keeps serving other tasks in the meantime. Cancelling
+    the awaiting task stops the computation before the next chunk starts.
+
+    Parameters
+    ----------
+    max_concurrent : int (optional)
+        Maximum number of forward models running at the same time. Extra
+        calls wait until one of the running ones finishes. Each parallel
+        forward model already uses every core, so the default is 1. Running
+        parallel forward models concurrently requires a thread-safe Numba
+        threading layer (``tbb`` or ``omp``).
+    chunk_size : int (optional)
+        Number of computation points processed on each chunk. Smaller chunks
+        make cancellation more responsive at the price of some overhead.
+        Default 8192.
+    executor : :class:`concurrent.futures.Executor`, ``"loop"`` or None (optional)
+        Executor used to run the chunks. If None, a thread pool with
+        ``max_concurrent`` workers is created and owned by this object: call
+        :meth:`shutdown` (or use it as an async context manager) to release
+        it. If ``"loop"``, the default executor of the running event loop is
+        used, which the loop shuts down when it's closed (e.g. at the end of
+        :func:`asyncio.run`). Default None.
+
+    Examples
+    --------
+    >>> async def main(coordinates, points, masses):  # doctest: +SKIP
+    ...     async with AsyncPointGravity() as runner:
+    ...         return await runner.point_gravity(
+    ...             coordinates, points, masses, field="g_z"
+    ...         )
+    """
+
+    def __init__(self, max_concurrent=1, chunk_size=8192, executor=None):
+        if max_concurrent < 1:
+            raise ValueError(
+                f"Invalid max_concurrent '{max_concurrent}'. It must be positive."
+            )
+        if chunk_size < 1:
+            raise ValueError(f"Invalid chunk_size '{chunk_size}'. It must be positive.")
+        self.max_concurrent = max_concurrent
+        self.chunk_size = chunk_size
+        self._owns_executor = executor is None
+        if executor == "loop":
+            # run_in_executor uses the loop's default executor when given None
+            executor = None
+        elif executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=max_concurrent, thread_name_prefix="harmonica"
+            )
+        self.executor = executor
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self):
+        """
+        Return the semaphore that limits the concurrent calls on this loop.
+        """
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphores[loop]
+
+    async def point_gravity(
+        self,
+        coordinates,
+        points,
+        masses,
+        field,
+        coordinate_system="cartesian",
+        parallel=True,
+        dtype="float64",
+    ):
+        """
+        Compute gravitational fields of point masses asynchronously.
+
+        Takes the same arguments and returns the same result as
+        :func:`harmonica.point.point_gravity`.
+        """
+        check_coordinate_system(
+            coordinate_system, valid_coord_systems=("cartesian", "spherical")
+        )
+        cast = np.broadcast(*coordinates[:3])
+        result = np.zeros(cast.size, dtype=dtype)
+        coordinates, points, masses = prepare_arrays(coordinates, points, masses)
+        parallel_over = choose_parallel_over(
+            min(result.size, self.chunk_size), masses.size, parallel
+        )
+        forward = dispatcher(coordinate_system, parallel, field, parallel_over)
+        loop = asyncio.get_running_loop()
+        async with self._semaphore():
+            for start in range(0, result.size, self.chunk_size):
+                chunk = slice(start, start + self.chunk_size)
+                await loop.run_in_executor(
+                    self.executor,
+                    forward,
+                    *(i[chunk] for i in coordinates),
+                    *points,
+                    masses,
+                    result[chunk],
+                )
+        return result.reshape(cast.shape)
+
+    def shutdown(self, wait=True):
+        """
+        Shut down the executor if it was created by this object.
+        """
+        if self._owns_executor:
+            self.executor.shutdown(wait=wait)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.shutdown(wait=False)
+
+
+# Default runner for each event loop used by point_gravity_async
+_default_runners = weakref.WeakKeyDictionary()
+
+
+async def point_gravity_async(
+    coordinates,
+    points,
+    masses,
+    field,
+    coordinate_system="cartesian",
+    parallel=True,
+    dtype="float64",
+):
+    """
+    Compute gravitational fields of point masses without blocking the loop.
+
+    Coroutine version of :func:`harmonica.point.point_gravity` that takes the
+    same arguments and returns the same result. It uses a default
+    :class:`AsyncPointGravity` per event loop, so calls running on the same
+    loop share its concurrency limit. The chunks run on the default executor
+    of the loop, which is shut down along with the loop. Create your own
+    :class:`AsyncPointGravity` to configure them.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _default_runners:
+        _default_runners[loop] = AsyncPointGravity(executor="loop")
+    return await _default_runners[loop].point_gravity(
+        coordinates,
+        points,
+        masses,
+        field,
+        coordinate_system=coordinate_system,
+        parallel=parallel,
+        dtype=dtype,
+    )
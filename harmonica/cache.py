@@ -0,0 +1,230 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Content-addressed cache for the results of point_gravity.
+"""
+
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .hashing import hash_arrays
+from .point import point_gravity
+
+# Files of the on-disk store are named after their key with this prefix, so
+# clearing the cache never touches other files in the same directory
+FILE_PREFIX = "point_gravity-"
+_FILE_NAME = re.compile(rf"^{re.escape(FILE_PREFIX)}[0-9a-f]{{32}}\.npy$")
+
+
+class PointGravityCache:
+    """
+    Cache the results of :func:`harmonica.point.point_gravity`.
+
+    Results are keyed by a hash of the computation points, point masses,
+    masses, field, coordinate system and data type, and kept in an in-memory
+    Least Recently Used (LRU) store capped to ``max_bytes``. If a
+    ``directory`` is given, every result is also saved there as a ``.npy``
+    file (named after its key, starting with :data:`FILE_PREFIX`) and loaded
+    as a read-only memory map when it isn't found in memory, so results
+    survive evictions and can be shared between runs. Results loaded from
+    disk are added back to the in-memory store.
+
+    Cached results are returned as read-only arrays: copy them before
+    modifying them.
+
+    Parameters
+    ----------
+    max_bytes : int (optional)
+        Maximum number of bytes held by the in-memory store. Default 256 MiB.
+    directory : str, :class:`os.PathLike` or None (optional)
+        Directory for the on-disk store. It's created if it doesn't exist. If
+        None, only the in-memory store is used. Default None.
+
+    Attributes
+    ----------
+    stats : dict
+        Number of ``hits`` (in memory), ``disk_hits``, ``misses`` and
+        ``evictions`` since the cache was created or :meth:`reset_stats` was
+        called.
+
+    Examples
+    --------
+    >>> cache = PointGravityCache(directory="forward-cache")  # doctest: +SKIP
+    >>> g_z = cache(coordinates, points, masses, field="g_z")  # doctest: +SKIP
+    """
+
+    def __init__(self, max_bytes=256 * 2**20, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self.nbytes = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def __call__(
+        self,
+        coordinates,
+        points,
+        masses,
+        field,
+        coordinate_system="cartesian",
+        parallel=True,
+        dtype="float64",
+    ):
+        """
+        Compute gravitational fields of point masses, reusing cached results.
+
+        Takes the same arguments and returns the same result as
+        :func:`harmonica.point.point_gravity`, as a read-only array.
+        """
+        key = self.key(coordinates, points, masses, field, coordinate_system, dtype)
+        result = self.get(key)
+        if result is None:
+            result = point_gravity(
+                coordinates,
+                points,
+                masses,
+                field,
+                coordinate_system=coordinate_system,
+                parallel=parallel,
+                dtype=dtype,
+            )
+            self.put(key, result)
+        return result
+
+    def key(
+        self,
+        coordinates,
+        points,
+        masses,
+        field,
+        coordinate_system="cartesian",
+        dtype="float64",
+    ):
+        """
+        Return the key of the result of a forward model.
+        """
+        return hash_arrays(
+            *coordinates[:3],
+            *points[:3],
+            masses,
+            params=(field, coordinate_system, np.dtype(dtype).str),
+        )
+
+    def get(self, key):
+        """
+        Return the cached result for a key or None if it isn't cached.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._memory[key]
+        path = self._path(key)
+        if path is not None and os.path.exists(path):
+            result = np.load(path, mmap_mode="r")
+            with self._lock:
+                self.stats["disk_hits"] += 1
+                self._remember(key, result)
+            return result
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key, result):
+        """
+        Store a result in the cache.
+        """
+        result.setflags(write=False)
+        path = self._path(key)
+        if path is not None and not os.path.exists(path):
+            # Write to a temporary file first so readers never see partial files
+            descriptor, tmp = tempfile.mkstemp(
+                prefix=FILE_PREFIX, suffix=".tmp", dir=self.directory
+            )
+            with os.fdopen(descriptor, "wb") as file:
+                np.save(file, result)
+            os.replace(tmp, path)
+        with self._lock:
+            self._remember(key, result)
+
+    def invalidate(self, key):
+        """
+        Remove a result from both the in-memory and the on-disk stores.
+
+        Use :meth:`key` to get the key of a given forward model.
+        """
+        with self._lock:
+            if key in self._memory:
+                self.nbytes -= self._memory.pop(key).nbytes
+        path = self._path(key)
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+    def clear(self, disk=True):
+        """
+        Remove every cached result.
+
+        Parameters
+        ----------
+        disk : bool (optional)
+            If True, the files of the on-disk store are removed as well. Only
+            the files written by the cache are removed, any other file in
+            ``directory`` is left untouched. Default True.
+        """
+        with self._lock:
+            self._memory.clear()
+            self.nbytes = 0
+        if disk and self.directory is not None:
+            for name in os.listdir(self.directory):
+                if _FILE_NAME.match(name):
+                    os.remove(os.path.join(self.directory, name))
+
+    def reset_stats(self):
+        """
+        Set the hit and miss counters back to zero.
+        """
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._memory:
+                return True
+        path = self._path(key)
+        return path is not None and os.path.exists(path)
+
+    def __len__(self):
+        return len(self._memory)
+
+    def _remember(self, key, result):
+        """
+        Add a result to the in-memory store, evicting the least recently used.
+
+        Must be called holding the lock.
+        """
+        if result.nbytes > self.max_bytes:
+            return
+        if key in self._memory:
+            self.nbytes -= self._memory.pop(key).nbytes
+        self._memory[key] = result
+        self.nbytes += result.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.stats["evictions"] += 1
+
+    def _path(self, key):
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, f"{FILE_PREFIX}{key}.npy")
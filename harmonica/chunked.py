@@ -0,0 +1,199 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Lazy forward modelling of point masses over chunked Dask and xarray arrays.
+"""
+
+import numba
+import numpy as np
+
+from .point import check_coordinate_system, point_gravity
+
+# Units of the fields returned by point_gravity
+FIELD_UNITS = {
+    "potential": "J/kg",
+    "g_e": "mGal",
+    "g_n": "mGal",
+    "g_z": "mGal",
+    "g_ee": "Eotvos",
+    "g_nn": "Eotvos",
+    "g_zz": "Eotvos",
+    "g_en": "Eotvos",
+    "g_ez": "Eotvos",
+    "g_nz": "Eotvos",
+    "g_ne": "Eotvos",
+    "g_ze": "Eotvos",
+    "g_zn": "Eotvos",
+}
+
+
+def point_gravity_chunked(
+    coordinates,
+    points,
+    masses,
+    field,
+    coordinate_system="cartesian",
+    threads_per_task=1,
+    dtype="float64",
+):
+    """
+    Lazily compute gravitational fields of point masses on chunked arrays.
+
+    Maps :func:`harmonica.point.point_gravity` over the chunks of the
+    computation points. Nothing is computed until the result is computed (or
+    written) by Dask, so grids bigger than memory can be forward modelled
+    chunk by chunk within existing Dask pipelines.
+
+    Each chunk runs the parallel forward model on at most
+    ``threads_per_task`` threads. Dask already runs one task per core, so
+    the default of 1 avoids oversubscribing the machine. Increase it when
+    Dask runs fewer tasks at once than there are cores (e.g. on a
+    distributed worker with a single thread).
+
+    Requires `dask <https://www.dask.org>`__. If the coordinates are
+    :class:`xarray.DataArray`, `xarray <https://xarray.dev>`__ is required as
+    well.
+
+    Parameters
+    ----------
+    coordinates : list of arrays
+        Coordinates of the computation points, given as in
+        :func:`harmonica.point.point_gravity`. They can be Dask arrays,
+        :class:`xarray.DataArray` (lazily loaded or not) or NumPy arrays. They
+        are broadcast against each other and their chunks are unified.
+    points : list or array
+        Coordinates of the point masses, given as in
+        :func:`harmonica.point.point_gravity`. They are held in memory and
+        shared by every chunk.
+    masses : list or array
+        Mass of each point mass in kg.
+    field : str
+        Gravitational field that wants to be computed. Same options as in
+        :func:`harmonica.point.point_gravity`.
+    coordinate_system : str (optional)
+        Coordinate system of the computation points and the point masses.
+        Available coordinates systems: ``cartesian``, ``spherical``.
+        Default ``cartesian``.
+    threads_per_task : int (optional)
+        Number of Numba threads used by the forward model of each chunk. If 1,
+        each chunk runs on a single core. Default 1.
+    dtype : data-type (optional)
+        Data type assigned to resulting gravitational field. Default to
+        ``np.float64``.
+
+    Returns
+    -------
+    result : :class:`dask.array.Array` or :class:`xarray.DataArray`
+        Lazy gravitational field on the computation points, with the same
+        chunks as the broadcast coordinates. If the coordinates are
+        :class:`xarray.DataArray`, the result is a :class:`xarray.DataArray`
+        with the same dimensions and coordinates, named after the field and
+        with its units on the ``units`` attribute.
+
+    Examples
+    --------
+    >>> grid = xr.open_zarr("stations.zarr")  # doctest: +SKIP
+    >>> g_z = point_gravity_chunked(  # doctest: +SKIP
+    ...     (grid.easting, grid.northing, grid.upward), points, masses, "g_z"
+    ... )
+    >>> g_z.to_zarr("g_z.zarr")  # doctest: +SKIP
+    """
+    try:
+        import dask
+        import dask.array as da
+    except ImportError as error:
+        raise ImportError(
+            "Chunked forward models require the 'dask' package to be installed."
+        ) from error
+    check_coordinate_system(
+        coordinate_system, valid_coord_systems=("cartesian", "spherical")
+    )
+    if not 1 <= threads_per_task <= numba.config.NUMBA_NUM_THREADS:
+        raise ValueError(
+            f"Invalid threads_per_task '{threads_per_task}'. "
+            f"It must be between 1 and {numba.config.NUMBA_NUM_THREADS}."
+        )
+    template = None
+    coordinates = tuple(coordinates[:3])
+    if _is_dataarray(coordinates[0]):
+        import xarray as xr
+
+        coordinates = xr.broadcast(*coordinates)
+        template = coordinates[0]
+        coordinates = tuple(i.data for i in coordinates)
+    coordinates = da.broadcast_arrays(*(da.asarray(i) for i in coordinates))
+    points = tuple(np.atleast_1d(i).ravel() for i in points[:3])
+    masses = np.atleast_1d(masses).ravel()
+    if masses.size != points[0].size:
+        raise ValueError(
+            f"Number of elements in masses ({masses.size}) "
+            + f"mismatch the number of points ({points[0].size})"
+        )
+    # Put the point masses once in the graph instead of copying them into the
+    # arguments of every task
+    sources = dask.delayed((points, masses), pure=True, traverse=False)
+    result = da.map_blocks(
+        _point_gravity_block,
+        *coordinates,
+        sources,
+        dtype=np.dtype(dtype),
+        token="point_gravity",
+        field=field,
+        coordinate_system=coordinate_system,
+        threads=threads_per_task,
+        result_dtype=dtype,
+    )
+    if template is None:
+        return result
+    import xarray as xr
+
+    return xr.DataArray(
+        result,
+        coords=template.coords,
+        dims=template.dims,
+        name=field,
+        attrs={"units": FIELD_UNITS.get(field, "")},
+    )
+
+
+def _point_gravity_block(
+    easting,
+    northing,
+    upward,
+    sources,
+    field,
+    coordinate_system,
+    threads,
+    result_dtype,
+):
+    """
+    Forward model a single chunk of computation points on a thread budget.
+    """
+    # Numba's number of threads is set per calling thread, so tasks running
+    # concurrently on other threads aren't affected
+    previous = numba.get_num_threads()
+    numba.set_num_threads(threads)
+    points, masses = sources
+    try:
+        return point_gravity(
+            (easting, northing, upward),
+            points,
+            masses,
+            field,
+            coordinate_system=coordinate_system,
+            parallel=threads > 1,
+            dtype=result_dtype,
+        )
+    finally:
+        numba.set_num_threads(previous)
+
+
+def _is_dataarray(array):
+    """
+    Check if an array is an xarray.DataArray without importing xarray.
+    """
+    return type(array).__name__ == "DataArray" and hasattr(array, "dims")
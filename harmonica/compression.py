@@ -0,0 +1,315 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Compression of point-mass models by error-bounded mass lumping.
+"""
+
+from collections import deque
+from math import factorial
+
+import numpy as np
+from choclo.constants import GRAVITATIONAL_CONST
+
+from .coordinates import geocentric_to_spherical, spherical_to_geocentric
+from .point import check_coordinate_system, get_field_factor, get_kernel
+
+# Order of the derivative of the potential computed for each field
+DERIVATIVE_ORDER = {
+    "potential": 0,
+    "g_e": 1,
+    "g_n": 1,
+    "g_z": 1,
+    "g_ee": 2,
+    "g_nn": 2,
+    "g_zz": 2,
+    "g_en": 2,
+    "g_ez": 2,
+    "g_nz": 2,
+    "g_ne": 2,
+    "g_ze": 2,
+    "g_zn": 2,
+}
+
+# Maximum number of groups of computation points on which the error of the
+# lumped clusters is accumulated
+MAX_STATION_GROUPS = 1024
+# Maximum fraction of the tolerance left on each group that a single merged
+# cluster can spend, so the first clusters don't use up all of it
+MERGE_FRACTION = 0.1
+
+
+def lump_point_masses(
+    coordinates,
+    points,
+    masses,
+    field,
+    tolerance,
+    coordinate_system="cartesian",
+    quadrupole=False,
+    leaf_size=16,
+):
+    r"""
+    Compress a point-mass model by merging clusters of sources.
+
+    Build a binary tree over the point masses and replace every cluster that
+    is far enough from the computation points by a few equivalent point
+    masses: a single one on its centre of mass or, if ``quadrupole`` is True,
+    six point masses that also reproduce its second order moments. The
+    resulting model can be passed to :func:`harmonica.point.point_gravity`
+    instead of the original one and it will produce the same ``field`` on the
+    ``coordinates`` within ``tolerance``.
+
+    Positive and negative masses are lumped separately, so the centre of mass
+    of each cluster is always well defined.
+
+    Parameters
+    ----------
+    coordinates : list of arrays
+        Coordinates of the computation points, given as in
+        :func:`harmonica.point.point_gravity`. The error is bounded on small
+        groups of nearby points, so the compressed model is only guaranteed
+        to be within ``tolerance`` on these points (and on the space between
+        the points of each group).
+    points : list or array
+        Coordinates of the point masses, given as in
+        :func:`harmonica.point.point_gravity`.
+    masses : list or array
+        Mass of each point mass in kg.
+    field : str
+        Gravitational field whose error will be bounded. Same options as in
+        :func:`harmonica.point.point_gravity`.
+    tolerance : float
+        Maximum absolute error allowed on the ``field`` on every computation
+        point, in the units returned by
+        :func:`harmonica.point.point_gravity` (SI for the potential, mGal for
+        the accelerations and Eotvos for the tensor components).
+    coordinate_system : str (optional)
+        Coordinate system of the computation points and the point masses.
+        Available coordinates systems: ``cartesian``, ``spherical``.
+        Default ``cartesian``.
+    quadrupole : bool (optional)
+        If True, each cluster is replaced by six point masses that match its
+        mass, centre of mass and second order moments, which allows merging
+        bigger clusters for the same tolerance. If False, each cluster is
+        replaced by a single point mass on its centre of mass. Default False.
+    leaf_size : int (optional)
+        Maximum number of point masses on the leaves of the tree. Leaves that
+        are too close to the computation points to be merged keep their
+        original point masses. Default 16.
+
+    Returns
+    -------
+    points : tuple of arrays
+        Coordinates of the point masses of the compressed model, in the same
+        coordinate system as the original ``points``.
+    masses : array
+        Mass of each point mass of the compressed model in kg.
+
+    Notes
+    -----
+    Let :math:`m_i` be the masses of a cluster of same-sign point masses at a
+    distance :math:`r_i` from the expansion point, all of them inside a
+    sphere of radius :math:`a`, and :math:`d` the distance between that point
+    and a computation point. Truncating the multipole expansion of its
+    potential after the terms of order :math:`p` introduces an error on the
+    :math:`k`-th order derivatives of the potential that we bound by the
+    Taylor remainder of the kernel
+
+    .. math::
+
+        \epsilon \le \frac{(p + k + 1)!}{(p + 1)!}
+        \frac{G \sum_i |m_i| r_i^{p + 1}}{(d - a)^{p + k + 2}}.
+
+    Lumping on the centre of mass cancels the dipole term (:math:`p = 1`),
+    while the six point masses of the quadrupole correction also match the
+    second order terms (:math:`p = 2`, adding the sum of the six point masses
+    because both distributions are truncated).
+
+    The computation points are split into up to 1024 groups of nearby points
+    and the bound of every cluster is evaluated on each group, taking
+    :math:`d` as the distance to its bounding box. The errors of the merged
+    clusters on each group are added up, so the error is bounded per
+    computation point instead of splitting the tolerance between all
+    clusters. The clusters are visited from the biggest to the smallest and a
+    cluster is merged only if its bound is below 10% of the tolerance left on
+    every group, which leaves room for the smaller clusters visited later.
+
+    The bound ignores the cancellation between clusters and between the
+    terms of the expansion, so the actual error is usually one or two orders
+    of magnitude below ``tolerance``. Expect little compression when the
+    sources fill the volume right below the computation points: for 20 000
+    sources in the first 3 km below a grid that covers them, a tolerance of
+    0.01 mGal on ``g_z`` (about 0.5% of the field) merges less than 10% of
+    the sources and most of the gain only comes at tolerances around 1 mGal.
+    Sources that are deep compared to their horizontal spread compress much
+    better (down to a few hundred point masses at the same tolerances).
+    """
+    check_coordinate_system(
+        coordinate_system, valid_coord_systems=("cartesian", "spherical")
+    )
+    # Check that the field is valid for the coordinate system
+    get_kernel(coordinate_system, field)
+    if tolerance <= 0:
+        raise ValueError(f"Invalid tolerance '{tolerance}'. It must be positive.")
+    if leaf_size < 1:
+        raise ValueError(f"Invalid leaf_size '{leaf_size}'. It must be positive.")
+    coordinates = tuple(np.atleast_1d(i).ravel() for i in coordinates[:3])
+    points = tuple(np.atleast_1d(i).ravel().astype(np.float64) for i in points[:3])
+    masses = np.atleast_1d(masses).ravel().astype(np.float64)
+    if masses.size != points[0].size:
+        raise ValueError(
+            f"Number of elements in masses ({masses.size}) "
+            + f"mismatch the number of points ({points[0].size})"
+        )
+    # Work on Cartesian coordinates
+    if coordinate_system == "spherical":
+        stations = spherical_to_geocentric(*coordinates)
+        sources = spherical_to_geocentric(*points)
+    else:
+        stations = np.vstack(coordinates).astype(np.float64)
+        sources = np.vstack(points)
+    if not np.any(masses):
+        return points, masses
+    boxes = _station_boxes(stations, MAX_STATION_GROUPS)
+    # Error left to spend on each group of computation points
+    budget = np.full(boxes[0].shape[1], float(tolerance))
+    order = 2 if quadrupole else 1
+    k = DERIVATIVE_ORDER[field]
+    scale = (
+        abs(get_field_factor(field))
+        * GRAVITATIONAL_CONST
+        * factorial(order + k + 1)
+        / factorial(order + 1)
+    )
+    # Lump positive and negative masses separately (their errors share the
+    # same budget)
+    new_sources, new_masses = [], []
+    for sign_mask in (masses > 0, masses < 0):
+        indices = np.flatnonzero(sign_mask)
+        if indices.size == 0:
+            continue
+        lumped = _lump_cluster_tree(
+            sources,
+            masses,
+            indices,
+            boxes,
+            budget,
+            order,
+            k,
+            scale,
+            quadrupole,
+            leaf_size,
+        )
+        new_sources.append(lumped[0])
+        new_masses.append(lumped[1])
+    new_sources = np.hstack(new_sources)
+    new_masses = np.hstack(new_masses)
+    if coordinate_system == "spherical":
+        new_points = geocentric_to_spherical(*new_sources)
+    else:
+        new_points = tuple(new_sources)
+    return new_points, new_masses
+
+
+def _lump_cluster_tree(
+    sources, masses, indices, boxes, budget, order, k, scale, quadrupole, leaf_size
+):
+    """
+    Traverse the binary tree of clusters and lump the ones that can be merged.
+
+    The tree is traversed breadth first, so bigger clusters get to spend the
+    ``budget`` of each group of computation points first. The budget is
+    updated in place.
+    """
+    kept, lumped_sources, lumped_masses = [], [], []
+    queue = deque([indices])
+    while queue:
+        cluster = queue.popleft()
+        coords = sources[:, cluster]
+        weights = masses[cluster]
+        mass = weights.sum()
+        centre = coords @ weights / mass
+        offsets = coords - centre[:, np.newaxis]
+        lengths = np.sqrt((offsets**2).sum(axis=0))
+        radius = lengths.max()
+        # Sum of |m| r^(p + 1) of the point masses around the centre of mass
+        moment = np.abs(weights) @ lengths ** (order + 1)
+        if quadrupole:
+            covariance = (offsets * weights) @ offsets.T / mass
+            variances, axes = np.linalg.eigh(covariance)
+            variances = np.clip(variances, 0, None)
+            radius = max(radius, np.sqrt(3 * variances.max()))
+            # The six point masses are truncated too
+            moment += abs(mass) / 3 * (np.sqrt(3 * variances) ** 3).sum()
+        mergeable = cluster.size > (6 if quadrupole else 1)
+        if mergeable:
+            distance = _distance_to_boxes(centre, boxes)
+            mergeable = distance.min() > radius
+        if mergeable:
+            error = scale * moment / (distance - radius) ** (order + k + 2)
+            mergeable = np.all(error <= MERGE_FRACTION * budget)
+        if mergeable:
+            budget -= error
+            if quadrupole:
+                # Six point masses at +- sqrt(3) sigma along the principal axes
+                # reproduce the mass, centre of mass and second order moments
+                arms = axes * np.sqrt(3 * variances)
+                lumped_sources.append(centre[:, np.newaxis] + np.hstack((arms, -arms)))
+                lumped_masses.append(np.full(6, mass / 6))
+            else:
+                lumped_sources.append(centre[:, np.newaxis])
+                lumped_masses.append(np.array([mass]))
+        elif cluster.size <= leaf_size:
+            kept.append(cluster)
+        else:
+            # Split the cluster on the median of its longest dimension
+            extent = coords.max(axis=1) - coords.min(axis=1)
+            dimension = np.argmax(extent)
+            half = cluster.size // 2
+            split = np.argpartition(coords[dimension], half)
+            queue.append(cluster[split[:half]])
+            queue.append(cluster[split[half:]])
+    kept = np.hstack(kept) if kept else np.array([], dtype=int)
+    new_sources = np.hstack([sources[:, kept]] + lumped_sources)
+    new_masses = np.hstack([masses[kept]] + lumped_masses)
+    return new_sources, new_masses
+
+
+def _station_boxes(stations, max_boxes):
+    """
+    Split the computation points into groups and return their bounding boxes.
+
+    The points are split on the median of the longest dimension of each group
+    until there are ``max_boxes`` groups or every group has a single point.
+    Returns the lower and upper corners of the boxes as (3, n) arrays.
+    """
+    groups = [np.arange(stations.shape[1])]
+    while 2 * len(groups) <= max_boxes and any(i.size > 1 for i in groups):
+        split_groups = []
+        for group in groups:
+            if group.size == 1:
+                split_groups.append(group)
+                continue
+            coords = stations[:, group]
+            dimension = np.argmax(coords.max(axis=1) - coords.min(axis=1))
+            half = group.size // 2
+            split = np.argpartition(coords[dimension], half)
+            split_groups.extend((group[split[:half]], group[split[half:]]))
+        groups = split_groups
+    lower = np.column_stack([stations[:, i].min(axis=1) for i in groups])
+    upper = np.column_stack([stations[:, i].max(axis=1) for i in groups])
+    return lower, upper
+
+
+def _distance_to_boxes(point, boxes):
+    """
+    Compute the distance between a point and axis-aligned bounding boxes.
+    """
+    lower, upper = boxes
+    point = point[:, np.newaxis]
+    gap = np.maximum(np.maximum(lower - point, point - upper), 0)
+    return np.sqrt((gap**2).sum(axis=0))
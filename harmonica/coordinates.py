@@ -0,0 +1,66 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Conversions between spherical geocentric and Cartesian geocentric coordinates.
+"""
+
+import numpy as np
+
+
+def spherical_to_geocentric(longitude, latitude, radius):
+    """
+    Convert spherical geocentric coordinates into Cartesian ones.
+
+    The coordinates can be arrays of any shape (e.g. grids). They are
+    broadcast against each other and flattened.
+
+    Parameters
+    ----------
+    longitude, latitude : arrays
+        Longitude and latitude of the points in degrees.
+    radius : array
+        Radius of the points in meters.
+
+    Returns
+    -------
+    xyz : 2d-array
+        Array with shape ``(3, n)`` with the geocentric Cartesian coordinates
+        of the ``n`` points in meters.
+    """
+    longitude, latitude, radius = (
+        np.ravel(i).astype(np.float64)
+        for i in np.broadcast_arrays(longitude, latitude, radius)
+    )
+    longitude, latitude = np.radians(longitude), np.radians(latitude)
+    return np.vstack(
+        (
+            radius * np.cos(latitude) * np.cos(longitude),
+            radius * np.cos(latitude) * np.sin(longitude),
+            radius * np.sin(latitude),
+        )
+    )
+
+
+def geocentric_to_spherical(x, y, z):
+    """
+    Convert geocentric Cartesian coordinates into spherical ones.
+
+    Parameters
+    ----------
+    x, y, z : arrays
+        Geocentric Cartesian coordinates of the points in meters.
+
+    Returns
+    -------
+    longitude, latitude, radius : arrays
+        Longitude and latitude of the points in degrees and their radius in
+        meters.
+    """
+    radius = np.sqrt(x**2 + y**2 + z**2)
+    longitude = np.degrees(np.arctan2(y, x))
+    latitude = np.degrees(np.arcsin(z / radius))
+    return longitude, latitude, radius
@@ -0,0 +1,339 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Binary exports of gridded fields and point sources, written block by block.
+"""
+
+import csv
+import json
+import os
+import shutil
+import zipfile
+import zlib
+
+import numpy as np
+
+# Extensions of the files written by write_grid and write_sources
+GRID_FORMATS = (".npy", ".npz", ".h5", ".hdf5", ".nc", ".zarr")
+SOURCE_FORMATS = (".npz", ".h5", ".hdf5", ".nc", ".csv", ".txt")
+DEFAULT_BLOCK_ROWS = 256
+
+
+def write_grid(
+    path,
+    easting,
+    northing,
+    values,
+    name="g_z",
+    units="mGal",
+    block_rows=DEFAULT_BLOCK_ROWS,
+    compress=True,
+):
+    """
+    Write a regular grid to a binary file, block by block.
+
+    Only the coordinates of the columns and rows of the grid and its values
+    are stored (no coordinates per node). The values can be given as an
+    array or as blocks of rows computed on demand (e.g. by
+    :func:`harmonica.superposition.gravity_grid_blocks`), which are written
+    as they arrive so the whole grid is never held in memory.
+
+    The format is chosen from the extension of ``path``:
+
+    * ``.npy``: the values only, as written by :func:`numpy.save`.
+    * ``.npz``: arrays ``easting``, ``northing`` and ``name`` in a zip
+      archive (deflated if ``compress``), readable with :func:`numpy.load`.
+    * ``.nc``, ``.h5``, ``.hdf5``: an HDF5 file with the ``name`` dataset
+      chunked by blocks of rows and ``easting`` and ``northing`` attached as
+      its dimension scales, which NetCDF-4 readers (e.g. :mod:`xarray`) see
+      as its coordinates. Requires `h5py <https://www.h5py.org>`__.
+    * ``.zarr``: a `Zarr <https://zarr.dev>`__ (version 2) directory with
+      one file per block of rows (zlib compressed if ``compress``), readable
+      with :func:`xarray.open_zarr` without installing Zarr to write it.
+
+    Parameters
+    ----------
+    path : str or :class:`os.PathLike`
+        Path to the file (or directory for ``.zarr``). It's overwritten if it
+        exists.
+    easting, northing : 1d-arrays
+        Coordinates of the columns and rows of the grid.
+    values : 2d-array or iterable of 2d-arrays
+        Values on the grid, with shape ``(northing.size, easting.size)``, or
+        consecutive blocks of its rows.
+    name : str (optional)
+        Name of the variable with the values. Default ``"g_z"``.
+    units : str (optional)
+        Units of the values, stored as an attribute where the format allows
+        it. Default ``"mGal"``.
+    block_rows : int (optional)
+        Number of rows on each chunk of the HDF5 and Zarr formats. Default
+        256.
+    compress : bool (optional)
+        If True, compress the values (except on ``.npy`` files). Default
+        True.
+    """
+    writers = {
+        ".npy": _write_grid_npy,
+        ".npz": _write_grid_npz,
+        ".h5": _write_grid_hdf5,
+        ".hdf5": _write_grid_hdf5,
+        ".nc": _write_grid_hdf5,
+        ".zarr": _write_grid_zarr,
+    }
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in writers:
+        raise ValueError(
+            f"Unsupported file extension '{extension}'. "
+            f"Valid options: {tuple(writers)}"
+        )
+    if block_rows < 1:
+        raise ValueError(f"Invalid block_rows '{block_rows}'. It must be positive.")
+    easting = np.ascontiguousarray(easting, dtype=np.float64).ravel()
+    northing = np.ascontiguousarray(northing, dtype=np.float64).ravel()
+    blocks = _row_blocks(values, (northing.size, easting.size))
+    writers[extension](
+        path, easting, northing, blocks, name, units, block_rows, compress
+    )
+
+
+def write_sources(path, store):
+    """
+    Write point sources to a binary (or CSV) file.
+
+    The columns of the store are written as they are, without building a
+    row per source. The format is chosen from the extension of ``path``:
+
+    * ``.npz``: arrays ``name``, ``x``, ``y``, ``z`` and ``rho`` in a
+      compressed zip archive.
+    * ``.nc``, ``.h5``, ``.hdf5``: datasets with the same names in an HDF5
+      file. Requires `h5py <https://www.h5py.org>`__.
+    * ``.csv``, ``.txt``: comma separated ``name, x, y, z, rho`` with a
+      header, written in blocks of rows. Names are quoted if needed.
+
+    All of them can be read back with
+    :func:`harmonica.sources.read_sources` (which doesn't return ``y``).
+
+    Parameters
+    ----------
+    path : str or :class:`os.PathLike`
+        Path to the file. It's overwritten if it exists.
+    store : :class:`harmonica.sources.SourceStore`
+        Sources to write.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in SOURCE_FORMATS:
+        raise ValueError(
+            f"Unsupported file extension '{extension}'. "
+            f"Valid options: {SOURCE_FORMATS}"
+        )
+    columns = {
+        "name": store.names.astype(str),
+        "x": store.x,
+        "y": store.y,
+        "z": store.z,
+        "rho": store.rho,
+    }
+    if extension == ".npz":
+        np.savez_compressed(path, **columns)
+    elif extension in (".csv", ".txt"):
+        _write_sources_csv(path, columns)
+    else:
+        h5py = _import_h5py()
+        with h5py.File(path, "w") as file:
+            for column, array in columns.items():
+                if column == "name":
+                    array = array.astype(h5py.string_dtype())
+                file.create_dataset(column, data=array)
+
+
+def _row_blocks(values, shape):
+    """
+    Iterate over blocks of rows of an array or check the blocks of an iterable.
+    """
+    if isinstance(values, np.ndarray):
+        if values.shape != shape:
+            raise ValueError(
+                f"Invalid values with shape {values.shape}. "
+                f"It must have shape {shape}."
+            )
+        yield values
+        return
+    rows = 0
+    for block in values:
+        block = np.asarray(block, dtype=np.float64)
+        if block.ndim != 2 or block.shape[1] != shape[1]:
+            raise ValueError(
+                f"Invalid block with shape {block.shape}. It must have "
+                f"{shape[1]} columns."
+            )
+        rows += block.shape[0]
+        if rows > shape[0]:
+            break
+        yield block
+    if rows != shape[0]:
+        raise ValueError(
+            f"Invalid number of rows on the blocks '{rows}'. "
+            f"The grid has {shape[0]} rows."
+        )
+
+
+def _rechunk(blocks, shape, chunk_rows):
+    """
+    Regroup blocks of rows into chunks of exactly ``chunk_rows`` rows.
+
+    The last chunk is padded with NaN. Chunks are yielded as a buffer that
+    is reused, along with the index of the chunk.
+    """
+    buffer = np.full((chunk_rows, shape[1]), np.nan)
+    filled = index = 0
+    for block in blocks:
+        start = 0
+        while start < block.shape[0]:
+            count = min(chunk_rows - filled, block.shape[0] - start)
+            buffer[filled : filled + count] = block[start : start + count]
+            filled += count
+            start += count
+            if filled == chunk_rows:
+                yield index, buffer
+                index += 1
+                filled = 0
+    if filled:
+        buffer[filled:] = np.nan
+        yield index, buffer
+
+
+def _write_npy(file, blocks, shape):
+    """
+    Write a ``.npy`` header and the blocks of rows to an open file.
+    """
+    header = {"descr": "<f8", "fortran_order": False, "shape": shape}
+    np.lib.format.write_array_header_2_0(file, header)
+    for block in blocks:
+        file.write(np.ascontiguousarray(block, dtype="<f8").data)
+
+
+def _write_grid_npy(path, easting, northing, blocks, name, units, rows, compress):
+    with open(path, "wb") as file:
+        _write_npy(file, blocks, (northing.size, easting.size))
+
+
+def _write_grid_npz(path, easting, northing, blocks, name, units, rows, compress):
+    method = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with zipfile.ZipFile(path, "w", compression=method) as archive:
+        for label, array in (("easting", easting), ("northing", northing)):
+            with archive.open(f"{label}.npy", "w") as file:
+                np.lib.format.write_array(file, array)
+        with archive.open(f"{name}.npy", "w", force_zip64=True) as file:
+            _write_npy(file, blocks, (northing.size, easting.size))
+
+
+def _write_grid_hdf5(path, easting, northing, blocks, name, units, rows, compress):
+    h5py = _import_h5py()
+    shape = (northing.size, easting.size)
+    with h5py.File(path, "w") as file:
+        scales = []
+        for label, array in (("northing", northing), ("easting", easting)):
+            scale = file.create_dataset(label, data=array)
+            scale.make_scale(label)
+            scales.append(scale)
+        dataset = file.create_dataset(
+            name,
+            shape=shape,
+            dtype=np.float64,
+            chunks=(max(1, min(rows, shape[0])), max(1, shape[1])),
+            compression="gzip" if compress else None,
+            fillvalue=np.nan,
+        )
+        dataset.attrs["units"] = units
+        for axis, scale in enumerate(scales):
+            dataset.dims[axis].attach_scale(scale)
+        start = 0
+        for block in blocks:
+            dataset[start : start + block.shape[0]] = block
+            start += block.shape[0]
+
+
+def _write_grid_zarr(path, easting, northing, blocks, name, units, rows, compress):
+    shape = (northing.size, easting.size)
+    # Remove the chunks and metadata of an existing grid
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+    os.makedirs(path)
+    _write_json(os.path.join(path, ".zgroup"), {"zarr_format": 2})
+    _write_json(os.path.join(path, ".zattrs"), {})
+    for label, array in (("easting", easting), ("northing", northing)):
+        _write_zarr_array(path, label, [label], array.shape, array.shape, compress)
+        _write_zarr_chunk(path, label, "0", array, compress)
+    chunks = (max(1, min(rows, shape[0])), shape[1])
+    _write_zarr_array(
+        path, name, ["northing", "easting"], shape, chunks, compress, units=units
+    )
+    for index, chunk in _rechunk(blocks, shape, chunks[0]):
+        _write_zarr_chunk(path, name, f"{index}.0", chunk, compress)
+
+
+def _write_zarr_array(path, name, dims, shape, chunks, compress, **attrs):
+    """
+    Write the metadata of an array of a Zarr (version 2) directory.
+    """
+    directory = os.path.join(path, name)
+    os.makedirs(directory, exist_ok=True)
+    metadata = {
+        "zarr_format": 2,
+        "shape": list(shape),
+        "chunks": list(chunks),
+        "dtype": "<f8",
+        "compressor": {"id": "zlib", "level": 1} if compress else None,
+        "fill_value": "NaN",
+        "order": "C",
+        "filters": None,
+        "dimension_separator": ".",
+    }
+    _write_json(os.path.join(directory, ".zarray"), metadata)
+    _write_json(
+        os.path.join(directory, ".zattrs"), {"_ARRAY_DIMENSIONS": dims, **attrs}
+    )
+
+
+def _write_zarr_chunk(path, name, key, chunk, compress):
+    data = np.ascontiguousarray(chunk, dtype="<f8").tobytes()
+    if compress:
+        data = zlib.compress(data, 1)
+    with open(os.path.join(path, name, key), "wb") as file:
+        file.write(data)
+
+
+def _write_json(path, content):
+    with open(path, "w") as file:
+        json.dump(content, file, indent=4)
+
+
+def _write_sources_csv(path, columns, block_size=65536):
+    """
+    Write sources as comma separated text, formatting blocks of rows at once.
+    """
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(columns)
+        for start in range(0, columns["x"].size, block_size):
+            writer.writerows(
+                zip(*(i[start : start + block_size].tolist() for i in columns.values()))
+            )
+
+
+def _import_h5py():
+    try:
+        import h5py
+    except ImportError as error:
+        raise ImportError(
+            "Writing HDF5 and NetCDF files requires the 'h5py' package to be "
+            "installed."
+        ) from error
+    return h5py
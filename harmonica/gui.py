@@ -0,0 +1,702 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Helpers to run forward models from Tk applications without blocking them.
+"""
+
+import inspect
+import queue
+import re
+import threading
+
+import numpy as np
+
+
+class ComputeWorker:
+    """
+    Run computations on a background thread and hand results to Tk.
+
+    Requests are computed one at a time on a daemon thread. Only the latest
+    request matters: submitting a new one supersedes the one waiting to be
+    computed, and the result of a computation that was superseded while
+    running is discarded. Results are passed to ``on_result`` on the Tk
+    thread, by polling with ``widget.after``, so callbacks can safely update
+    widgets and Matplotlib figures.
+
+    The computation itself can't be interrupted once it started, but
+    ``compute`` may accept a ``is_stale`` keyword argument: a function that
+    returns True once the request has been superseded, so long computations
+    can check it and stop early by raising :class:`Superseded`.
+
+    If ``compute`` returns a generator, every value it yields is handed to
+    ``on_result`` as soon as it's ready (e.g. progressively refined maps) and
+    the generator is closed between two values once the request has been
+    superseded.
+
+    Parameters
+    ----------
+    widget : tkinter widget
+        Any widget of the application (usually the root window), used to
+        schedule the polling.
+    compute : callable
+        Function called on the background thread with the arguments given to
+        :meth:`submit`. It must not touch any Tk widget.
+    on_result : callable
+        Function called on the Tk thread with the value returned by
+        ``compute``.
+    on_error : callable or None (optional)
+        Function called on the Tk thread with the exception raised by
+        ``compute``. If None, the exception is re-raised on the Tk thread.
+        Default None.
+    poll_interval : int (optional)
+        Milliseconds between checks for finished computations. Default 25.
+    pass_stale_check : bool (optional)
+        If True, ``compute`` is called with an extra ``is_stale`` keyword
+        argument. Default False.
+    """
+
+    def __init__(
+        self,
+        widget,
+        compute,
+        on_result,
+        on_error=None,
+        poll_interval=25,
+        pass_stale_check=False,
+    ):
+        self.widget = widget
+        self.compute = compute
+        self.on_result = on_result
+        self.on_error = on_error
+        self.poll_interval = poll_interval
+        self.pass_stale_check = pass_stale_check
+        self.generation = 0
+        self.running = False
+        self._pending = None
+        self._condition = threading.Condition()
+        self._results = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="harmonica-gui-worker", daemon=True
+        )
+        self._thread.start()
+        self.widget.after(self.poll_interval, self._poll)
+
+    @property
+    def busy(self):
+        """
+        True if a request is waiting or being computed.
+        """
+        with self._condition:
+            return self.running or self._pending is not None
+
+    def submit(self, *args, **kwargs):
+        """
+        Request a computation, superseding any previous request.
+
+        The arguments are passed to ``compute``. Pass copies of any mutable
+        state (e.g. the list of sources) since ``compute`` runs later on
+        another thread.
+        """
+        with self._condition:
+            self.generation += 1
+            self._pending = (self.generation, args, kwargs)
+            self._condition.notify()
+
+    def cancel(self):
+        """
+        Drop the pending request and discard the result of the running one.
+        """
+        with self._condition:
+            self.generation += 1
+            self._pending = None
+
+    def is_stale(self, generation):
+        """
+        Check if a request has been superseded by a newer one.
+        """
+        return generation != self.generation
+
+    def _run(self):
+        """
+        Compute the latest request whenever there is one.
+        """
+        while True:
+            with self._condition:
+                while self._pending is None:
+                    self._condition.wait()
+                generation, args, kwargs = self._pending
+                self._pending = None
+                self.running = True
+            if self.pass_stale_check:
+                kwargs = dict(kwargs, is_stale=lambda: self.is_stale(generation))
+            try:
+                result = self.compute(*args, **kwargs)
+                if inspect.isgenerator(result):
+                    for partial in result:
+                        if self.is_stale(generation):
+                            result.close()
+                            break
+                        self._results.put((generation, partial, None))
+                else:
+                    self._results.put((generation, result, None))
+            except Superseded:
+                pass
+            except Exception as exception:
+                self._results.put((generation, None, exception))
+            with self._condition:
+                self.running = False
+
+    def _poll(self):
+        """
+        Hand the finished results to the callbacks and poll again later.
+        """
+        try:
+            while True:
+                generation, result, error = self._results.get_nowait()
+                # Skip results of superseded requests
+                if self.is_stale(generation):
+                    continue
+                if error is None:
+                    self.on_result(result)
+                elif self.on_error is not None:
+                    self.on_error(error)
+                else:
+                    raise error
+        except queue.Empty:
+            pass
+        finally:
+            self.widget.after(self.poll_interval, self._poll)
+
+
+class BufferPool:
+    """
+    Thread-safe pool of reusable output arrays.
+
+    Lets a background computation write into arrays allocated by previous
+    ones while the Tk thread is still drawing the latest result: arrays are
+    taken from the pool by the computation and given back once drawn.
+    Arrays that are never given back (e.g. superseded results) are simply
+    garbage collected.
+    """
+
+    def __init__(self):
+        self._free = queue.Queue()
+
+    def take(self, *shapes):
+        """
+        Return a tuple of float64 arrays (uninitialised) with the given shapes.
+        """
+        shapes = tuple(tuple(np.atleast_1d(shape)) for shape in shapes)
+        while True:
+            try:
+                arrays = self._free.get_nowait()
+            except queue.Empty:
+                return tuple(np.empty(shape) for shape in shapes)
+            # Drop arrays with stale shapes (e.g. after a resolution change)
+            if tuple(array.shape for array in arrays) == shapes:
+                return arrays
+
+    def give(self, *arrays):
+        """
+        Give arrays returned by :meth:`take` back to the pool.
+        """
+        self._free.put(arrays)
+
+
+class FrameScheduler:
+    """
+    Coalesce bursts of Tk events into at most one call per frame.
+
+    Events like ``<Configure>`` (window resizes) or slider moves arrive in
+    bursts much faster than a figure can be recomputed or drawn. Instead of
+    handling each one, callbacks are requested under a key: requests with
+    the same key within a frame replace each other, so only the latest
+    state is handled, once. Pending calls run together at the end of the
+    frame, in the order given by ``order`` (e.g. resize, then compute, then
+    draw).
+
+    Parameters
+    ----------
+    widget : tkinter widget
+        Any widget of the application (usually the root window), used to
+        schedule the frames with ``widget.after``.
+    interval : int (optional)
+        Milliseconds between frames. Default 16 (about 60 frames per
+        second).
+    order : tuple of str (optional)
+        Keys in the order their calls run within a frame. Other keys run
+        after them, in the order they were first requested. Default ``()``.
+    """
+
+    def __init__(self, widget, interval=16, order=()):
+        self.widget = widget
+        self.interval = interval
+        self.order = tuple(order)
+        self._tasks = {}
+        self._frame = None
+        self._deferred = {}
+
+    def request(self, key, callback, *args):
+        """
+        Call ``callback(*args)`` on the next frame.
+
+        Replaces any call pending under the same key.
+        """
+        self._tasks[key] = (callback, args)
+        if self._frame is None:
+            self._frame = self.widget.after(self.interval, self._run)
+
+    def defer(self, key, delay, callback, *args):
+        """
+        Request ``callback(*args)`` once a burst of deferrals is over.
+
+        The call is requested when no other deferral with the same key
+        happened for ``delay`` milliseconds (e.g. once the window stopped
+        being resized).
+        """
+        if key in self._deferred:
+            self.widget.after_cancel(self._deferred.pop(key))
+        self._deferred[key] = self.widget.after(
+            delay, self._run_deferred, key, callback, args
+        )
+
+    def cancel(self, key):
+        """
+        Drop the call pending (or deferred) under a key, if any.
+        """
+        self._tasks.pop(key, None)
+        if key in self._deferred:
+            self.widget.after_cancel(self._deferred.pop(key))
+
+    def flush(self):
+        """
+        Run the pending calls now instead of waiting for the next frame.
+        """
+        if self._frame is not None:
+            self.widget.after_cancel(self._frame)
+        self._run()
+
+    def _run_deferred(self, key, callback, args):
+        """
+        Move a deferred call to the next frame.
+        """
+        del self._deferred[key]
+        self.request(key, callback, *args)
+
+    def _run(self):
+        """
+        Run the calls requested during the frame.
+
+        Calls requested by the callbacks under keys that didn't run yet (e.g.
+        a resize requesting a draw) run on the same frame, the others on the
+        next one.
+        """
+        rank = {key: i for i, key in enumerate(self.order)}
+        done = set()
+        try:
+            while pending := [key for key in self._tasks if key not in done]:
+                key = min(pending, key=lambda key: rank.get(key, len(rank)))
+                callback, args = self._tasks.pop(key)
+                done.add(key)
+                callback(*args)
+        finally:
+            self._frame = None
+            if self._tasks:
+                self._frame = self.widget.after(self.interval, self._run)
+
+
+class ProfileEditor:
+    """
+    Draw profile polylines on Matplotlib axes with the mouse.
+
+    Once :meth:`start` is called, left clicks on the axes add vertices to a
+    new profile and a right click or a double click finishes it. Finished
+    profiles are drawn on the axes as lines labelled ``P1``, ``P2``, etc.,
+    using the colors ``C0``, ``C1``, etc. of the Matplotlib color cycle.
+
+    Parameters
+    ----------
+    ax : :class:`matplotlib.axes.Axes`
+        Axes where the profiles are drawn (usually the map).
+    on_change : callable
+        Function called without arguments when a profile is added or the
+        profiles are cleared.
+    draw : callable or None (optional)
+        Function called to redraw the figure while a profile is being drawn.
+        If None, ``draw_idle`` of the figure canvas is used. Default None.
+
+    Attributes
+    ----------
+    profiles : list of tuples
+        Easting and northing of the vertices of each finished profile.
+    """
+
+    def __init__(self, ax, on_change, draw=None):
+        self.ax = ax
+        self.on_change = on_change
+        self.draw = draw if draw is not None else ax.figure.canvas.draw_idle
+        self.profiles = []
+        self.active = False
+        self._vertices = []
+        self._artists = []
+        (self._sketch,) = ax.plot([], [], "--", color="white", linewidth=1, zorder=8)
+        ax.figure.canvas.mpl_connect("button_press_event", self._on_press)
+
+    @staticmethod
+    def color(index):
+        """
+        Return the color of a profile given its index.
+        """
+        return f"C{index % 10}"
+
+    def start(self):
+        """
+        Start drawing a new profile with the next clicks.
+        """
+        self.active = True
+        self._vertices = []
+
+    def clear(self):
+        """
+        Remove every profile.
+        """
+        for artist in self._artists:
+            artist.remove()
+        self._artists = []
+        self.profiles = []
+        self.active = False
+        self._vertices = []
+        self._sketch.set_data([], [])
+        self.draw()
+        self.on_change()
+
+    def _on_press(self, event):
+        """
+        Add a vertex or finish the profile being drawn.
+        """
+        if not self.active or event.inaxes is not self.ax or event.xdata is None:
+            return
+        if event.button == 1 and not event.dblclick:
+            self._vertices.append((event.xdata, event.ydata))
+            self._sketch.set_data(*zip(*self._vertices))
+            self.draw()
+        elif event.button == 3 or event.dblclick:
+            self._finish()
+
+    def _finish(self):
+        """
+        Store the profile being drawn, if it has at least two vertices.
+        """
+        vertices = self._vertices
+        self.active = False
+        self._vertices = []
+        self._sketch.set_data([], [])
+        if len(set(vertices)) < 2:
+            self.draw()
+            return
+        easting, northing = (np.array(i) for i in zip(*vertices))
+        color = self.color(len(self.profiles))
+        self.profiles.append((easting, northing))
+        (line,) = self.ax.plot(easting, northing, color=color, linewidth=2, zorder=7)
+        label = self.ax.text(
+            easting[0],
+            northing[0],
+            f"P{len(self.profiles)}",
+            color=color,
+            fontsize=9,
+            weight="bold",
+            zorder=7,
+        )
+        self._artists.extend([line, label])
+        self.draw()
+        self.on_change()
+
+
+class SourceList:
+    """
+    Virtual list of point sources for Tk, with search and filtering.
+
+    Shows the sources of a :class:`harmonica.sources.SourceStore` in a
+    ``ttk.Treeview`` that only holds as many rows as are visible. Scrolling
+    formats the visible rows from the columns of the store, so memory and
+    redraw costs don't depend on the number of sources.
+
+    The search box filters the sources with space separated terms that must
+    all match: comparisons of a column with a number (``x>100``,
+    ``rho<=0``, ``z=20``) or text contained in the names (case
+    insensitive).
+
+    Parameters
+    ----------
+    master : tkinter widget
+        Parent widget.
+    store : :class:`harmonica.sources.SourceStore`
+        Sources shown on the list. Call :meth:`refresh` after changing them.
+    height : int (optional)
+        Number of visible rows. Default 12.
+    on_select : callable or None (optional)
+        Function called with the index of a source in the store when it's
+        selected. Default None.
+
+    Attributes
+    ----------
+    frame : :class:`tkinter.ttk.Frame`
+        Frame with the search box, the list and its scrollbar, to be placed
+        with ``grid`` or ``pack``.
+    """
+
+    # Column of the store, heading, width in pixels and number format
+    columns = (
+        ("names", "Name", 90, None),
+        ("x", "x", 70, ".1f"),
+        ("z", "z", 70, ".1f"),
+        ("rho", "ρ", 90, ".0f"),
+    )
+
+    def __init__(self, master, store, height=12, on_select=None):
+        from tkinter import ttk
+
+        self.store = store
+        self.height = height
+        self.on_select = on_select
+        self._view = None
+        self._top = 0
+        self._selected = None
+        self._search = None
+        self.frame = ttk.Frame(master)
+        self.query = ttk.Entry(self.frame)
+        self.query.grid(row=0, column=0, columnspan=2, sticky="ew", pady=(0, 2))
+        self.query.bind("<KeyRelease>", self._on_query)
+        self.tree = ttk.Treeview(
+            self.frame,
+            columns=[name for name, *_ in self.columns],
+            show="headings",
+            height=height,
+            selectmode="browse",
+        )
+        for name, heading, width, spec in self.columns:
+            self.tree.heading(name, text=heading)
+            self.tree.column(name, width=width, anchor="w" if spec is None else "e")
+        for row in range(height):
+            self.tree.insert("", "end", iid=str(row), values=())
+        self.tree.grid(row=1, column=0, sticky="nsew")
+        self.scrollbar = ttk.Scrollbar(
+            self.frame, orient="vertical", command=self.yview
+        )
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+        self.frame.columnconfigure(0, weight=1)
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda event: self.yview("scroll", -3, "units"))
+        self.tree.bind("<Button-5>", lambda event: self.yview("scroll", 3, "units"))
+        self.tree.bind("<Up>", lambda event: self._step(-1))
+        self.tree.bind("<Down>", lambda event: self._step(1))
+        self.refresh()
+
+    def __len__(self):
+        return len(self.store) if self._view is None else self._view.size
+
+    def refresh(self):
+        """
+        Apply the filter again and redraw the visible rows.
+
+        Call it after adding, editing or removing sources in the store.
+        """
+        self._view = self._match(self.query.get())
+        if self._selected is not None and self._selected >= len(self.store):
+            self._selected = None
+        self._draw()
+
+    def curselection(self):
+        """
+        Return the store index of the selected source, like ``Listbox``.
+        """
+        return () if self._selected is None else (self._selected,)
+
+    def selection_clear(self):
+        """
+        Unselect the selected source.
+        """
+        self._selected = None
+        self._draw()
+
+    def see(self, index):
+        """
+        Scroll the list so a source (given by its store index) is visible.
+        """
+        if self._view is not None:
+            positions = np.flatnonzero(self._view == index)
+            if not positions.size:
+                return
+            index = positions[0]
+        if not self._top <= index < self._top + self.height:
+            self._top = index - self.height // 2
+        self._draw()
+
+    def yview(self, *args):
+        """
+        Scroll the list (``command`` of the scrollbar).
+        """
+        if args[0] == "moveto":
+            self._top = int(round(float(args[1]) * len(self)))
+        elif args[0] == "scroll":
+            step = self.height if args[2] == "pages" else 1
+            self._top += int(args[1]) * step
+        self._draw()
+
+    def _draw(self):
+        """
+        Format the visible rows from the store columns.
+        """
+        count = len(self)
+        self._top = max(0, min(self._top, count - self.height))
+        rows = np.arange(self._top, min(self._top + self.height, count))
+        indices = rows if self._view is None else self._view[rows]
+        # Names are built only for the visible rows
+        columns = [
+            (
+                self.store.names_at(indices)
+                if name == "names"
+                else getattr(self.store, name)[indices]
+            )
+            for name, *_ in self.columns
+        ]
+        selected = ()
+        for row in range(self.height):
+            values = ()
+            if row < indices.size:
+                values = [
+                    str(column[row]) if spec is None else format(column[row], spec)
+                    for column, (*_, spec) in zip(columns, self.columns)
+                ]
+                if indices[row] == self._selected:
+                    selected = (str(row),)
+            self.tree.item(str(row), values=values)
+        self.tree.selection_set(selected)
+        if count:
+            self.scrollbar.set(self._top / count, (self._top + indices.size) / count)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _match(self, query):
+        """
+        Return the store indices of the sources that match a query, or None.
+        """
+        terms = query.split()
+        if not terms:
+            return None
+        mask = np.ones(len(self.store), dtype=bool)
+        for term in terms:
+            comparison = _FILTER_TERM.fullmatch(term)
+            if comparison is None:
+                mask &= self.store.names_containing(term)
+                continue
+            column, operator, value = comparison.groups()
+            mask &= _COMPARISONS[operator](getattr(self.store, column), float(value))
+        return np.flatnonzero(mask)
+
+    def _on_query(self, event=None):
+        """
+        Filter again once the search box stopped changing for a moment.
+        """
+        if self._search is not None:
+            self.frame.after_cancel(self._search)
+        self._search = self.frame.after(200, self._run_query)
+
+    def _run_query(self):
+        self._search = None
+        self._top = 0
+        self.refresh()
+
+    def _on_tree_select(self, event=None):
+        """
+        Translate the selected row into a store index.
+        """
+        rows = self.tree.selection()
+        if not rows:
+            return
+        position = self._top + int(rows[0])
+        if position >= len(self):
+            return
+        index = position if self._view is None else int(self._view[position])
+        if index == self._selected:
+            return
+        self._selected = index
+        if self.on_select is not None:
+            self.on_select(index)
+
+    def _on_wheel(self, event):
+        self.yview("scroll", -3 if event.delta > 0 else 3, "units")
+        return "break"
+
+    def _step(self, step):
+        """
+        Move the selection with the arrow keys, scrolling past the edges.
+        """
+        rows = self.tree.selection()
+        row = int(rows[0]) + step if rows else 0
+        if not 0 <= row < self.height:
+            self.yview("scroll", step, "units")
+            row = min(max(row, 0), self.height - 1)
+        self.tree.selection_set((str(row),))
+        return "break"
+
+
+# Filter terms that compare a column with a number, e.g. "x>=100"
+_FILTER_TERM = re.compile(
+    r"(x|z|rho)(<=|>=|!=|==|=|<|>)([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+)
+_COMPARISONS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "=": np.equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+
+def viewport_resolution(ax, max_size=None, min_size=16):
+    """
+    Return the number of grid nodes that fit on Matplotlib axes.
+
+    A map drawn on the axes can't show more nodes than the axes have display
+    pixels, so their size in pixels (which accounts for the DPI of the
+    figure) is the finest resolution worth computing. Small windows get
+    coarse and cheap grids.
+
+    Parameters
+    ----------
+    ax : :class:`matplotlib.axes.Axes`
+        Axes where the map is drawn.
+    max_size : int or None (optional)
+        Maximum number of nodes along each direction (e.g. while the window
+        is being resized). If None, no maximum is applied. Default None.
+    min_size : int (optional)
+        Minimum number of nodes along each direction. Default 16.
+
+    Returns
+    -------
+    size : tuple of int
+        Number of nodes along the horizontal and vertical directions of the
+        axes.
+    """
+    bbox = ax.get_window_extent()
+    size = []
+    for pixels in (bbox.width, bbox.height):
+        nodes = max(min_size, int(np.ceil(pixels)))
+        if max_size is not None:
+            nodes = min(nodes, max_size)
+        size.append(nodes)
+    return tuple(size)
+
+
+class Superseded(Exception):
+    """
+    Raised by computations that stop early because of a newer request.
+    """
@@ -0,0 +1,42 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Content hashing of arrays used to key cached results.
+"""
+
+import hashlib
+
+import numpy as np
+
+
+def hash_arrays(*arrays, params=()):
+    """
+    Compute a digest of the content of some arrays and extra parameters.
+
+    The digest takes into account the data type, shape and values of every
+    array, so equal arrays always produce the same digest regardless of their
+    memory layout.
+
+    Parameters
+    ----------
+    arrays : arrays
+        Arrays to hash.
+    params : tuple (optional)
+        Extra parameters included in the digest. Their ``repr`` is hashed.
+
+    Returns
+    -------
+    digest : str
+        Hexadecimal digest of 32 characters.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(array.data)
+    digest.update(repr(tuple(params)).encode())
+    return digest.hexdigest()
@@ -0,0 +1,423 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Hierarchical low-rank representation of the point-mass sensitivity matrix.
+"""
+
+import numpy as np
+
+from .coordinates import spherical_to_geocentric
+from .point import (
+    check_coordinate_system,
+    get_field_factor,
+    get_kernel,
+    prepare_sensitivity_coordinates,
+    sensitivity_dispatcher,
+)
+
+
+class HMatrix:
+    """
+    Hierarchical matrix with dense and low-rank blocks.
+
+    Rows and columns are permuted so every cluster of the hierarchical
+    partition is a contiguous range of indices. Each block stores either a
+    dense array or a pair of factors ``(U, V)`` such that the block is
+    approximated by ``U @ V``.
+
+    Don't create instances of this class directly, use
+    :func:`point_sensitivity_hmatrix` instead.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Shape of the full matrix.
+    row_order : 1d-array of int
+        Permutation applied to the rows.
+    column_order : 1d-array of int
+        Permutation applied to the columns.
+    blocks : list of tuples
+        Every block given as ``(row_slice, column_slice, dense, factors)``,
+        where ``dense`` is None for low-rank blocks and ``factors`` is None for
+        dense ones.
+    dtype : data-type
+        Data type of the matrix.
+    """
+
+    def __init__(self, shape, row_order, column_order, blocks, dtype):
+        self.shape = shape
+        self.row_order = row_order
+        self.column_order = column_order
+        self.blocks = blocks
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def nbytes(self):
+        """
+        Number of bytes used to store the blocks.
+        """
+        nbytes = 0
+        for _, _, dense, factors in self.blocks:
+            if dense is not None:
+                nbytes += dense.nbytes
+            else:
+                nbytes += factors[0].nbytes + factors[1].nbytes
+        return nbytes
+
+    @property
+    def compression_ratio(self):
+        """
+        Ratio between the memory needed by the dense matrix and the H-matrix.
+        """
+        dense_nbytes = self.shape[0] * self.shape[1] * self.dtype.itemsize
+        return dense_nbytes / max(self.nbytes, 1)
+
+    @property
+    def ranks(self):
+        """
+        Rank of every low-rank block.
+        """
+        return np.array(
+            [factors[0].shape[1] for _, _, _, factors in self.blocks if factors],
+            dtype=int,
+        )
+
+    def matvec(self, vector):
+        """
+        Compute the product between the matrix and a vector.
+
+        Parameters
+        ----------
+        vector : 1d-array
+            Vector with as many elements as columns has the matrix, e.g. the
+            masses of the point masses.
+
+        Returns
+        -------
+        result : 1d-array
+            Vector with as many elements as rows has the matrix, e.g. the field
+            on every computation point.
+        """
+        vector = np.asarray(vector).ravel()
+        if vector.size != self.shape[1]:
+            raise ValueError(
+                f"Number of elements in vector ({vector.size}) "
+                + f"mismatch the number of columns of the matrix ({self.shape[1]})"
+            )
+        permuted = vector[self.column_order]
+        result = np.zeros(self.shape[0], dtype=np.result_type(self.dtype, vector))
+        for rows, columns, dense, factors in self.blocks:
+            if dense is not None:
+                result[rows] += dense @ permuted[columns]
+            else:
+                result[rows] += factors[0] @ (factors[1] @ permuted[columns])
+        out = np.empty_like(result)
+        out[self.row_order] = result
+        return out
+
+    def rmatvec(self, vector):
+        """
+        Compute the product between the transpose of the matrix and a vector.
+
+        Parameters
+        ----------
+        vector : 1d-array
+            Vector with as many elements as rows has the matrix, e.g. the
+            residuals on every computation point.
+
+        Returns
+        -------
+        result : 1d-array
+            Vector with as many elements as columns has the matrix.
+        """
+        vector = np.asarray(vector).ravel()
+        if vector.size != self.shape[0]:
+            raise ValueError(
+                f"Number of elements in vector ({vector.size}) "
+                + f"mismatch the number of rows of the matrix ({self.shape[0]})"
+            )
+        permuted = vector[self.row_order]
+        result = np.zeros(self.shape[1], dtype=np.result_type(self.dtype, vector))
+        for rows, columns, dense, factors in self.blocks:
+            if dense is not None:
+                result[columns] += permuted[rows] @ dense
+            else:
+                result[columns] += (permuted[rows] @ factors[0]) @ factors[1]
+        out = np.empty_like(result)
+        out[self.column_order] = result
+        return out
+
+    def __matmul__(self, vector):
+        return self.matvec(vector)
+
+    def dot(self, vector):
+        """
+        Compute the product between the matrix and a vector.
+
+        Same as :meth:`HMatrix.matvec`.
+        """
+        return self.matvec(vector)
+
+    def todense(self):
+        """
+        Assemble the full matrix as a dense array.
+        """
+        permuted = np.zeros(self.shape, dtype=self.dtype)
+        for rows, columns, dense, factors in self.blocks:
+            permuted[rows, columns] = dense if dense is not None else np.dot(*factors)
+        out = np.empty_like(permuted)
+        out[np.ix_(self.row_order, self.column_order)] = permuted
+        return out
+
+
+def point_sensitivity_hmatrix(
+    coordinates,
+    points,
+    field,
+    coordinate_system="cartesian",
+    tolerance=1e-6,
+    leaf_size=64,
+    eta=2.0,
+    max_rank=None,
+    parallel=True,
+    dtype="float64",
+):
+    r"""
+    Build a hierarchical matrix for the sensitivity of point masses.
+
+    The sensitivity (or Jacobian) matrix relates the masses of the point
+    masses with the gravitational field they generate on the computation
+    points: its element :math:`(i, j)` is the ``field`` generated on the
+    :math:`i`-th computation point by a unit mass located on the :math:`j`-th
+    point mass, in the same units as :func:`harmonica.point.point_gravity`.
+
+    Computation points and point masses are recursively bisected into clusters.
+    Blocks between well separated clusters are approximated by low-rank
+    factors built through Adaptive Cross Approximation (ACA) with partial
+    pivoting, which only evaluates a few rows and columns of each block using
+    the kernels returned by :func:`harmonica.point.get_kernel`. The rest of
+    the blocks are stored as dense arrays.
+
+    Parameters
+    ----------
+    coordinates : list of arrays
+        Coordinates of the computation points, given as in
+        :func:`harmonica.point.point_gravity`.
+    points : list or array
+        Coordinates of the point masses, given as in
+        :func:`harmonica.point.point_gravity`.
+    field : str
+        Gravitational field that wants to be computed. Same options as in
+        :func:`harmonica.point.point_gravity`.
+    coordinate_system : str (optional)
+        Coordinate system of the computation points and the point masses.
+        Available coordinates systems: ``cartesian``, ``spherical``.
+        Default ``cartesian``.
+    tolerance : float (optional)
+        Relative accuracy of the low-rank approximation of each block, measured
+        on its Frobenius norm. Default ``1e-6``.
+    leaf_size : int (optional)
+        Maximum number of elements on the leaves of the cluster trees.
+        Default 64.
+    eta : float (optional)
+        Admissibility parameter. A pair of clusters is approximated by
+        a low-rank block if the smallest of their diameters is lower than
+        ``eta`` times the distance between them. Default 2.
+    max_rank : int or None (optional)
+        Maximum rank of the low-rank blocks. If None, the ACA stops only when
+        the ``tolerance`` is reached or when storing the block as dense is
+        cheaper. Default None.
+    parallel : bool (optional)
+        If True the rows and columns of the blocks will be computed in parallel
+        using Numba built-in parallelization. Default True.
+    dtype : data-type (optional)
+        Data type of the stored blocks. Default to ``np.float64``.
+
+    Returns
+    -------
+    hmatrix : :class:`HMatrix`
+        Hierarchical representation of the sensitivity matrix, with
+        ``matvec`` and ``rmatvec`` methods.
+
+    Notes
+    -----
+    For ``N`` computation points and point masses, both the storage and the
+    cost of the matrix-vector products scale with :math:`O(k N \log N)`, where
+    :math:`k` is the typical rank of the low-rank blocks.
+    """
+    check_coordinate_system(
+        coordinate_system, valid_coord_systems=("cartesian", "spherical")
+    )
+    kernel = get_kernel(coordinate_system, field)
+    factor = get_field_factor(field)
+    function = sensitivity_dispatcher(coordinate_system, parallel)
+    stations = prepare_sensitivity_coordinates(coordinates, coordinate_system)
+    sources = prepare_sensitivity_coordinates(points, coordinate_system)
+
+    def evaluate(rows, columns):
+        block = np.empty((rows.size, columns.size), dtype=np.float64)
+        function(*stations, *sources, rows, columns, block, kernel)
+        block *= factor
+        return block.astype(dtype, copy=False)
+
+    # Build cluster trees on Cartesian coordinates
+    if coordinate_system == "spherical":
+        station_xyz = spherical_to_geocentric(*coordinates[:3])
+        source_xyz = spherical_to_geocentric(*points[:3])
+    else:
+        station_xyz = np.vstack([np.ravel(i) for i in coordinates[:3]])
+        source_xyz = np.vstack([np.ravel(i) for i in points[:3]])
+    row_order, row_tree = _cluster_tree(station_xyz, leaf_size)
+    column_order, column_tree = _cluster_tree(source_xyz, leaf_size)
+    # Build the blocks of the partition
+    blocks = []
+    for row_node, column_node, admissible in _block_partition(
+        row_tree, column_tree, eta
+    ):
+        rows = row_order[row_node.start : row_node.stop]
+        columns = column_order[column_node.start : column_node.stop]
+        factors = None
+        if admissible:
+            factors = _adaptive_cross_approximation(
+                evaluate, rows, columns, tolerance, max_rank
+            )
+        dense = evaluate(rows, columns) if factors is None else None
+        blocks.append(
+            (
+                slice(row_node.start, row_node.stop),
+                slice(column_node.start, column_node.stop),
+                dense,
+                factors,
+            )
+        )
+    shape = (station_xyz.shape[1], source_xyz.shape[1])
+    return HMatrix(shape, row_order, column_order, blocks, dtype)
+
+
+class _ClusterNode:
+    """
+    Node of a cluster tree: a contiguous range of the permuted indices.
+    """
+
+    def __init__(self, start, stop, lower, upper):
+        self.start = start
+        self.stop = stop
+        self.lower = lower
+        self.upper = upper
+        self.children = []
+
+    @property
+    def diameter(self):
+        return np.sqrt(((self.upper - self.lower) ** 2).sum())
+
+    def distance(self, other):
+        gap = np.maximum(
+            np.maximum(self.lower - other.upper, other.lower - self.upper), 0
+        )
+        return np.sqrt((gap**2).sum())
+
+
+def _cluster_tree(xyz, leaf_size):
+    """
+    Bisect the points along their longest dimension until reaching leaf_size.
+
+    Returns the permutation of the points and the root of the tree.
+    """
+    order = np.arange(xyz.shape[1])
+    root = _ClusterNode(0, order.size, xyz.min(axis=1), xyz.max(axis=1))
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        size = node.stop - node.start
+        if size <= leaf_size:
+            continue
+        indices = order[node.start : node.stop]
+        coords = xyz[:, indices]
+        dimension = np.argmax(node.upper - node.lower)
+        half = size // 2
+        split = np.argpartition(coords[dimension], half)
+        order[node.start : node.stop] = indices[split]
+        for start, stop in (
+            (node.start, node.start + half),
+            (node.start + half, node.stop),
+        ):
+            child_coords = xyz[:, order[start:stop]]
+            child = _ClusterNode(
+                start, stop, child_coords.min(axis=1), child_coords.max(axis=1)
+            )
+            node.children.append(child)
+            stack.append(child)
+    return order, root
+
+
+def _block_partition(row_tree, column_tree, eta):
+    """
+    Generate the blocks of the partition as (row_node, column_node, admissible).
+    """
+    stack = [(row_tree, column_tree)]
+    while stack:
+        row_node, column_node = stack.pop()
+        distance = row_node.distance(column_node)
+        if min(row_node.diameter, column_node.diameter) < eta * distance:
+            yield row_node, column_node, True
+        elif not row_node.children and not column_node.children:
+            yield row_node, column_node, False
+        elif not column_node.children or (
+            row_node.children
+            and row_node.stop - row_node.start >= column_node.stop - column_node.start
+        ):
+            stack.extend((child, column_node) for child in row_node.children)
+        else:
+            stack.extend((row_node, child) for child in column_node.children)
+
+
+def _adaptive_cross_approximation(evaluate, rows, columns, tolerance, max_rank):
+    """
+    Approximate a block by low-rank factors using ACA with partial pivoting.
+
+    Returns None if storing the factors would be more expensive than storing
+    the dense block.
+    """
+    nrows, ncolumns = rows.size, columns.size
+    # Stop when the factors take as much memory as the dense block
+    rank_limit = nrows * ncolumns // (nrows + ncolumns)
+    if max_rank is not None:
+        rank_limit = min(rank_limit, max_rank)
+    us, vs = [], []
+    norm2 = 0.0
+    used_rows = np.zeros(nrows, dtype=bool)
+    pivot_row = 0
+    while len(us) < rank_limit:
+        used_rows[pivot_row] = True
+        row = evaluate(rows[pivot_row : pivot_row + 1], columns)[0]
+        for u, v in zip(us, vs):
+            row -= u[pivot_row] * v
+        pivot_column = np.argmax(np.abs(row))
+        if row[pivot_column] == 0:
+            if used_rows.all():
+                break
+            pivot_row = np.argmin(used_rows)
+            continue
+        v = row / row[pivot_column]
+        u = evaluate(rows, columns[pivot_column : pivot_column + 1])[:, 0]
+        for u_prev, v_prev in zip(us, vs):
+            u -= v_prev[pivot_column] * u_prev
+        # Update the Frobenius norm of the approximation
+        norm2 += sum(2 * (u @ u_prev) * (v_prev @ v) for u_prev, v_prev in zip(us, vs))
+        update2 = (u @ u) * (v @ v)
+        norm2 += update2
+        us.append(u)
+        vs.append(v)
+        if update2 <= tolerance**2 * norm2:
+            return np.array(us).T, np.array(vs)
+        if used_rows.all():
+            break
+        candidates = np.where(used_rows, 0, np.abs(u))
+        pivot_row = np.argmax(candidates)
+    if max_rank is not None and len(us) == max_rank:
+        return np.array(us).T, np.array(vs)
+    return None
@@ -0,0 +1,183 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Spatial reordering of points along a Morton (Z-order) space-filling curve.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .hashing import hash_arrays
+
+# Number of bits used to quantize each coordinate (3 x 21 bits fit in 64)
+MORTON_BITS = 21
+
+# Default maximum number of bytes of the permutations cached by
+# morton_permutation
+DEFAULT_PERMUTATION_CACHE_BYTES = 256 * 2**20
+
+# Permutations cached by morton_permutation, keyed by a hash of the points
+_permutations = OrderedDict()
+_permutations_lock = threading.Lock()
+_permutations_cache = {"max_bytes": DEFAULT_PERMUTATION_CACHE_BYTES, "nbytes": 0}
+
+
+def morton_codes(coordinates, bits=MORTON_BITS):
+    """
+    Compute the Morton (Z-order) codes of a set of points.
+
+    Each coordinate is scaled to its bounding interval, quantized to ``bits``
+    bits and the bits of the three coordinates are interleaved. Sorting the
+    points by their codes places points that are close in space close in
+    memory.
+
+    Parameters
+    ----------
+    coordinates : list of arrays
+        The three coordinates of the points. They can be Cartesian or
+        spherical (longitude, latitude and radius).
+    bits : int (optional)
+        Number of bits used for each coordinate. Must be between 1 and 21.
+        Default 21.
+
+    Returns
+    -------
+    codes : 1d-array
+        Morton code of each point as unsigned 64 bits integers.
+    """
+    if not 1 <= bits <= MORTON_BITS:
+        raise ValueError(
+            f"Invalid bits '{bits}'. It must be between 1 and {MORTON_BITS}."
+        )
+    coordinates = [np.asarray(i, dtype=np.float64).ravel() for i in coordinates[:3]]
+    codes = np.zeros(coordinates[0].size, dtype=np.uint64)
+    if codes.size == 0:
+        return codes
+    for axis, values in enumerate(coordinates):
+        minimum, maximum = values.min(), values.max()
+        scale = (2**bits - 1) / (maximum - minimum) if maximum > minimum else 0
+        quantized = ((values - minimum) * scale).astype(np.uint64)
+        codes |= _spread_bits(quantized) << np.uint64(axis)
+    return codes
+
+
+def _spread_bits(values):
+    """
+    Insert two zero bits after each of the lower 21 bits of the values.
+    """
+    values = values & np.uint64(0x1FFFFF)
+    for shift, mask in (
+        (32, 0x1F00000000FFFF),
+        (16, 0x1F0000FF0000FF),
+        (8, 0x100F00F00F00F00F),
+        (4, 0x10C30C30C30C30C3),
+        (2, 0x1249249249249249),
+    ):
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+
+def morton_permutation(coordinates, coordinate_system="cartesian", cache=True):
+    """
+    Return the permutation that sorts the points along a Morton curve.
+
+    Permutations are cached by the content of the coordinates, so repeated
+    calls on the same geometry only pay for hashing the arrays. The cache
+    keeps the most recently used permutations up to a total size that can be
+    changed (or set to zero to disable the cache) with
+    :func:`set_permutation_cache_size`.
+
+    Parameters
+    ----------
+    coordinates : list of arrays
+        The three coordinates of the points.
+    coordinate_system : str (optional)
+        Coordinate system of the points. Only used to tell apart the cached
+        permutations. Default ``cartesian``.
+    cache : bool (optional)
+        If True, the permutation is looked up in and stored on the cache
+        (unless it's bigger than the cache). Default True.
+
+    Returns
+    -------
+    permutation : 1d-array
+        Indices that sort the raveled coordinates along the curve.
+    """
+    coordinates = [np.asarray(i).ravel() for i in coordinates[:3]]
+    if not cache:
+        return np.argsort(morton_codes(coordinates), kind="stable")
+    key = hash_arrays(*coordinates, params=(coordinate_system,))
+    with _permutations_lock:
+        if key in _permutations:
+            _permutations.move_to_end(key)
+            return _permutations[key]
+    permutation = np.argsort(morton_codes(coordinates), kind="stable")
+    permutation.setflags(write=False)
+    with _permutations_lock:
+        if permutation.nbytes <= _permutations_cache["max_bytes"]:
+            if key not in _permutations:
+                _permutations_cache["nbytes"] += permutation.nbytes
+            _permutations[key] = permutation
+            _evict_permutations()
+    return permutation
+
+
+def set_permutation_cache_size(max_bytes):
+    """
+    Set the maximum size of the permutations cached by :func:`morton_permutation`.
+
+    The least recently used permutations are evicted until the cache fits.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Maximum number of bytes held by the cached permutations. Use 0 to
+        disable the cache. Default
+        :data:`DEFAULT_PERMUTATION_CACHE_BYTES` (256 MiB).
+
+    Returns
+    -------
+    previous : int
+        Maximum number of bytes before the call, so it can be restored.
+    """
+    if max_bytes < 0:
+        raise ValueError(f"Invalid max_bytes '{max_bytes}'. It can't be negative.")
+    with _permutations_lock:
+        previous = _permutations_cache["max_bytes"]
+        _permutations_cache["max_bytes"] = max_bytes
+        _evict_permutations()
+    return previous
+
+
+def permutation_cache_nbytes():
+    """
+    Return the number of bytes held by the cached permutations.
+    """
+    with _permutations_lock:
+        return _permutations_cache["nbytes"]
+
+
+def clear_permutation_cache():
+    """
+    Remove every permutation cached by :func:`morton_permutation`.
+    """
+    with _permutations_lock:
+        _permutations.clear()
+        _permutations_cache["nbytes"] = 0
+
+
+def _evict_permutations():
+    """
+    Evict the least recently used permutations until the cache fits.
+
+    Must be called holding the lock.
+    """
+    while _permutations_cache["nbytes"] > _permutations_cache["max_bytes"]:
+        _, evicted = _permutations.popitem(last=False)
+        _permutations_cache["nbytes"] -= evicted.nbytes
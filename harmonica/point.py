@@ -22,7 +22,9 @@ from choclo.point import (
     gravity_u,
     gravity_uu,
 )
-from numba import jit, prange
+from numba import get_num_threads, jit, prange
+
+from .ordering import morton_permutation
 
 # ============================================================
 # FUNGSI PENGGANTI utils.py AGAR TIDAK PERLU IMPORT RELATIF
@@ -41,6 +43,7 @@ def check_coordinate_system(coord, valid_coord_systems=("cartesian", "spherical"
 
 import numpy as np
 
+@jit(nopython=True, nogil=True)
 def distance_spherical_core(
     lon, cosphi, sinphi, radius,
     lon_p, cosphi_p, sinphi_p, radius_p
@@ -76,6 +79,9 @@ def point_gravity(
     coordinate_system="cartesian",
     parallel=True,
     dtype="float64",
+    reorder=False,
+    out=None,
+    accumulate=False,
 ):
     r"""
     Compute gravitational fields of point masses.
@@ -154,12 +160,33 @@ def point_gravity(
     dtype : data-type (optional)
         Data type assigned to resulting gravitational field. Default to
         ``np.float64``.
+    reorder : bool (optional)
+        If True, the computation points and the point masses are sorted along
+        a Morton (Z-order) curve before running the forward model, and the
+        result is scattered back to the original order. It improves memory
+        locality when the points come in arbitrary order. The permutations
+        are cached, so repeated calls on the same geometry only pay for
+        hashing the coordinates. See
+        :func:`harmonica.ordering.morton_permutation` and
+        :func:`harmonica.ordering.set_permutation_cache_size` to limit or
+        disable the cache. Default to False.
+    out : array or None (optional)
+        Array where the result will be stored. It must be C-contiguous, have
+        the shape of the computation points and the data type given by
+        ``dtype``. If None, a new array is allocated. Default to None.
+    accumulate : bool (optional)
+        If True, the gravitational field is added to the values already in
+        ``out`` instead of overwriting them, so the fields of several groups
+        of point masses can be superposed without extra allocations. The sign
+        and unit conversions are applied to each contribution before adding
+        it. Requires ``out``. Default to False.
 
     Returns
     -------
     result : array
         Gravitational field generated by the ``point_mass`` on the computation
-        points defined in ``coordinates``.
+        points defined in ``coordinates``. If ``out`` is given, ``out`` itself
+        is returned.
         The potential is given in SI units, the accelerations in mGal and the
         Marussi tensor components in Eotvos.
 
@@ -266,6 +293,17 @@ def point_gravity(
         equivalent to the opposite of the radial component, therefore it's
         positive if the acceleration vector points inside the spheroid.
 
+    .. note::
+
+        When working in spherical coordinates with computation points and
+        point masses on global grids that are regular in longitude (arrays
+        whose last axis runs along longitudes with the same spacing that
+        covers the whole globe, and whose latitude and radius are constant
+        along that axis), the kernel only depends on the longitude difference.
+        In that case the contribution of each pair of latitude rows is
+        a circular convolution that is computed through FFTs, reducing the
+        cost of the forward model from :math:`O(N^2)` to about
+        :math:`O(N^{1.5} \log N)`.
 
     """
     # Sanity checks for coordinate_system
@@ -274,8 +312,85 @@ def point_gravity(
     )
     # Figure out the shape and size of the output array
     cast = np.broadcast(*coordinates[:3])
-    result = np.zeros(cast.size, dtype=dtype)
+    if out is None:
+        if accumulate:
+            raise ValueError("Argument 'accumulate' requires an 'out' array.")
+        result = np.zeros(cast.size, dtype=dtype)
+    else:
+        check_output_array(out, cast.shape, dtype)
+        # Flat view of out: kernels add straight into the caller's buffer
+        result = out.reshape(cast.size)
+        if not accumulate:
+            result[:] = 0
+    # Check if the longitude symmetry of global grids can be exploited
+    grids = None
+    if coordinate_system == "spherical":
+        grids = regular_longitude_grids(coordinates, points, masses)
     # Prepare arrays to be passed to the jitted functions
+    coordinates, points, masses = prepare_arrays(coordinates, points, masses)
+    # Compute gravitational field
+    if grids is not None:
+        kernel = get_kernel(coordinate_system, field)
+        # Invert sign of gravity_u, gravity_eu, gravity_nu and convert to more
+        # convenient units
+        factor = get_field_factor(field)
+        point_mass_spherical_fft(*grids, result, kernel, parallel, factor)
+    else:
+        # The specialised loops already apply the sign and unit conversion
+        forward = dispatcher(
+            coordinate_system,
+            parallel,
+            field,
+            choose_parallel_over(cast.size, masses.size, parallel),
+        )
+        if reorder:
+            # Run the forward model along a Morton curve and scatter the
+            # result back to the original order of the computation points
+            stations = morton_permutation(coordinates, coordinate_system)
+            sources = morton_permutation(points, coordinate_system)
+            reordered = np.zeros(cast.size, dtype=dtype)
+            forward(
+                *(i[stations] for i in coordinates),
+                *(i[sources] for i in points),
+                masses[sources],
+                reordered,
+            )
+            result[stations] += reordered
+        else:
+            forward(*coordinates, *points, masses, result)
+    if out is not None:
+        return out
+    return result.reshape(cast.shape)
+
+
+def check_output_array(out, shape, dtype):
+    """
+    Check that an output array can be filled by the jitted functions.
+    """
+    if not isinstance(out, np.ndarray):
+        raise TypeError(
+            f"Invalid out of type '{type(out).__name__}'. It must be an array."
+        )
+    if out.shape != shape:
+        raise ValueError(
+            f"Invalid out with shape {out.shape}. "
+            f"It must match the shape of the computation points {shape}."
+        )
+    if out.dtype != np.dtype(dtype):
+        raise ValueError(
+            f"Invalid out with dtype '{out.dtype}'. "
+            f"It must have dtype '{np.dtype(dtype)}'."
+        )
+    if not out.flags.c_contiguous or not out.flags.writeable:
+        raise ValueError("Invalid out. It must be a writeable C-contiguous array.")
+
+
+def prepare_arrays(coordinates, points, masses):
+    """
+    Ravel the input arrays so they can be passed to the jitted functions.
+
+    Also checks that there are as many masses as point masses.
+    """
     coordinates = tuple(np.atleast_1d(i).ravel() for i in coordinates[:3])
     points = tuple(np.atleast_1d(i).ravel() for i in points[:3])
     masses = np.atleast_1d(masses).ravel()
@@ -285,27 +400,26 @@ def point_gravity(
             f"Number of elements in masses ({masses.size}) "
             + f"mismatch the number of points ({points[0].size})"
         )
-    # Compute gravitational field
-    kernel = get_kernel(coordinate_system, field)
-    dispatcher(coordinate_system, parallel)(
-        *coordinates, *points, masses, result, kernel
-    )
-    # Invert sign of gravity_u, gravity_eu, gravity_nu
-    if field in ("g_z", "g_ez", "g_ze", "g_nz", "g_zn"):
-        result *= -1
-    # Convert to more convenient units
-    if field in ("g_e", "g_n", "g_z"):
-        result *= 1e5  # SI to mGal
-    tensors = ("g_ee", "g_nn", "g_zz", "g_en", "g_ez", "g_nz", "g_ne", "g_ze", "g_zn")
-    if field in tensors:
-        result *= 1e9  # SI to Eotvos
-    return result.reshape(cast.shape)
+    return coordinates, points, masses
 
 
-def dispatcher(coordinate_system, parallel):
+def dispatcher(coordinate_system, parallel, field=None, parallel_over="stations"):
     """
     Return the appropriate forward model function.
+
+    If ``field`` is None, the returned function takes the kernel as its last
+    argument and accumulates the raw kernel output on ``out``. If ``field`` is
+    given, the returned function is a loop specialised for that field: the
+    kernel is inlined, the masses and the factor returned by
+    :func:`get_field_factor` are fused into it, so it accumulates the field
+    in its final units and takes no kernel argument. In that case,
+    ``parallel_over`` chooses which loop is split across threads (see
+    :func:`choose_parallel_over`).
     """
+    if field is not None:
+        return specialized_dispatcher(
+            coordinate_system, parallel, field, parallel_over
+        )
     dispatchers = {
         "cartesian": {
             True: point_mass_cartesian_parallel,
@@ -319,6 +433,184 @@ def dispatcher(coordinate_system, parallel):
     return dispatchers[coordinate_system][parallel]
 
 
+# Jitted loops specialised for each coordinate system, field and parallel flag
+_specialized_loops = {}
+
+# Minimum ratio between the number of point masses and computation points for
+# which the parallel loops split the point masses across threads
+SOURCE_PARALLEL_RATIO = 64
+
+
+def choose_parallel_over(n_stations, n_sources, parallel=True):
+    """
+    Choose which loop is split across threads by the parallel forward models.
+
+    The loop over computation points is parallelised by default. When there
+    are few computation points and many point masses (e.g. a borehole profile
+    or a handful of stations), most threads would sit idle, so the loop over
+    the point masses is split instead.
+
+    Returns
+    -------
+    parallel_over : str
+        Either ``"stations"`` or ``"sources"``.
+    """
+    if parallel and n_sources >= SOURCE_PARALLEL_RATIO * n_stations:
+        return "sources"
+    return "stations"
+
+
+def specialized_dispatcher(
+    coordinate_system, parallel, field, parallel_over="stations"
+):
+    """
+    Return the forward model loop specialised for a single field.
+
+    Loops are generated and compiled the first time they are requested and
+    cached afterwards. If ``parallel_over`` is ``"sources"``, the point masses
+    are split in one chunk per thread, each thread accumulates its chunk on
+    a partial result and the partial results are reduced at the end.
+    """
+    if parallel_over not in ("stations", "sources"):
+        raise ValueError(
+            f"Invalid parallel_over '{parallel_over}'. "
+            "Valid options: ('stations', 'sources')"
+        )
+    key = (coordinate_system, parallel, field, parallel_over)
+    if key not in _specialized_loops:
+        kernel = get_kernel(coordinate_system, field)
+        factor = get_field_factor(field)
+        makers = {
+            "cartesian": _make_cartesian_loop,
+            "spherical": _make_spherical_loop,
+        }
+        loop = makers[coordinate_system](kernel, factor, parallel_over)
+        _specialized_loops[key] = jit(nopython=True, nogil=True, parallel=parallel)(
+            loop
+        )
+    return _specialized_loops[key]
+
+
+def _make_cartesian_loop(forward_func, factor, parallel_over="stations"):
+    """
+    Generate the loop of point_mass_cartesian for a given forward_func.
+    """
+
+    def point_mass_cartesian_specialized(
+        easting, northing, upward, easting_p, northing_p, upward_p, masses, out
+    ):
+        for i in prange(easting.size):
+            accumulator = 0.0
+            for j in range(easting_p.size):
+                accumulator += forward_func(
+                    easting[i],
+                    northing[i],
+                    upward[i],
+                    easting_p[j],
+                    northing_p[j],
+                    upward_p[j],
+                    masses[j],
+                )
+            out[i] += factor * accumulator
+
+    def point_mass_cartesian_specialized_sources(
+        easting, northing, upward, easting_p, northing_p, upward_p, masses, out
+    ):
+        n_chunks = max(min(get_num_threads(), easting_p.size), 1)
+        chunk_size = (easting_p.size + n_chunks - 1) // n_chunks
+        partial = np.zeros((n_chunks, easting.size))
+        for k in prange(n_chunks):
+            for j in range(k * chunk_size, min((k + 1) * chunk_size, easting_p.size)):
+                for i in range(easting.size):
+                    partial[k, i] += forward_func(
+                        easting[i],
+                        northing[i],
+                        upward[i],
+                        easting_p[j],
+                        northing_p[j],
+                        upward_p[j],
+                        masses[j],
+                    )
+        for i in range(easting.size):
+            out[i] += factor * partial[:, i].sum()
+
+    if parallel_over == "sources":
+        return point_mass_cartesian_specialized_sources
+    return point_mass_cartesian_specialized
+
+
+def _make_spherical_loop(kernel, factor, parallel_over="stations"):
+    """
+    Generate the loop of point_mass_spherical for a given kernel.
+    """
+
+    def point_mass_spherical_specialized(
+        longitude, latitude, radius, longitude_p, latitude_p, radius_p, masses, out
+    ):
+        # Compute quantities related to computation point
+        longitude = np.radians(longitude)
+        latitude = np.radians(latitude)
+        cosphi = np.cos(latitude)
+        sinphi = np.sin(latitude)
+        # Compute quantities related to point masses
+        longitude_p = np.radians(longitude_p)
+        latitude_p = np.radians(latitude_p)
+        cosphi_p = np.cos(latitude_p)
+        sinphi_p = np.sin(latitude_p)
+        # Compute gravitational field
+        for i in prange(longitude.size):
+            accumulator = 0.0
+            for j in range(longitude_p.size):
+                accumulator += masses[j] * kernel(
+                    longitude[i],
+                    cosphi[i],
+                    sinphi[i],
+                    radius[i],
+                    longitude_p[j],
+                    cosphi_p[j],
+                    sinphi_p[j],
+                    radius_p[j],
+                )
+            out[i] += factor * accumulator
+
+    def point_mass_spherical_specialized_sources(
+        longitude, latitude, radius, longitude_p, latitude_p, radius_p, masses, out
+    ):
+        # Compute quantities related to computation point
+        longitude = np.radians(longitude)
+        latitude = np.radians(latitude)
+        cosphi = np.cos(latitude)
+        sinphi = np.sin(latitude)
+        # Compute quantities related to point masses
+        longitude_p = np.radians(longitude_p)
+        latitude_p = np.radians(latitude_p)
+        cosphi_p = np.cos(latitude_p)
+        sinphi_p = np.sin(latitude_p)
+        # Compute gravitational field on one partial result per chunk
+        n_chunks = max(min(get_num_threads(), longitude_p.size), 1)
+        chunk_size = (longitude_p.size + n_chunks - 1) // n_chunks
+        partial = np.zeros((n_chunks, longitude.size))
+        for k in prange(n_chunks):
+            for j in range(k * chunk_size, min((k + 1) * chunk_size, longitude_p.size)):
+                for i in range(longitude.size):
+                    partial[k, i] += masses[j] * kernel(
+                        longitude[i],
+                        cosphi[i],
+                        sinphi[i],
+                        radius[i],
+                        longitude_p[j],
+                        cosphi_p[j],
+                        sinphi_p[j],
+                        radius_p[j],
+                    )
+        for i in range(longitude.size):
+            out[i] += factor * partial[:, i].sum()
+
+    if parallel_over == "sources":
+        return point_mass_spherical_specialized_sources
+    return point_mass_spherical_specialized
+
+
 def get_kernel(coordinate_system, field):
     """
     Return the appropriate kernel.
@@ -357,12 +649,33 @@ def get_kernel(coordinate_system, field):
     return kernel
 
 
+def get_field_factor(field):
+    """
+    Return the factor that turns the output of the kernels into the field.
+
+    It inverts the sign of the upward components (so ``g_z`` is the downward
+    component) and converts SI units into mGal (accelerations) or Eotvos
+    (tensor components).
+    """
+    factor = 1.0
+    # Invert sign of gravity_u, gravity_eu, gravity_nu
+    if field in ("g_z", "g_ez", "g_ze", "g_nz", "g_zn"):
+        factor *= -1
+    # Convert to more convenient units
+    if field in ("g_e", "g_n", "g_z"):
+        factor *= 1e5  # SI to mGal
+    tensors = ("g_ee", "g_nn", "g_zz", "g_en", "g_ez", "g_nz", "g_ne", "g_ze", "g_zn")
+    if field in tensors:
+        factor *= 1e9  # SI to Eotvos
+    return factor
+
+
 # ------------------------------------------
 # Kernel functions for Spherical coordinates
 # ------------------------------------------
 
 
-@jit(nopython=True)
+@jit(nopython=True, nogil=True)
 def potential_spherical(
     longitude, cosphi, sinphi, radius, longitude_p, cosphi_p, sinphi_p, radius_p
 ):
@@ -379,7 +692,7 @@ def potential_spherical(
 #  -------------------
 
 
-@jit(nopython=True)
+@jit(nopython=True, nogil=True)
 def gravity_u_spherical(
     longitude, cosphi, sinphi, radius, longitude_p, cosphi_p, sinphi_p, radius_p
 ):
@@ -488,11 +801,309 @@ def point_mass_spherical(
             )
 
 
+def prepare_sensitivity_coordinates(coordinates, coordinate_system):
+    """
+    Return the coordinates arrays expected by the sensitivity functions.
+
+    Cartesian coordinates are returned as flattened arrays. For spherical
+    coordinates, the longitude (converted to radians), the cosine and sine of
+    the latitude and the radius are returned, so they can be computed only
+    once and reused while building every block of the sensitivity matrix.
+    """
+    coordinates = tuple(
+        np.atleast_1d(i).ravel().astype(np.float64) for i in coordinates[:3]
+    )
+    if coordinate_system == "spherical":
+        longitude, latitude, radius = coordinates
+        latitude = np.radians(latitude)
+        return (np.radians(longitude), np.cos(latitude), np.sin(latitude), radius)
+    return coordinates
+
+
+def regular_longitude_grids(coordinates, points, masses):
+    """
+    Check if computation points and point masses are global regular grids.
+
+    Both must be arrays whose last axis runs along longitudes regularly spaced
+    over the whole globe with the same spacing, with latitude and radius
+    constant along that axis.
+
+    Returns
+    -------
+    grids : tuple or None
+        None if the arrays are not such grids. Otherwise, the rows of the
+        computation points given as ``(longitude, latitude, radius)`` (longitude
+        of the first column and latitude and radius of each row), the rows of
+        the point masses in the same way and the masses reshaped as
+        ``(rows, longitudes)``.
+    """
+    stations = _longitude_rows(coordinates)
+    sources = _longitude_rows(points)
+    if stations is None or sources is None:
+        return None
+    if stations[0].shape[1] != sources[0].shape[1]:
+        return None
+    masses = np.asarray(masses)
+    if masses.size != sources[0].size:
+        return None
+    nlon = stations[0].shape[1]
+    grids = []
+    for longitude, latitude, radius in (stations, sources):
+        grids.append((longitude[0, 0], latitude[:, 0], radius[:, 0]))
+    return (*grids, masses.reshape(-1, nlon))
+
+
+def _longitude_rows(coordinates):
+    """
+    Reshape spherical coordinates as rows of a global regular longitude grid.
+
+    Returns None if the coordinates are not such a grid.
+    """
+    arrays = tuple(np.asarray(i) for i in coordinates[:3])
+    shape = arrays[0].shape
+    if any(i.shape != shape for i in arrays) or len(shape) < 2 or shape[-1] < 2:
+        return None
+    longitude, latitude, radius = (i.reshape(-1, shape[-1]) for i in arrays)
+    if not (latitude == latitude[:, :1]).all() or not (radius == radius[:, :1]).all():
+        return None
+    if not (longitude == longitude[:1]).all():
+        return None
+    spacing = 360 / shape[-1]
+    if not np.allclose(np.diff(longitude[0]), spacing, rtol=0, atol=1e-9 * spacing):
+        return None
+    return longitude, latitude, radius
+
+
+def point_mass_spherical_fft(
+    stations, sources, masses, out, kernel, parallel, factor=1.0
+):
+    """
+    Compute gravitational field of point masses on global regular grids.
+
+    Parameters
+    ----------
+    stations : tuple
+        Longitude of the first column and latitude and radius of each row of
+        the computation points, as returned by :func:`regular_longitude_grids`.
+    sources : tuple
+        Same as ``stations`` but for the point masses.
+    masses : 2d-array
+        Mass of each point mass in SI units, with shape
+        ``(rows, longitudes)``.
+    out : 1d-array
+        Array where the gravitational field on each computation point will be
+        appended.
+    kernel : func
+        Kernel function that will be used to compute the gravitational field on
+        the computation points.
+    parallel : bool
+        If True the kernel rows will be computed in parallel.
+    factor : float (optional)
+        Factor applied to the field before adding it to ``out``, e.g. the one
+        returned by :func:`get_field_factor`. Default 1.
+    """
+    longitude, latitude, radius = stations
+    longitude_p, latitude_p, radius_p = sources
+    nlon = masses.shape[1]
+    # Longitude difference for every offset between columns, which is the same
+    # for every pair of rows. The field on each row is then the circular
+    # convolution of the kernel evaluated on them and the masses of each row.
+    delta_longitude = np.radians(longitude - longitude_p + 360 / nlon * np.arange(nlon))
+    latitude, latitude_p = np.radians(latitude), np.radians(latitude_p)
+    masses_fft = np.fft.rfft(masses, axis=1)
+    function = spherical_kernel_rows_parallel if parallel else spherical_kernel_rows
+    kernel_rows = np.empty((latitude_p.size, nlon), dtype=np.float64)
+    out = out.reshape(latitude.size, nlon)
+    for i in range(latitude.size):
+        function(
+            delta_longitude,
+            np.cos(latitude[i]),
+            np.sin(latitude[i]),
+            radius[i],
+            np.cos(latitude_p),
+            np.sin(latitude_p),
+            radius_p,
+            kernel_rows,
+            kernel,
+        )
+        spectrum = (np.fft.rfft(kernel_rows, axis=1) * masses_fft).sum(axis=0)
+        out[i] += factor * np.fft.irfft(spectrum, n=nlon)
+
+
+def _spherical_kernel_rows(
+    delta_longitude, cosphi, sinphi, radius, cosphi_p, sinphi_p, radius_p, out, kernel
+):
+    """
+    Evaluate the kernel of a row of computation points against rows of masses.
+
+    ``out[j, k]`` is the kernel for a longitude difference of
+    ``delta_longitude[k]`` between the computation point and a point mass on
+    the ``j``-th row of point masses.
+    """
+    for j in prange(cosphi_p.size):
+        for k in range(delta_longitude.size):
+            out[j, k] = kernel(
+                delta_longitude[k],
+                cosphi,
+                sinphi,
+                radius,
+                0.0,
+                cosphi_p[j],
+                sinphi_p[j],
+                radius_p[j],
+            )
+
+
+def sensitivity_dispatcher(coordinate_system, parallel):
+    """
+    Return the appropriate function to compute blocks of the sensitivity matrix.
+    """
+    dispatchers = {
+        "cartesian": {
+            True: point_sensitivity_cartesian_parallel,
+            False: point_sensitivity_cartesian_serial,
+        },
+        "spherical": {
+            True: point_sensitivity_spherical_parallel,
+            False: point_sensitivity_spherical_serial,
+        },
+    }
+    return dispatchers[coordinate_system][parallel]
+
+
+def point_sensitivity_cartesian(
+    easting,
+    northing,
+    upward,
+    easting_p,
+    northing_p,
+    upward_p,
+    rows,
+    columns,
+    out,
+    forward_func,
+):
+    """
+    Compute a block of the sensitivity matrix in Cartesian coordinates.
+
+    The element ``(i, j)`` of the block is the output of ``forward_func`` on
+    the computation point ``rows[i]`` for a unit point mass located on
+    ``columns[j]``.
+
+    Parameters
+    ----------
+    easting, northing, upward : 1d-arrays
+        Coordinates of computation points in Cartesian coordinate system.
+    easting_p, northing_p, upward_p : 1d-arrays
+        Coordinates of point masses in Cartesian coordinate system.
+    rows : 1d-array of int
+        Indices of the computation points included in the block.
+    columns : 1d-array of int
+        Indices of the point masses included in the block.
+    out : 2d-array
+        Array where the block will be stored. Its shape must be
+        ``(rows.size, columns.size)``.
+    forward_func : func
+        forward_func function that will be used to compute the gravitational
+        field on the computation points. It could be one of the forward
+        modelling functions in :mod:`choclo.point`.
+    """
+    for i in prange(rows.size):
+        row = rows[i]
+        for j in range(columns.size):
+            column = columns[j]
+            out[i, j] = forward_func(
+                easting[row],
+                northing[row],
+                upward[row],
+                easting_p[column],
+                northing_p[column],
+                upward_p[column],
+                1.0,
+            )
+
+
+def point_sensitivity_spherical(
+    longitude,
+    cosphi,
+    sinphi,
+    radius,
+    longitude_p,
+    cosphi_p,
+    sinphi_p,
+    radius_p,
+    rows,
+    columns,
+    out,
+    kernel,
+):
+    """
+    Compute a block of the sensitivity matrix in spherical coordinates.
+
+    The element ``(i, j)`` of the block is the output of ``kernel`` on the
+    computation point ``rows[i]`` for a unit point mass located on
+    ``columns[j]``.
+
+    Parameters
+    ----------
+    longitude, cosphi, sinphi, radius : 1d-arrays
+        Longitude (in radians), cosine and sine of the latitude and radius of
+        the computation points.
+    longitude_p, cosphi_p, sinphi_p, radius_p : 1d-arrays
+        Longitude (in radians), cosine and sine of the latitude and radius of
+        the point masses.
+    rows : 1d-array of int
+        Indices of the computation points included in the block.
+    columns : 1d-array of int
+        Indices of the point masses included in the block.
+    out : 2d-array
+        Array where the block will be stored. Its shape must be
+        ``(rows.size, columns.size)``.
+    kernel : func
+        Kernel function that will be used to compute the gravitational field on
+        the computation points.
+    """
+    for i in prange(rows.size):
+        row = rows[i]
+        for j in range(columns.size):
+            column = columns[j]
+            out[i, j] = kernel(
+                longitude[row],
+                cosphi[row],
+                sinphi[row],
+                radius[row],
+                longitude_p[column],
+                cosphi_p[column],
+                sinphi_p[column],
+                radius_p[column],
+            )
+
+
 # Define jitted versions of the forward modelling functions
-point_mass_cartesian_serial = jit(nopython=True)(point_mass_cartesian)
-point_mass_cartesian_parallel = jit(nopython=True, parallel=True)(point_mass_cartesian)
-point_mass_spherical_serial = jit(nopython=True)(point_mass_spherical)
-point_mass_spherical_parallel = jit(nopython=True, parallel=True)(point_mass_spherical)
+point_mass_cartesian_serial = jit(nopython=True, nogil=True)(point_mass_cartesian)
+point_mass_cartesian_parallel = jit(nopython=True, nogil=True, parallel=True)(
+    point_mass_cartesian
+)
+point_mass_spherical_serial = jit(nopython=True, nogil=True)(point_mass_spherical)
+point_mass_spherical_parallel = jit(nopython=True, nogil=True, parallel=True)(
+    point_mass_spherical
+)
+spherical_kernel_rows = jit(nopython=True, nogil=True)(_spherical_kernel_rows)
+spherical_kernel_rows_parallel = jit(nopython=True, nogil=True, parallel=True)(
+    _spherical_kernel_rows
+)
+point_sensitivity_cartesian_serial = jit(nopython=True, nogil=True)(
+    point_sensitivity_cartesian
+)
+point_sensitivity_cartesian_parallel = jit(nopython=True, nogil=True, parallel=True)(
+    point_sensitivity_cartesian
+)
+point_sensitivity_spherical_serial = jit(nopython=True, nogil=True)(
+    point_sensitivity_spherical
+)
+point_sensitivity_spherical_parallel = jit(nopython=True, nogil=True, parallel=True)(
+    point_sensitivity_spherical
+)
 
 
 # ======================================================
@@ -0,0 +1,417 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Local HTTP server for forward modelling point masses with request batching.
+
+Run it with ``python -m harmonica.server --port 8000``. Requests are sent as
+``POST /point_gravity?field=g_z&coordinate_system=cartesian`` whose body is
+a ``.npz`` file (as written by :func:`numpy.savez`) with the arrays
+``coordinates`` (stacked along the first axis), ``points`` and ``masses``.
+The response body is a ``.npy`` file with the computed field. Metrics are
+served as JSON on ``GET /metrics``.
+"""
+
+import argparse
+import io
+import json
+import queue
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from .hashing import hash_arrays
+from .point import (
+    check_coordinate_system,
+    dispatcher,
+    get_kernel,
+    point_gravity,
+)
+
+# Fields compiled when the server starts
+DEFAULT_WARMUP = tuple(
+    ("cartesian", field) for field in ("potential", "g_e", "g_n", "g_z")
+) + tuple(("spherical", field) for field in ("potential", "g_z"))
+
+# Data types of the results compiled when the server starts
+DEFAULT_WARMUP_DTYPES = ("float64", "float32")
+
+
+class ForwardModellingServer(ThreadingHTTPServer):
+    """
+    HTTP server that keeps the forward models warm and batches requests.
+
+    Each request is parsed on its own thread and queued. A single batching
+    thread collects the requests that arrive within ``batch_window`` seconds,
+    groups the ones that share the same point masses, field and coordinate
+    system, and computes each group with a single call to
+    :func:`harmonica.point.point_gravity` on the concatenated computation
+    points.
+
+    Parameters
+    ----------
+    server_address : tuple (optional)
+        Host and port where the server will listen. Use port 0 to pick any
+        free port (available afterwards on ``server_address``).
+        Default ``("127.0.0.1", 8000)``.
+    batch_window : float (optional)
+        Time in seconds that the batching thread waits for other requests
+        after receiving the first one of a batch. Default 0.005.
+    parallel : bool (optional)
+        Passed to :func:`harmonica.point.point_gravity`. Default True.
+    warmup : iterable of tuples (optional)
+        Pairs of ``(coordinate_system, field)`` whose forward models will be
+        compiled when the server starts, for every data type in
+        ``warmup_dtypes`` and, if ``parallel``, for both loops that can be
+        split across threads (see
+        :func:`harmonica.point.choose_parallel_over`). The FFT path used for
+        global grids in spherical coordinates isn't compiled in advance, so
+        the first request that takes it pays for its compilation.
+        Default :data:`DEFAULT_WARMUP`.
+    warmup_dtypes : iterable of str (optional)
+        Data types of the results compiled for each field of ``warmup``.
+        Default :data:`DEFAULT_WARMUP_DTYPES`.
+    latency_window : int (optional)
+        Number of recent requests used to compute the latency metrics.
+        Default 1000.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        server_address=("127.0.0.1", 8000),
+        batch_window=0.005,
+        parallel=True,
+        warmup=DEFAULT_WARMUP,
+        warmup_dtypes=DEFAULT_WARMUP_DTYPES,
+        latency_window=1000,
+    ):
+        super().__init__(server_address, ForwardModellingHandler)
+        self.batch_window = batch_window
+        self.parallel = parallel
+        self.jobs = queue.Queue()
+        self.latencies = deque(maxlen=latency_window)
+        self.counters = {"requests": 0, "batches": 0, "errors": 0}
+        self._lock = threading.Lock()
+        for coordinate_system, field in warmup:
+            for dtype in warmup_dtypes:
+                _warm_up(coordinate_system, field, dtype, parallel)
+        self._batcher = threading.Thread(
+            target=self._run_batches, name="harmonica-batcher", daemon=True
+        )
+        self._batcher.start()
+
+    def server_close(self):
+        super().server_close()
+        self.jobs.put(None)
+        self._batcher.join()
+
+    def submit(self, job):
+        """
+        Queue a job and wait until the batching thread computes it.
+        """
+        self.jobs.put(job)
+        job.done.wait()
+        with self._lock:
+            self.counters["requests"] += 1
+            if job.error is not None:
+                self.counters["errors"] += 1
+            self.latencies.append(time.perf_counter() - job.created)
+        return job
+
+    def metrics(self):
+        """
+        Return a dictionary with the queue depth, counters and latencies.
+
+        Latencies are given in seconds and measured from the moment the
+        request is queued until its result is ready.
+        """
+        with self._lock:
+            latencies = np.array(self.latencies)
+            metrics = dict(self.counters)
+        metrics["queue_depth"] = self.jobs.qsize()
+        metrics["mean_batch_size"] = metrics["requests"] / max(metrics["batches"], 1)
+        if latencies.size:
+            metrics["latency"] = {
+                "mean": float(latencies.mean()),
+                "p50": float(np.percentile(latencies, 50)),
+                "p95": float(np.percentile(latencies, 95)),
+                "max": float(latencies.max()),
+            }
+        else:
+            metrics["latency"] = None
+        return metrics
+
+    def _run_batches(self):
+        """
+        Collect jobs in batches and compute each group of shared sources.
+        """
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            batch = [job]
+            deadline = time.perf_counter() + self.batch_window
+            while (timeout := deadline - time.perf_counter()) > 0:
+                try:
+                    job = self.jobs.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if job is None:
+                    self.jobs.put(None)
+                    break
+                batch.append(job)
+            groups = {}
+            for job in batch:
+                groups.setdefault(job.key, []).append(job)
+            for group in groups.values():
+                self._compute_group(group)
+            with self._lock:
+                self.counters["batches"] += 1
+
+    def _compute_group(self, group):
+        """
+        Compute a group of jobs that share the same sources in a single pass.
+        """
+        first = group[0]
+        try:
+            coordinates = tuple(
+                np.hstack([job.coordinates[i].ravel() for job in group])
+                for i in range(3)
+            )
+            result = point_gravity(
+                coordinates,
+                first.points,
+                first.masses,
+                first.field,
+                coordinate_system=first.coordinate_system,
+                parallel=self.parallel,
+                dtype=first.dtype,
+            )
+            start = 0
+            for job in group:
+                shape = job.coordinates[0].shape
+                size = job.coordinates[0].size
+                job.result = result[start : start + size].reshape(shape)
+                start += size
+        except Exception as error:
+            for job in group:
+                job.error = error
+        for job in group:
+            job.done.set()
+
+
+def _warm_up(coordinate_system, field, dtype, parallel):
+    """
+    Compile the forward model loops that point_gravity can choose for a field.
+
+    point_gravity only picks the loop over the point masses for large models,
+    so the loops are called directly instead of through it.
+    """
+    parallel_overs = ("stations", "sources") if parallel else ("stations",)
+    for parallel_over in parallel_overs:
+        forward = dispatcher(coordinate_system, parallel, field, parallel_over)
+        forward(
+            *(np.array([i]) for i in (0.0, 0.0, 2.0)),
+            *(np.array([i]) for i in (0.0, 0.0, 1.0)),
+            np.array([1.0]),
+            np.zeros(1, dtype=dtype),
+        )
+
+
+class _Job:
+    """
+    Forward modelling request waiting to be computed.
+    """
+
+    def __init__(self, coordinates, points, masses, field, coordinate_system, dtype):
+        self.coordinates = coordinates
+        self.points = points
+        self.masses = masses
+        self.field = field
+        self.coordinate_system = coordinate_system
+        self.dtype = dtype
+        self.key = _source_key(points, masses, field, coordinate_system, dtype)
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+        self.created = time.perf_counter()
+
+
+def _read_job(query, body):
+    """
+    Parse and check a request before it's queued.
+
+    Invalid requests must be rejected here: once batched, an error raised by
+    one of them would be returned to every request sharing its sources.
+    """
+    if "field" not in query:
+        raise ValueError("Missing 'field' parameter.")
+    field = query["field"]
+    coordinate_system = query.get("coordinate_system", "cartesian")
+    dtype = np.dtype(query.get("dtype", "float64"))
+    check_coordinate_system(coordinate_system)
+    try:
+        get_kernel(coordinate_system, field)
+    except NotImplementedError:
+        raise ValueError(
+            f"Gravitational field '{field}' not implemented for "
+            f"'{coordinate_system}' coordinates."
+        ) from None
+    with np.load(io.BytesIO(body)) as arrays:
+        coordinates = np.asarray(arrays["coordinates"], dtype=np.float64)
+        points = np.asarray(arrays["points"], dtype=np.float64)
+        masses = np.ravel(np.asarray(arrays["masses"], dtype=np.float64))
+    if coordinates.ndim < 2 or coordinates.shape[0] != 3:
+        raise ValueError(
+            f"Invalid coordinates with shape {coordinates.shape}. "
+            "They must be 3 arrays stacked along the first axis."
+        )
+    if points.ndim != 2 or points.shape[0] != 3:
+        raise ValueError(
+            f"Invalid points with shape {points.shape}. It must be (3, n)."
+        )
+    if masses.size != points.shape[1]:
+        raise ValueError(
+            f"Number of elements in masses ({masses.size}) "
+            + f"mismatch the number of points ({points.shape[1]})"
+        )
+    return _Job(
+        tuple(coordinates), tuple(points), masses, field, coordinate_system, dtype.name
+    )
+
+
+def _source_key(points, masses, field, coordinate_system, dtype):
+    """
+    Hash the sources and parameters shared by the jobs of a batch.
+    """
+    return hash_arrays(*points, masses, params=(field, coordinate_system, dtype))
+
+
+class ForwardModellingHandler(BaseHTTPRequestHandler):
+    """
+    Handle the requests made to a :class:`ForwardModellingServer`.
+    """
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path
+        if path == "/metrics":
+            self._send(200, json.dumps(self.server.metrics()).encode(), "json")
+        elif path == "/health":
+            self._send(200, b"ok", "text")
+        else:
+            self._send(404, b"Not found", "text")
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != "/point_gravity":
+            self._send(404, b"Not found", "text")
+            return
+        try:
+            query = dict(urllib.parse.parse_qsl(url.query))
+            length = int(self.headers.get("Content-Length", 0))
+            job = _read_job(query, self.rfile.read(length))
+        except Exception as error:
+            self._send(400, f"Invalid request: {error}".encode(), "text")
+            return
+        job = self.server.submit(job)
+        if job.error is not None:
+            self._send(400, f"{type(job.error).__name__}: {job.error}".encode(), "text")
+            return
+        body = io.BytesIO()
+        np.save(body, job.result)
+        self._send(200, body.getvalue(), "npy")
+
+    def _send(self, status, body, kind):
+        content_types = {
+            "json": "application/json",
+            "text": "text/plain; charset=utf-8",
+            "npy": "application/octet-stream",
+        }
+        self.send_response(status)
+        self.send_header("Content-Type", content_types[kind])
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep the terminal quiet: metrics are available on /metrics
+        pass
+
+
+def request_point_gravity(
+    url,
+    coordinates,
+    points,
+    masses,
+    field,
+    coordinate_system="cartesian",
+    dtype="float64",
+    timeout=None,
+):
+    """
+    Compute gravitational fields of point masses on a running server.
+
+    Takes the same arguments and returns the same result as
+    :func:`harmonica.point.point_gravity`.
+
+    Parameters
+    ----------
+    url : str
+        Base URL of the server, e.g. ``"http://127.0.0.1:8000"``.
+    timeout : float or None (optional)
+        Timeout of the request in seconds. Default None.
+    """
+    coordinates = np.stack(np.broadcast_arrays(*coordinates[:3]))
+    body = io.BytesIO()
+    np.savez(
+        body,
+        coordinates=coordinates,
+        points=np.vstack([np.ravel(i) for i in points[:3]]),
+        masses=np.ravel(masses),
+    )
+    query = urllib.parse.urlencode(
+        {"field": field, "coordinate_system": coordinate_system, "dtype": dtype}
+    )
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/point_gravity?{query}",
+        data=body.getvalue(),
+        headers={"Content-Type": "application/octet-stream"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return np.load(io.BytesIO(response.read()))
+
+
+def main():
+    """
+    Run the forward modelling server from the command line.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--batch-window", type=float, default=0.005)
+    args = parser.parse_args()
+    server = ForwardModellingServer(
+        (args.host, args.port), batch_window=args.batch_window
+    )
+    print(f"Serving forward models on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,692 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Columnar storage and bulk reading of point sources for interactive models.
+"""
+
+import csv
+import itertools
+import os
+import warnings
+
+import numpy as np
+
+# Names accepted for each column in the header of a catalogue (lower case)
+COLUMN_ALIASES = {
+    "name": ("name", "id", "label"),
+    "x": ("x", "easting", "east", "longitude", "lon"),
+    "z": ("z", "depth"),
+    "rho": ("rho", "density", "dens"),
+}
+
+# Names of vertical columns that are positive upwards: their values are
+# negated to get depths (lower case)
+UPWARD_ALIASES = ("upward", "height", "elevation")
+
+
+class SourceStore:
+    """
+    Point sources (name, x, z, rho) stored column by column in arrays.
+
+    Behaves like the list of ``(name, x, z, rho)`` tuples it replaces
+    (indexing, assignment, ``append``, ``pop``, ``clear``, iteration), while
+    the coordinates and densities live in a single NumPy array whose rows
+    are the columns of the sources. Rows grow geometrically, so appending is
+    amortised O(1), and the forward models read them as contiguous views
+    without copying.
+
+    Names are interned: each source holds the index of its name in a table
+    of distinct names, shared by the store and its copies. Sources without
+    a name (e.g. catalogues without a name column) are named ``prefix``
+    followed by a serial number, generated only when the name is read. A
+    source takes 36 bytes plus its name, if it has one that isn't shared.
+
+    Copies made with :meth:`copy` are copy-on-write snapshots: they share
+    the arrays with the store until either of them is modified, so taking
+    one costs the same for any number of sources. They are used as
+    snapshots for background computations and for undo and redo (see
+    :class:`SourceHistory`).
+
+    Parameters
+    ----------
+    capacity : int (optional)
+        Number of sources allocated up front. Default 64.
+    prefix : str (optional)
+        Prefix of the names generated for sources without one. Default
+        ``"p"``.
+    """
+
+    def __init__(self, capacity=64, prefix="p"):
+        self.prefix = prefix
+        self._size = 0
+        self._codes = np.empty(capacity, dtype=np.int32)
+        self._values = np.empty((4, capacity))
+        self._lookup = {}
+        self._table = np.empty(0, dtype=object)
+        self._lowercase = []
+        self._shared = False
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield self[index]
+
+    def __getitem__(self, index):
+        index = self._index(index)
+        x, _, z, rho = self._values[:, index].tolist()
+        return (self.names_at([index])[0], x, z, rho)
+
+    def __setitem__(self, index, source):
+        index = self._index(index)
+        name, x, z, rho = source
+        self._own()
+        self._codes[index] = self._intern([str(name)])[0]
+        self._values[[0, 2, 3], index] = (x, z, rho)
+
+    @property
+    def names(self):
+        """
+        Read-only array with the names of the sources.
+        """
+        return self._view(self.names_at(slice(None)))
+
+    @property
+    def x(self):
+        """
+        Read-only array with the horizontal positions of the sources.
+        """
+        return self._view(self._values[0])
+
+    @property
+    def y(self):
+        """
+        Read-only array with the northing of the sources (0 unless given).
+        """
+        return self._view(self._values[1])
+
+    @property
+    def z(self):
+        """
+        Read-only array with the depths of the sources (positive downwards).
+        """
+        return self._view(self._values[2])
+
+    @property
+    def rho(self):
+        """
+        Read-only array with the densities (or masses) of the sources.
+        """
+        return self._view(self._values[3])
+
+    @property
+    def nbytes(self):
+        """
+        Number of bytes taken by the sources, without the table of names.
+        """
+        return self._size * (self._codes.itemsize + self._values.shape[0] * 8)
+
+    def names_at(self, indices):
+        """
+        Return the names of some sources as an array of strings.
+
+        Cheaper than indexing :attr:`names`, which builds every name.
+        """
+        codes = self._codes[: self._size][indices]
+        if self._table.size != len(self._lookup):
+            self._table = np.array(list(self._lookup), dtype=object)
+        names = np.empty(codes.size, dtype=object)
+        named = codes >= 0
+        names[named] = self._table[codes[named]]
+        names[~named] = [f"{self.prefix}{-i}" for i in codes[~named].tolist()]
+        return names
+
+    def names_containing(self, text):
+        """
+        Return a boolean mask of the sources whose names contain some text.
+
+        The comparison is case insensitive. The text is only compared with
+        the distinct names in the table, so the cost grows with the number of
+        distinct names rather than with the number of sources.
+        """
+        text = text.lower()
+        # Lower case names, kept along the table (which only grows)
+        lowercase = self._lowercase
+        if len(lowercase) < len(self._lookup):
+            lowercase.extend(
+                name.lower()
+                for name in itertools.islice(self._lookup, len(lowercase), None)
+            )
+        matching = [code for code, name in enumerate(lowercase) if text in name]
+        codes = self._codes[: self._size]
+        mask = np.isin(codes, matching)
+        unnamed = codes < 0
+        if unnamed.any():
+            mask[unnamed] = _generated_names_containing(
+                self.prefix.lower(), -codes[unnamed].astype(np.int64), text
+            )
+        return mask
+
+    def append(self, source):
+        """
+        Add a ``(name, x, z, rho)`` source at the end.
+        """
+        self._reserve(self._size + 1)
+        self._own()
+        self._size += 1
+        self._values[1, self._size - 1] = 0
+        self[self._size - 1] = source
+
+    def extend_arrays(self, names, x, z, rho, y=None):
+        """
+        Add many sources at once from their columns.
+
+        Parameters
+        ----------
+        names : array or None
+            Names of the new sources. If None, they are named
+            :attr:`prefix` followed by their position in the store, starting
+            at 1.
+        x, z, rho : arrays
+            Horizontal position, depth and density of the new sources.
+        y : array or None (optional)
+            Northing of the new sources. If None, they are placed at 0.
+            Default None.
+        """
+        y = np.zeros(np.size(x)) if y is None else y
+        columns = [np.asarray(i, dtype=np.float64).ravel() for i in (x, y, z, rho)]
+        count = columns[0].size
+        if any(column.size != count for column in columns) or (
+            names is not None and np.size(names) != count
+        ):
+            raise ValueError("Names, x, y, z and rho must have the same size.")
+        start = self._size
+        self._reserve(start + count)
+        self._own()
+        if names is None:
+            codes = -np.arange(start + 1, start + count + 1)
+        else:
+            codes = self._intern(np.asarray(names, dtype=object).ravel().tolist())
+        self._codes[start : start + count] = codes
+        self._values[:, start : start + count] = columns
+        self._size += count
+
+    def update(self, indices, names=None, x=None, y=None, z=None, rho=None):
+        """
+        Change some columns of several sources at once.
+
+        Parameters
+        ----------
+        indices : array of int or bool, or slice
+            Sources that are changed.
+        names, x, y, z, rho : arrays, scalars or None (optional)
+            New values of each column, broadcast to the selected sources.
+            Columns that are None aren't changed. Default None.
+        """
+        self._own()
+        indices = np.arange(self._size)[indices]
+        if names is not None:
+            names = np.broadcast_to(np.asarray(names, dtype=object), indices.shape)
+            self._codes[indices] = self._intern([str(i) for i in names.tolist()])
+        for row, column in enumerate((x, y, z, rho)):
+            if column is not None:
+                self._values[row, indices] = column
+
+    def delete(self, indices):
+        """
+        Remove several sources at once, keeping the order of the others.
+
+        Parameters
+        ----------
+        indices : array of int or bool, or slice
+            Sources that are removed.
+        """
+        keep = np.ones(self._size, dtype=bool)
+        keep[indices] = False
+        size = int(keep.sum())
+        self._own()
+        self._codes[:size] = self._codes[: self._size][keep]
+        self._values[:, :size] = self._values[:, : self._size][:, keep]
+        self._size = size
+
+    def pop(self, index=-1):
+        """
+        Remove a source and return it as a ``(name, x, z, rho)`` tuple.
+        """
+        index = self._index(index)
+        source = self[index]
+        self.delete([index])
+        return source
+
+    def clear(self):
+        """
+        Remove every source.
+        """
+        self._codes = np.empty(self._codes.size, dtype=np.int32)
+        self._values = np.empty(self._values.shape)
+        self._shared = False
+        self._size = 0
+
+    def copy(self):
+        """
+        Return a copy-on-write snapshot of the store.
+
+        The copy shares the arrays with the store until one of them is
+        modified, which then copies them first.
+        """
+        store = SourceStore(capacity=0, prefix=self.prefix)
+        store.restore(self)
+        return store
+
+    def restore(self, store):
+        """
+        Make this store hold the same sources as another one (e.g. a copy).
+        """
+        self.prefix = store.prefix
+        self._size = store._size
+        self._codes, self._values = store._codes, store._values
+        self._lookup, self._table = store._lookup, store._table
+        self._lowercase = store._lowercase
+        self._shared = store._shared = True
+
+    def _index(self, index):
+        """
+        Check an integer index and make it positive.
+        """
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(f"Source index out of range '{index}'.")
+        return index
+
+    def _intern(self, names):
+        """
+        Return the codes of a list of names, adding the new ones to the table.
+        """
+        lookup = self._lookup
+        new = [name for name in dict.fromkeys(names) if name not in lookup]
+        lookup.update(zip(new, range(len(lookup), len(lookup) + len(new))))
+        return np.fromiter(map(lookup.__getitem__, names), np.int32, len(names))
+
+    def _own(self):
+        """
+        Copy the arrays shared with a snapshot before modifying them.
+        """
+        if self._shared:
+            self._codes = self._codes.copy()
+            self._values = self._values.copy()
+            self._shared = False
+
+    def _reserve(self, capacity):
+        """
+        Grow the arrays geometrically until they fit ``capacity`` sources.
+        """
+        if capacity <= self._codes.size:
+            return
+        new_capacity = max(capacity, 2 * self._codes.size)
+        codes = np.empty(new_capacity, dtype=np.int32)
+        values = np.empty((4, new_capacity))
+        codes[: self._size] = self._codes[: self._size]
+        values[:, : self._size] = self._values[:, : self._size]
+        self._codes, self._values = codes, values
+        self._shared = False
+
+    def _view(self, array):
+        """
+        Return a read-only view of the used part of a column.
+        """
+        view = array[: self._size].view()
+        view.setflags(write=False)
+        return view
+
+
+def _generated_names_containing(prefix, serials, text):
+    """
+    Check which generated names (prefix and serial number) contain some text.
+
+    Works on the serial numbers, so the names are never built.
+    """
+    if text in prefix:
+        return np.ones(serials.size, dtype=bool)
+    ndigits = np.floor(np.log10(serials)).astype(np.int64) + 1
+    mask = np.zeros(serials.size, dtype=bool)
+    # Text starting at the end of the prefix and going on with the first digits
+    for split in range(1, len(text)):
+        head, tail = text[:split], text[split:]
+        if prefix.endswith(head) and tail.isascii() and tail.isdigit():
+            long_enough = ndigits >= len(tail)
+            leading = serials // 10 ** np.maximum(ndigits - len(tail), 0)
+            mask |= long_enough & (leading == int(tail))
+    # Text made of digits only, anywhere in the serial number
+    if text.isascii() and text.isdigit():
+        size, value = len(text), int(text)
+        for shift in range(int(ndigits.max()) - size + 1):
+            window = serials // 10**shift
+            mask |= (window % 10**size == value) & (window >= 10 ** (size - 1))
+    return mask
+
+
+class SourceHistory:
+    """
+    Undo and redo changes to a :class:`SourceStore`.
+
+    Call :meth:`record` before each change. States are kept as
+    copy-on-write snapshots of the store, so recording costs the same for
+    any number of sources. The arrays of a state are only copied when the
+    store is changed after recording it, so every recorded change holds a
+    copy of the arrays: the oldest states are dropped when they take more
+    than ``max_bytes``.
+
+    Parameters
+    ----------
+    store : :class:`SourceStore`
+        Store whose changes are recorded. Undo and redo restore it in place.
+    limit : int (optional)
+        Maximum number of changes that can be undone. Default 100.
+    max_bytes : int (optional)
+        Maximum memory taken by the recorded states. The last one is always
+        kept. Default 256 MiB.
+    """
+
+    def __init__(self, store, limit=100, max_bytes=256 * 2**20):
+        self.store = store
+        self.limit = limit
+        self.max_bytes = max_bytes
+        self._undo = []
+        self._redo = []
+
+    @property
+    def can_undo(self):
+        """
+        True if there's a change to undo.
+        """
+        return bool(self._undo)
+
+    @property
+    def can_redo(self):
+        """
+        True if there's an undone change to redo.
+        """
+        return bool(self._redo)
+
+    @property
+    def nbytes(self):
+        """
+        Number of bytes taken by the arrays of the recorded states.
+        """
+        arrays = {
+            id(array): array.nbytes
+            for state in self._undo + self._redo
+            for array in (state._codes, state._values)
+        }
+        return sum(arrays.values())
+
+    def record(self):
+        """
+        Save the current state of the store, before changing it.
+        """
+        self._undo.append(self.store.copy())
+        self._redo.clear()
+        del self._undo[: -self.limit]
+        while len(self._undo) > 1 and self.nbytes > self.max_bytes:
+            del self._undo[0]
+
+    def undo(self):
+        """
+        Go back to the last recorded state. Return False if there's none.
+        """
+        return self._move(self._undo, self._redo)
+
+    def redo(self):
+        """
+        Go forward to the last undone state. Return False if there's none.
+        """
+        return self._move(self._redo, self._undo)
+
+    def clear(self):
+        """
+        Forget every recorded state.
+        """
+        self._undo.clear()
+        self._redo.clear()
+
+    def _move(self, source, target):
+        if not source:
+            return False
+        target.append(self.store.copy())
+        self.store.restore(source.pop())
+        return True
+
+
+def read_sources(path, sheet=0):
+    """
+    Read a catalogue of point sources from a CSV, TXT or Excel file in bulk.
+
+    Columns are found by their names in the header (see
+    :data:`COLUMN_ALIASES`) or, without a header, by position: ``x, z, rho``
+    for three columns and ``name, x, z, rho`` for more. A vertical column
+    named as positive upwards (see :data:`UPWARD_ALIASES`) is used when
+    there's no depth column, with its values negated. Delimited text files
+    are parsed by the C parser of `pandas <https://pandas.pydata.org>`__ if
+    it's installed and by :func:`numpy.loadtxt` otherwise. Files with rows
+    that don't have as many fields as the first one are parsed again with
+    the :mod:`csv` module.
+
+    Every row is validated at once: rows with values that aren't numbers or
+    aren't finite, with a depth that isn't positive, with a zero density or
+    with a different number of fields than the first row are rejected and
+    reported in ``bad_rows``.
+
+    Parameters
+    ----------
+    path : str or :class:`os.PathLike`
+        Path to the file. Files ending in ``.xls`` or ``.xlsx`` are read as
+        Excel files (requires pandas), ``.npz`` files and ``.h5``, ``.hdf5``
+        or ``.nc`` files (requires h5py) as named 1d arrays (like the ones
+        written by :func:`harmonica.export.write_sources`) and any other as
+        delimited text (comma, semicolon, tab or whitespace separated).
+    sheet : int or str (optional)
+        Sheet read from Excel files. Default 0 (the first one).
+
+    Returns
+    -------
+    names : 1d-array or None
+        Names of the valid sources, or None if the file has no name column.
+    x, z, rho : 1d-arrays
+        Horizontal position, depth and density of the valid sources.
+    bad_rows : 1d-array
+        Numbers of the rejected rows, counting the data rows (without the
+        header and blank lines) from 1.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".xls", ".xlsx"):
+        table, header = _read_excel(path, sheet)
+    elif extension in (".npz", ".h5", ".hdf5", ".nc"):
+        table, header = _read_arrays(path)
+    else:
+        table, header = _read_delimited(path)
+    columns, upward = _find_columns(header, len(table))
+    names = None
+    if columns["name"] is not None:
+        names = np.asarray(table[columns["name"]], dtype=str)
+        names = np.char.strip(names)
+    x, z, rho = (_to_float(table[columns[i]]) for i in ("x", "z", "rho"))
+    if upward:
+        z = -z
+    valid = np.isfinite(x) & np.isfinite(z) & np.isfinite(rho) & (z > 0) & (rho != 0)
+    bad_rows = np.flatnonzero(~valid) + 1
+    if names is not None:
+        names = names[valid]
+    return names, x[valid], z[valid], rho[valid], bad_rows
+
+
+def _read_delimited(path):
+    """
+    Read the columns of a delimited text file and its header (or None).
+    """
+    with open(path, newline="") as file:
+        first = ""
+        while not first.strip():
+            first = file.readline()
+            if not first:
+                raise ValueError(f"No data found in '{path}'.")
+    delimiter = next((i for i in (",", ";", "\t") if i in first), None)
+    fields = [i.strip() for i in first.split(delimiter)]
+    header = None
+    if np.isnan(_to_float(fields[-3:])).any():
+        header = [i.lower() for i in fields]
+    skip = int(header is not None)
+    try:
+        import pandas as pd
+    except ImportError:
+        try:
+            with warnings.catch_warnings():
+                # Blank lines are skipped, which loadtxt warns about
+                warnings.simplefilter("ignore", UserWarning)
+                data = np.loadtxt(
+                    path,
+                    dtype=str,
+                    delimiter=delimiter,
+                    skiprows=skip,
+                    ndmin=2,
+                    comments=None,
+                )
+        except ValueError:
+            # Rows with a different number of fields
+            return _read_ragged(path, delimiter, skip, len(fields)), header
+        return [data[:, i] for i in range(data.shape[1])], header
+    try:
+        frame = pd.read_csv(
+            path,
+            sep=r"\s+" if delimiter is None else delimiter,
+            header=None,
+            skiprows=skip,
+            skip_blank_lines=True,
+            skipinitialspace=True,
+            low_memory=False,
+        )
+    except pd.errors.ParserError:
+        # Rows with more fields than the first ones
+        return _read_ragged(path, delimiter, skip, len(fields)), header
+    return [frame[i].to_numpy() for i in frame.columns], header
+
+
+def _read_ragged(path, delimiter, skip, count):
+    """
+    Read the columns of a delimited text file row by row.
+
+    Slow path for files with rows that don't have ``count`` fields: their
+    fields are left empty so they're rejected, keeping the numbering of the
+    other rows.
+    """
+    columns = [[] for _ in range(count)]
+    with open(path, newline="") as file:
+        lines = (line for line in file if line.strip())
+        if delimiter is None:
+            rows = (line.split() for line in lines)
+        else:
+            rows = csv.reader(lines, delimiter=delimiter, skipinitialspace=True)
+        for row in itertools.islice(rows, skip, None):
+            if len(row) != count:
+                row = [""] * count
+            for column, value in zip(columns, row):
+                column.append(value)
+    return [np.array(column, dtype=object) for column in columns]
+
+
+def _read_excel(path, sheet):
+    """
+    Read the columns of a sheet of an Excel file and its header.
+    """
+    try:
+        import pandas as pd
+    except ImportError as error:
+        raise ImportError(
+            "Reading Excel files requires the 'pandas' package to be installed."
+        ) from error
+    frame = pd.read_excel(path, sheet_name=sheet)
+    header = [str(i).strip().lower() for i in frame.columns]
+    return [frame[i].to_numpy() for i in frame.columns], header
+
+
+def _read_arrays(path):
+    """
+    Read the 1d arrays of a ``.npz`` or HDF5 file and their names.
+    """
+    if os.path.splitext(path)[1].lower() == ".npz":
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+    else:
+        try:
+            import h5py
+        except ImportError as error:
+            raise ImportError(
+                "Reading HDF5 and NetCDF files requires the 'h5py' package to be "
+                "installed."
+            ) from error
+        arrays = {}
+        with h5py.File(path, "r") as file:
+            for name, dataset in file.items():
+                if isinstance(dataset, h5py.Dataset) and dataset.ndim == 1:
+                    if h5py.check_string_dtype(dataset.dtype) is not None:
+                        dataset = dataset.asstr()
+                    arrays[name] = dataset[()]
+    arrays = {name: array for name, array in arrays.items() if array.ndim == 1}
+    header = [name.strip().lower() for name in arrays]
+    return list(arrays.values()), header
+
+
+def _find_columns(header, count):
+    """
+    Return the index of the name, x, z and rho columns.
+
+    Also returns True if the vertical column is positive upwards.
+    """
+    columns = dict.fromkeys(COLUMN_ALIASES)
+    upward = False
+    if header is not None:
+        for index, label in enumerate(header):
+            for column, aliases in COLUMN_ALIASES.items():
+                if columns[column] is None and label in aliases:
+                    columns[column] = index
+        if columns["z"] is None:
+            upward_columns = [
+                i for i, label in enumerate(header) if label in UPWARD_ALIASES
+            ]
+            if upward_columns:
+                columns["z"], upward = upward_columns[0], True
+    if all(columns[i] is not None for i in ("x", "z", "rho")):
+        return columns, upward
+    if count < 3:
+        raise ValueError(
+            f"Invalid number of columns '{count}'. Sources need at least 3 "
+            "columns (x, z, rho) or 4 (name, x, z, rho)."
+        )
+    if count == 3:
+        return {"name": None, "x": 0, "z": 1, "rho": 2}, False
+    return {"name": 0, "x": 1, "z": 2, "rho": 3}, False
+
+
+def _to_float(column):
+    """
+    Convert a column to floats, with NaN for the values that aren't numbers.
+    """
+    column = np.asarray(column)
+    if column.dtype.kind in "biuf":
+        return column.astype(np.float64)
+    try:
+        import pandas as pd
+    except ImportError:
+        values = np.full(column.size, np.nan)
+        for index, value in enumerate(column.tolist()):
+            try:
+                values[index] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return values
+    return pd.to_numeric(column, errors="coerce").astype(np.float64)
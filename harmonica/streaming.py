@@ -0,0 +1,329 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Forward modelling of point masses streamed from files in chunks.
+"""
+
+import os
+import queue
+import threading
+import zipfile
+
+import numpy as np
+
+from .point import (
+    check_coordinate_system,
+    choose_parallel_over,
+    dispatcher,
+    prepare_arrays,
+)
+
+# Default names of the columns for each coordinate system
+CARTESIAN_COLUMNS = ("easting", "northing", "upward", "mass")
+SPHERICAL_COLUMNS = ("longitude", "latitude", "radius", "mass")
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+
+def read_npz_chunks(path, columns=CARTESIAN_COLUMNS, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Read point masses from a ``.npz`` file in chunks.
+
+    Arrays are read straight from the archive (compressed or not) without
+    loading them whole into memory.
+
+    Parameters
+    ----------
+    path : str or :class:`os.PathLike`
+        Path to a ``.npz`` file, as written by :func:`numpy.savez` or
+        :func:`numpy.savez_compressed`.
+    columns : tuple of str (optional)
+        Names of the arrays with the three coordinates of the point masses and
+        their masses, in that order. Default :data:`CARTESIAN_COLUMNS`.
+    chunk_size : int (optional)
+        Number of point masses on each chunk. Default 1 000 000.
+
+    Yields
+    ------
+    chunk : tuple of 1d-arrays
+        The three coordinates and the mass of the point masses on the chunk.
+    """
+    with zipfile.ZipFile(path) as archive:
+        files = [archive.open(f"{name}.npy") for name in columns]
+        try:
+            headers = [_read_npy_header(file) for file in files]
+            shapes = {(shape, fortran_order) for shape, fortran_order, _ in headers}
+            if len(shapes) != 1:
+                raise ValueError(
+                    f"Arrays {columns} in '{path}' must have the same shape and order."
+                )
+            size = int(np.prod(headers[0][0]))
+            for start in range(0, size, chunk_size):
+                count = min(chunk_size, size - start)
+                yield tuple(
+                    _read_npy_data(file, dtype, count)
+                    for file, (_, _, dtype) in zip(files, headers)
+                )
+        finally:
+            for file in files:
+                file.close()
+
+
+def _read_npy_header(file):
+    """
+    Read the header of a ``.npy`` file and leave the file at its data.
+    """
+    version = np.lib.format.read_magic(file)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+    if dtype.hasobject:
+        raise ValueError("Arrays with Python objects can't be streamed.")
+    return shape, fortran_order, dtype
+
+
+def _read_npy_data(file, dtype, count):
+    """
+    Read the next ``count`` elements of a ``.npy`` file.
+    """
+    array = np.empty(count, dtype=dtype)
+    buffer = memoryview(array).cast("B")
+    read = 0
+    while read < buffer.nbytes:
+        nbytes = file.readinto(buffer[read:])
+        if not nbytes:
+            raise EOFError("Unexpected end of file while streaming arrays.")
+        read += nbytes
+    return array
+
+
+def read_hdf5_chunks(
+    path, columns=CARTESIAN_COLUMNS, chunk_size=DEFAULT_CHUNK_SIZE, group="/"
+):
+    """
+    Read point masses from an HDF5 file in chunks.
+
+    Requires `h5py <https://www.h5py.org>`__.
+
+    Parameters
+    ----------
+    path : str or :class:`os.PathLike`
+        Path to the HDF5 file.
+    columns : tuple of str (optional)
+        Names of the datasets with the three coordinates of the point masses
+        and their masses, in that order. Default :data:`CARTESIAN_COLUMNS`.
+    chunk_size : int (optional)
+        Number of point masses on each chunk. Default 1 000 000.
+    group : str (optional)
+        Group that contains the datasets. Default ``"/"``.
+
+    Yields
+    ------
+    chunk : tuple of 1d-arrays
+        The three coordinates and the mass of the point masses on the chunk.
+    """
+    try:
+        import h5py
+    except ImportError as error:
+        raise ImportError(
+            "Reading HDF5 files requires the 'h5py' package to be installed."
+        ) from error
+    with h5py.File(path, "r") as file:
+        datasets = [file[group][name] for name in columns]
+        size = datasets[0].size
+        if any(dataset.size != size for dataset in datasets):
+            raise ValueError(f"Datasets {columns} in '{path}' must have the same size.")
+        for start in range(0, size, chunk_size):
+            stop = min(start + chunk_size, size)
+            yield tuple(np.ravel(dataset[start:stop]) for dataset in datasets)
+
+
+def read_parquet_chunks(path, columns=CARTESIAN_COLUMNS, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Read point masses from a Parquet file in chunks.
+
+    Requires `pyarrow <https://arrow.apache.org/docs/python>`__.
+
+    Parameters
+    ----------
+    path : str or :class:`os.PathLike`
+        Path to the Parquet file.
+    columns : tuple of str (optional)
+        Names of the columns with the three coordinates of the point masses and
+        their masses, in that order. Default :data:`CARTESIAN_COLUMNS`.
+    chunk_size : int (optional)
+        Maximum number of point masses on each chunk. Default 1 000 000.
+
+    Yields
+    ------
+    chunk : tuple of 1d-arrays
+        The three coordinates and the mass of the point masses on the chunk.
+    """
+    try:
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError(
+            "Reading Parquet files requires the 'pyarrow' package to be installed."
+        ) from error
+    parquet_file = pyarrow.parquet.ParquetFile(path)
+    for batch in parquet_file.iter_batches(
+        batch_size=chunk_size, columns=list(columns)
+    ):
+        yield tuple(
+            batch.column(name).to_numpy(zero_copy_only=False) for name in columns
+        )
+
+
+def read_source_chunks(path, columns=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Read point masses in chunks, choosing the reader from the file extension.
+
+    Supports ``.npz``, ``.h5``/``.hdf5`` and ``.parquet``/``.pq`` files. See
+    :func:`read_npz_chunks`, :func:`read_hdf5_chunks` and
+    :func:`read_parquet_chunks`.
+    """
+    if columns is None:
+        columns = CARTESIAN_COLUMNS
+    readers = {
+        ".npz": read_npz_chunks,
+        ".h5": read_hdf5_chunks,
+        ".hdf5": read_hdf5_chunks,
+        ".parquet": read_parquet_chunks,
+        ".pq": read_parquet_chunks,
+    }
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in readers:
+        raise ValueError(
+            f"Unsupported file extension '{extension}'. "
+            f"Valid options: {tuple(readers)}"
+        )
+    return readers[extension](path, columns=columns, chunk_size=chunk_size)
+
+
+def point_gravity_streaming(
+    coordinates,
+    chunks,
+    field,
+    coordinate_system="cartesian",
+    parallel=True,
+    dtype="float64",
+    prefetch=1,
+):
+    """
+    Compute gravitational fields of point masses given in chunks.
+
+    Each chunk of point masses is accumulated on the computation points by the
+    same jitted functions used by :func:`harmonica.point.point_gravity`, while
+    a background thread reads the next chunks, so reading from disk overlaps
+    with the computation. Only ``prefetch + 1`` chunks are held in memory at
+    any time: the reader waits before reading more than ``prefetch`` chunks
+    ahead of the one being computed.
+
+    Parameters
+    ----------
+    coordinates : list of arrays
+        Coordinates of the computation points, given as in
+        :func:`harmonica.point.point_gravity`.
+    chunks : iterable of tuples
+        Chunks of point masses, each one given as a tuple with the three
+        coordinates of the point masses and their masses, like the ones
+        yielded by :func:`read_source_chunks`.
+    field : str
+        Gravitational field that wants to be computed. Same options as in
+        :func:`harmonica.point.point_gravity`.
+    coordinate_system : str (optional)
+        Coordinate system of the computation points and the point masses.
+        Available coordinates systems: ``cartesian``, ``spherical``.
+        Default ``cartesian``.
+    parallel : bool (optional)
+        If True the computations will run in parallel using Numba built-in
+        parallelization. Default True.
+    dtype : data-type (optional)
+        Data type assigned to resulting gravitational field. Default to
+        ``np.float64``.
+    prefetch : int (optional)
+        Number of chunks read ahead while computing the current one. The
+        default of 1 double-buffers the chunks.
+
+    Returns
+    -------
+    result : array
+        Gravitational field generated by all the point masses on the
+        computation points, in the same units as
+        :func:`harmonica.point.point_gravity`.
+
+    Examples
+    --------
+    >>> chunks = read_source_chunks("sources.parquet")  # doctest: +SKIP
+    >>> g_z = point_gravity_streaming(coordinates, chunks, "g_z")  # doctest: +SKIP
+    """
+    check_coordinate_system(
+        coordinate_system, valid_coord_systems=("cartesian", "spherical")
+    )
+    if prefetch < 1:
+        raise ValueError(f"Invalid prefetch '{prefetch}'. It must be positive.")
+    cast = np.broadcast(*coordinates[:3])
+    result = np.zeros(cast.size, dtype=dtype)
+    coordinates = tuple(np.atleast_1d(i).ravel() for i in coordinates[:3])
+    for chunk in _prefetch(chunks, prefetch):
+        _, points, masses = prepare_arrays(coordinates, chunk[:3], chunk[3])
+        parallel_over = choose_parallel_over(result.size, masses.size, parallel)
+        forward = dispatcher(coordinate_system, parallel, field, parallel_over)
+        forward(*coordinates, *points, masses, result)
+    return result.reshape(cast.shape)
+
+
+# Marks the end of the chunks on the prefetch queue
+_END = object()
+
+
+def _prefetch(chunks, size):
+    """
+    Iterate over the chunks while a background thread reads the next ones.
+
+    The reader waits for a free slot before reading each chunk and a slot is
+    freed when the consumer takes a chunk, so at most ``size`` chunks are read
+    ahead of the one being used.
+    """
+    buffer = queue.Queue()
+    slots = threading.Semaphore(size)
+    stop = threading.Event()
+
+    def wait_for_slot():
+        # Give up if the consumer stopped iterating
+        while not stop.is_set():
+            if slots.acquire(timeout=0.1):
+                return True
+        return False
+
+    def read():
+        try:
+            iterator = iter(chunks)
+            while wait_for_slot():
+                chunk = next(iterator, _END)
+                if chunk is _END:
+                    break
+                buffer.put(
+                    tuple(np.ascontiguousarray(i, dtype=np.float64) for i in chunk[:4])
+                )
+            buffer.put(_END)
+        except Exception as error:
+            buffer.put(error)
+
+    reader = threading.Thread(target=read, name="harmonica-prefetch", daemon=True)
+    reader.start()
+    try:
+        while (chunk := buffer.get()) is not _END:
+            if isinstance(chunk, Exception):
+                raise chunk
+            # The chunk leaves the read-ahead buffer: read the next one while
+            # this one is used
+            slots.release()
+            yield chunk
+    finally:
+        stop.set()
+        reader.join()
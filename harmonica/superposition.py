@@ -0,0 +1,585 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Batched superposition of point masses on map grids and profiles.
+
+Used by the interactive forward modelling scripts, which place point masses at
+a given depth below a horizontal observation surface and show the downward
+acceleration on a regular grid together with a profile.
+"""
+
+from collections import Counter, OrderedDict
+
+import numpy as np
+from choclo.constants import GRAVITATIONAL_CONST
+from numba import jit, prange
+
+from .hashing import hash_arrays
+
+# Conversion from m/s^2 to mGal
+MGAL = 1e5
+
+# Number of profile points computed by each task of the parallel loop
+PROFILE_BLOCK = 256
+
+
+def gravity_grid(
+    easting,
+    northing,
+    sources,
+    profile=None,
+    out=None,
+    profile_out=None,
+    parallel=True,
+):
+    """
+    Compute the downward acceleration of point masses on a grid and a profile.
+
+    Every point mass contributes :math:`G m z / r^3` (in mGal), where
+    :math:`z` is its depth below the observation surface and :math:`r` the
+    distance to the observation point. The grid and the profile points are
+    computed in a single parallel pass over all point masses, accumulating
+    straight into the output arrays.
+
+    When all point masses share the same northing, grid rows at the same
+    distance from it (up to rounding errors) hold the same values: each of
+    them is computed only once and copied to the others.
+
+    Point masses with zero depth produce no downward acceleration on the
+    surface and are skipped.
+
+    Parameters
+    ----------
+    easting, northing : 1d-arrays
+        Coordinates of the columns and rows of the regular grid, in meters.
+    sources : tuple of arrays
+        Easting, northing, depth (positive downwards) and mass of each point
+        mass, in meters and kilograms.
+    profile : tuple of 1d-arrays or None (optional)
+        Easting and northing of the profile points. They can be anywhere,
+        e.g. several polylines sampled with :func:`sample_polyline` and
+        concatenated, which are then computed along with the grid. If None,
+        no profile is computed. Default None.
+    out : 2d-array or None (optional)
+        Array of shape ``(northing.size, easting.size)`` where the grid will
+        be stored. If None, a new array is allocated. Default None.
+    profile_out : 1d-array or None (optional)
+        Array where the profile will be stored. If None, a new array is
+        allocated. Default None.
+    parallel : bool (optional)
+        If True the computations will run in parallel using Numba built-in
+        parallelization. Default True.
+
+    Returns
+    -------
+    grid : 2d-array
+        Downward acceleration on the grid in mGal.
+    profile : 1d-array or None
+        Downward acceleration on the profile points in mGal, or None if no
+        profile was given.
+    """
+    easting = np.ascontiguousarray(easting, dtype=np.float64)
+    northing = np.ascontiguousarray(northing, dtype=np.float64)
+    sources = [np.atleast_1d(np.asarray(i, dtype=np.float64)).ravel() for i in sources]
+    if len({i.size for i in sources}) != 1:
+        raise ValueError(
+            "Source easting, northing, depth and masses must have the same size."
+        )
+    has_profile = profile is not None
+    if not has_profile:
+        profile = (np.empty(0), np.empty(0))
+    profile = [np.ascontiguousarray(i, dtype=np.float64).ravel() for i in profile]
+    if out is None:
+        out = np.empty((northing.size, easting.size))
+    if profile_out is None:
+        profile_out = np.empty(profile[0].size)
+    if out.shape != (northing.size, easting.size) or not out.flags.c_contiguous:
+        raise ValueError(
+            f"Invalid out with shape {out.shape}. It must be a C-contiguous array "
+            f"with shape {(northing.size, easting.size)}."
+        )
+    if profile_out.shape != profile[0].shape:
+        raise ValueError(
+            f"Invalid profile_out with shape {profile_out.shape}. "
+            f"It must have shape {profile[0].shape}."
+        )
+    # Skip the point masses at zero depth and fold the constants into the
+    # masses so the inner loop only needs a division per source
+    easting_p, northing_p, depth, masses = sources
+    keep = depth != 0
+    easting_p, northing_p, depth = easting_p[keep], northing_p[keep], depth[keep]
+    factor = GRAVITATIONAL_CONST * MGAL * masses[keep] * depth
+    # Find the rows that need to be computed
+    rows = np.arange(northing.size)
+    if easting_p.size and np.all(northing_p == northing_p[0]):
+        # Round the distances so rows that are symmetric up to rounding errors
+        # (e.g. the ones of np.linspace) are detected as well
+        distance = np.abs(northing - northing_p[0])
+        scale = distance.max() if distance.size and distance.max() > 0 else 1.0
+        _, rows, inverse = np.unique(
+            np.round(distance / scale, 12), return_index=True, return_inverse=True
+        )
+        rows = rows[inverse.ravel()]
+    function = superpose_parallel if parallel else superpose_serial
+    function(
+        easting,
+        northing,
+        rows,
+        profile[0],
+        profile[1],
+        easting_p,
+        northing_p,
+        depth**2,
+        factor,
+        out,
+        profile_out,
+        PROFILE_BLOCK,
+    )
+    if not has_profile:
+        return out, None
+    return out, profile_out
+
+
+def _superpose(
+    easting,
+    northing,
+    rows,
+    easting_profile,
+    northing_profile,
+    easting_p,
+    northing_p,
+    depth_squared,
+    factor,
+    out,
+    profile_out,
+    block,
+):
+    """
+    Accumulate the point masses on the grid rows and the profile points.
+
+    Row ``j`` of the grid is computed only if ``rows[j] == j``, otherwise it's
+    copied from row ``rows[j]``. The profile points are split in blocks of
+    ``block`` points, computed as extra tasks of the same parallel loop.
+    """
+    n_rows = northing.size
+    n_blocks = (easting_profile.size + block - 1) // block
+    for task in prange(n_rows + n_blocks):
+        if task < n_rows:
+            if rows[task] != task:
+                continue
+            row = out[task]
+            row[:] = 0.0
+            for k in range(easting_p.size):
+                delta_northing = northing[task] - northing_p[k]
+                offset = delta_northing * delta_northing + depth_squared[k]
+                # Contiguous inner loop over the columns so it gets vectorised
+                for i in range(easting.size):
+                    delta_easting = easting[i] - easting_p[k]
+                    distance_sq = delta_easting * delta_easting + offset
+                    row[i] += factor[k] / (distance_sq * np.sqrt(distance_sq))
+        else:
+            start = (task - n_rows) * block
+            for i in range(start, min(start + block, easting_profile.size)):
+                accumulator = 0.0
+                for k in range(easting_p.size):
+                    delta_easting = easting_profile[i] - easting_p[k]
+                    delta_northing = northing_profile[i] - northing_p[k]
+                    distance_sq = (
+                        delta_easting * delta_easting
+                        + delta_northing * delta_northing
+                        + depth_squared[k]
+                    )
+                    accumulator += factor[k] / (distance_sq * np.sqrt(distance_sq))
+                profile_out[i] = accumulator
+    # Copy the rows that share their values with a computed one
+    for j in prange(n_rows):
+        if rows[j] != j:
+            out[j, :] = out[rows[j], :]
+
+
+# Every distance is positive (point masses at zero depth are skipped), so the
+# division by zero checks can be dropped, which lets the inner loop vectorise
+superpose_serial = jit(nopython=True, nogil=True, error_model="numpy")(_superpose)
+superpose_parallel = jit(nopython=True, nogil=True, parallel=True, error_model="numpy")(
+    _superpose
+)
+
+
+def refine_gravity_grid(
+    easting,
+    northing,
+    sources,
+    profile=None,
+    coarse_size=64,
+    refinement=4,
+    out=None,
+    profile_out=None,
+    parallel=True,
+):
+    """
+    Compute the grid of :func:`gravity_grid` progressively, coarse to fine.
+
+    Generator that fills the grid on nested levels: the first one takes every
+    ``stride``-th node of the grid so it has at most ``coarse_size`` nodes per
+    axis, and every following level divides the stride by ``refinement``
+    until the full grid is computed. Nodes computed on a level are reused by
+    the finer ones, so the whole refinement costs the same as computing the
+    full grid once. The profile points are refined with the same strides.
+
+    Nodes of a level are never written again by the finer ones, so the
+    yielded views can be read (e.g. drawn) while the next level is computed.
+
+    Parameters
+    ----------
+    easting, northing, sources, profile, parallel
+        Same as in :func:`gravity_grid`.
+    coarse_size : int (optional)
+        Maximum number of nodes per axis of the first level. Default 64.
+    refinement : int (optional)
+        Factor between the strides of two consecutive levels. Default 4.
+    out : 2d-array or None (optional)
+        Array of shape ``(northing.size, easting.size)`` where the full grid
+        will be stored. If None, a new array is allocated. Default None.
+    profile_out : 1d-array or None (optional)
+        Array where the full profile will be stored. If None, a new array is
+        allocated. Default None.
+
+    Yields
+    ------
+    stride : int
+        Stride of the level. The last level has a stride of 1.
+    grid : 2d-array
+        View of the nodes of ``out`` computed up to this level, i.e.
+        ``out[::stride, ::stride]``.
+    profile : 1d-array or None
+        View of the profile points computed up to this level, or None if no
+        profile was given.
+    """
+    if coarse_size < 2 or refinement < 2:
+        raise ValueError(
+            f"Invalid coarse_size '{coarse_size}' or refinement '{refinement}'. "
+            "Both must be greater than one."
+        )
+    easting = np.ascontiguousarray(easting, dtype=np.float64)
+    northing = np.ascontiguousarray(northing, dtype=np.float64)
+    has_profile = profile is not None
+    if not has_profile:
+        profile = (np.empty(0), np.empty(0))
+    profile = [np.ascontiguousarray(i, dtype=np.float64).ravel() for i in profile]
+    if out is None:
+        out = np.empty((northing.size, easting.size))
+    if profile_out is None:
+        profile_out = np.empty(profile[0].size)
+    strides = [1]
+    size = max(easting.size, northing.size, profile[0].size)
+    while (size - 1) // strides[-1] + 1 > coarse_size:
+        strides.append(strides[-1] * refinement)
+    previous = None
+    for stride in reversed(strides):
+        rows = np.arange(0, northing.size, stride)
+        columns = np.arange(0, easting.size, stride)
+        points = np.arange(0, profile[0].size, stride)
+        if previous is None:
+            blocks = [(rows, columns)]
+        else:
+            # New nodes: the new rows on every column, plus the new columns
+            # on the rows of the previous level
+            new_rows = rows[rows % previous != 0]
+            new_columns = columns[columns % previous != 0]
+            blocks = [(new_rows, columns), (rows[rows % previous == 0], new_columns)]
+            points = points[points % previous != 0]
+        for i, (block_rows, block_columns) in enumerate(blocks):
+            block_profile = None
+            if i == 0:
+                block_profile = (profile[0][points], profile[1][points])
+            grid, values = gravity_grid(
+                easting[block_columns],
+                northing[block_rows],
+                sources,
+                profile=block_profile,
+                parallel=parallel,
+            )
+            out[np.ix_(block_rows, block_columns)] = grid
+            if values is not None:
+                profile_out[points] = values
+        previous = stride
+        yield (
+            stride,
+            out[::stride, ::stride],
+            profile_out[::stride] if has_profile else None,
+        )
+
+
+def gravity_grid_blocks(easting, northing, sources, block_rows=256, parallel=True):
+    """
+    Compute the grid of :func:`gravity_grid` in blocks of rows.
+
+    Generator that computes ``block_rows`` rows of the grid at a time into a
+    single buffer, so grids that don't fit in memory can be written to disk
+    (e.g. with :func:`harmonica.export.write_grid`) while they're computed.
+
+    Parameters
+    ----------
+    easting, northing, sources, parallel
+        Same as in :func:`gravity_grid`.
+    block_rows : int (optional)
+        Number of rows on each block. Default 256.
+
+    Yields
+    ------
+    block : 2d-array
+        Downward acceleration on the next ``block_rows`` rows of the grid
+        (fewer on the last block) in mGal. The same buffer is reused for
+        every block, so each one must be used (or copied) before asking for
+        the next.
+    """
+    if block_rows < 1:
+        raise ValueError(f"Invalid block_rows '{block_rows}'. It must be positive.")
+    easting = np.ascontiguousarray(easting, dtype=np.float64)
+    northing = np.ascontiguousarray(northing, dtype=np.float64)
+    buffer = np.empty((min(block_rows, northing.size), easting.size))
+    for start in range(0, northing.size, block_rows):
+        stop = min(start + block_rows, northing.size)
+        block, _ = gravity_grid(
+            easting,
+            northing[start:stop],
+            sources,
+            out=buffer[: stop - start],
+            parallel=parallel,
+        )
+        yield block
+
+
+def sample_polyline(easting, northing, size=512):
+    """
+    Sample evenly spaced points along a polyline.
+
+    Useful to compute profiles along arbitrary lines with
+    :func:`gravity_grid`, at a density that doesn't depend on the grid.
+
+    Parameters
+    ----------
+    easting, northing : 1d-arrays
+        Coordinates of the vertices of the polyline, in order.
+    size : int (optional)
+        Number of points sampled along the polyline, including both of its
+        ends. Default 512.
+
+    Returns
+    -------
+    easting, northing : 1d-arrays
+        Coordinates of the sampled points.
+    distance : 1d-array
+        Distance of each sampled point from the first vertex, measured along
+        the polyline.
+    """
+    easting = np.atleast_1d(np.asarray(easting, dtype=np.float64)).ravel()
+    northing = np.atleast_1d(np.asarray(northing, dtype=np.float64)).ravel()
+    if easting.size != northing.size:
+        raise ValueError("Vertices easting and northing must have the same size.")
+    if size < 2:
+        raise ValueError(f"Invalid size '{size}'. It must be at least 2.")
+    # Drop repeated vertices so the distances along the polyline increase
+    keep = np.ones(easting.size, dtype=bool)
+    keep[1:] = (np.diff(easting) != 0) | (np.diff(northing) != 0)
+    easting, northing = easting[keep], northing[keep]
+    if easting.size < 2:
+        raise ValueError("A polyline needs at least two different vertices.")
+    vertices = np.zeros(easting.size)
+    vertices[1:] = np.cumsum(np.hypot(np.diff(easting), np.diff(northing)))
+    distance = np.linspace(0, vertices[-1], size)
+    return (
+        np.interp(distance, vertices, easting),
+        np.interp(distance, vertices, northing),
+        distance,
+    )
+
+
+class FieldLayerCache:
+    """
+    Keep the grid of :func:`gravity_grid` up to date incrementally.
+
+    Holds the running total of the field of the current point masses and the
+    contribution (layer) of individual point masses, keyed by their
+    coordinates, depth and mass together with the grid and profile. When
+    point masses are added, removed or edited, only their layers are added to
+    or subtracted from the total: cached layers are reused and missing ones
+    cost a single point mass evaluation. Layers are kept in a Least Recently
+    Used (LRU) store capped to ``max_bytes``.
+
+    The total is rebuilt from scratch with a single batched pass whenever
+    the grid or profile change, when more point masses changed than remain,
+    or after ``max_updates`` incremental updates to bound the accumulation of
+    rounding errors.
+
+    The arrays returned by :meth:`total` are updated in place by later
+    calls: copy them if they must outlive the next update.
+
+    Parameters
+    ----------
+    max_bytes : int (optional)
+        Maximum number of bytes held by the cached layers. Default 256 MiB.
+    max_updates : int (optional)
+        Number of incremental updates after which the total is rebuilt.
+        Default 1000.
+    parallel : bool (optional)
+        Passed to :func:`gravity_grid`. Default True.
+
+    Attributes
+    ----------
+    stats : dict
+        Number of layer ``hits``, ``misses``, ``evictions`` and total
+        ``rebuilds``.
+    """
+
+    def __init__(self, max_bytes=256 * 2**20, max_updates=1000, parallel=True):
+        self.max_bytes = max_bytes
+        self.max_updates = max_updates
+        self.parallel = parallel
+        self.nbytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "rebuilds": 0}
+        self._layers = OrderedDict()
+        self._spec = None
+        self._grid = None
+        self._profile = None
+        self._included = Counter()
+        self._updates = 0
+
+    def pending(self, easting, northing, sources, profile=None):
+        """
+        Return the number of layers that :meth:`total` would evaluate.
+
+        Returns None if :meth:`total` would rebuild the whole total instead.
+        """
+        spec = _grid_spec(easting, northing, profile)
+        changes = self._changes(spec, _source_keys(sources))
+        if changes is None:
+            return None
+        added, removed = changes
+        return sum(
+            count
+            for key, count in (added + removed).items()
+            if (spec, key) not in self._layers
+        )
+
+    def total(self, easting, northing, sources, profile=None):
+        """
+        Return the field of the point masses on the grid and the profile.
+
+        Takes the same arguments as :func:`gravity_grid` and returns the
+        same values, updating the running total with as few point mass
+        evaluations as possible.
+        """
+        spec = _grid_spec(easting, northing, profile)
+        keys = _source_keys(sources)
+        changes = self._changes(spec, keys)
+        if changes is None:
+            self._grid, self._profile = gravity_grid(
+                easting, northing, sources, profile=profile, parallel=self.parallel
+            )
+            self._set(spec, keys)
+            self.stats["rebuilds"] += 1
+            return self._grid, self._profile
+        added, removed = changes
+        for sign, counter in ((-1, removed), (1, added)):
+            for key, count in counter.items():
+                grid, values = self._layer(spec, key, easting, northing, profile)
+                self._grid += sign * count * grid
+                if values is not None:
+                    self._profile += sign * count * values
+        self._included = Counter(keys)
+        self._updates += 1
+        return self._grid, self._profile
+
+    def set_total(self, easting, northing, sources, grid, profile=None, values=None):
+        """
+        Use a field computed elsewhere as the running total.
+
+        Parameters
+        ----------
+        easting, northing, sources, profile
+            Same as in :func:`gravity_grid`.
+        grid : 2d-array
+            Field of all the point masses on the grid. It's copied.
+        values : 1d-array or None (optional)
+            Field of all the point masses on the profile points. It's copied.
+        """
+        self._grid = np.array(grid, dtype=np.float64)
+        self._profile = None if values is None else np.array(values, np.float64)
+        self._set(_grid_spec(easting, northing, profile), _source_keys(sources))
+
+    def clear(self):
+        """
+        Remove the cached layers and the running total.
+        """
+        self._layers.clear()
+        self.nbytes = 0
+        self._spec = None
+        self._grid = self._profile = None
+        self._included = Counter()
+
+    def _set(self, spec, keys):
+        self._spec = spec
+        self._included = Counter(keys)
+        self._updates = 0
+
+    def _changes(self, spec, keys):
+        """
+        Return the added and removed point masses, or None to rebuild.
+        """
+        if spec != self._spec or self._updates >= self.max_updates:
+            return None
+        requested = Counter(keys)
+        added = requested - self._included
+        removed = self._included - requested
+        if sum(added.values()) + sum(removed.values()) > len(keys):
+            return None
+        return added, removed
+
+    def _layer(self, spec, key, easting, northing, profile):
+        """
+        Return the layer of a point mass, computing it if it isn't cached.
+        """
+        if (spec, key) in self._layers:
+            self._layers.move_to_end((spec, key))
+            self.stats["hits"] += 1
+            return self._layers[(spec, key)]
+        self.stats["misses"] += 1
+        layer = gravity_grid(
+            easting,
+            northing,
+            tuple([i] for i in key),
+            profile=profile,
+            parallel=self.parallel,
+        )
+        nbytes = sum(i.nbytes for i in layer if i is not None)
+        if nbytes <= self.max_bytes:
+            self._layers[(spec, key)] = layer
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._layers.popitem(last=False)
+                self.nbytes -= sum(i.nbytes for i in evicted if i is not None)
+                self.stats["evictions"] += 1
+        return layer
+
+
+def _grid_spec(easting, northing, profile):
+    """
+    Hash the coordinates of a grid and its profile points.
+    """
+    arrays = [np.asarray(easting, dtype=np.float64), np.asarray(northing, np.float64)]
+    if profile is not None:
+        arrays.extend(np.asarray(i, dtype=np.float64) for i in profile)
+    return hash_arrays(*arrays, params=(profile is not None,))
+
+
+def _source_keys(sources):
+    """
+    Return a hashable key (easting, northing, depth, mass) per point mass.
+    """
+    sources = [np.atleast_1d(np.asarray(i, dtype=np.float64)).ravel() for i in sources]
+    return list(zip(*(i.tolist() for i in sources)))
@@ -0,0 +1,165 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Test the forward modelling of point masses from asyncio.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from ..aio import AsyncPointGravity, point_gravity_async
+from ..point import point_gravity
+
+
+class RecordingExecutor(ThreadPoolExecutor):
+    """
+    Thread pool that records the calls it runs and how many overlap.
+    """
+
+    def __init__(self, max_workers, delay=0.0, release=None):
+        super().__init__(max_workers=max_workers)
+        self.delay = delay
+        self.release = release
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def submit(self, function, *args, **kwargs):
+        return super().submit(self._run, function, *args, **kwargs)
+
+    def _run(self, function, *args, **kwargs):
+        with self.lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            if self.release is not None:
+                self.release.wait(timeout=10)
+            time.sleep(self.delay)
+            return function(*args, **kwargs)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+@pytest.fixture(name="model")
+def fixture_model():
+    """
+    Computation points above a few point masses
+    """
+    easting, northing = np.meshgrid(np.linspace(-1e3, 1e3, 20), np.linspace(0, 1e3, 9))
+    coordinates = (easting, northing, np.full_like(easting, 10.0))
+    rng = np.random.default_rng(0)
+    points = (
+        rng.uniform(-1e3, 1e3, 30),
+        rng.uniform(0, 1e3, 30),
+        rng.uniform(-500, -100, 30),
+    )
+    masses = rng.uniform(-1e9, 1e9, 30)
+    return coordinates, points, masses
+
+
+@pytest.mark.parametrize("field", ("potential", "g_z", "g_ne"))
+def test_async_point_gravity(model, field):
+    """
+    Check the asynchronous forward model against point_gravity
+    """
+    coordinates, points, masses = model
+    expected = point_gravity(coordinates, points, masses, field, parallel=False)
+
+    async def run():
+        async with AsyncPointGravity(chunk_size=47) as runner:
+            return await runner.point_gravity(
+                coordinates, points, masses, field, parallel=False
+            )
+
+    result = asyncio.run(run())
+    assert result.shape == expected.shape
+    npt.assert_allclose(result, expected, rtol=1e-12)
+
+
+def test_point_gravity_async_loop_executor(model):
+    """
+    Check the default runner against point_gravity and that no thread outlives
+    the event loop
+    """
+    coordinates, points, masses = model
+    expected = point_gravity(coordinates, points, masses, "g_z", parallel=False)
+    result = asyncio.run(
+        point_gravity_async(coordinates, points, masses, "g_z", parallel=False)
+    )
+    npt.assert_allclose(result, expected, rtol=1e-12)
+    assert not [i for i in threading.enumerate() if i.name.startswith("harmonica")]
+
+
+def test_async_point_gravity_cancel(model):
+    """
+    Check that cancelling stops the computation before the next chunk
+    """
+    coordinates, points, masses = model
+    release = threading.Event()
+    executor = RecordingExecutor(max_workers=1, release=release)
+    runner = AsyncPointGravity(chunk_size=10, executor=executor)
+
+    async def run():
+        task = asyncio.create_task(
+            runner.point_gravity(coordinates, points, masses, "g_z", parallel=False)
+        )
+        while executor.calls == 0:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    executor.shutdown(wait=True)
+    assert executor.calls == 1
+
+
+@pytest.mark.parametrize("max_concurrent", (1, 2))
+def test_async_point_gravity_max_concurrent(model, max_concurrent):
+    """
+    Check that no more than max_concurrent forward models run at once
+    """
+    coordinates, points, masses = model
+    executor = RecordingExecutor(max_workers=4, delay=0.01)
+    runner = AsyncPointGravity(
+        max_concurrent=max_concurrent, chunk_size=60, executor=executor
+    )
+
+    async def run():
+        return await asyncio.gather(
+            *(
+                runner.point_gravity(coordinates, points, masses, "g_z", parallel=False)
+                for _ in range(4)
+            )
+        )
+
+    results = asyncio.run(run())
+    executor.shutdown(wait=True)
+    assert executor.calls == 4 * 3
+    assert executor.max_running == max_concurrent
+    for result in results[1:]:
+        npt.assert_allclose(result, results[0])
+
+
+def test_async_point_gravity_invalid():
+    """
+    Check errors raised with invalid arguments
+    """
+    with pytest.raises(ValueError, match="Invalid max_concurrent"):
+        AsyncPointGravity(max_concurrent=0)
+    with pytest.raises(ValueError, match="Invalid chunk_size"):
+        AsyncPointGravity(chunk_size=0)
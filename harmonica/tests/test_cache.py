@@ -0,0 +1,139 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Test the content-addressed cache of point_gravity results.
+"""
+
+import os
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from ..cache import FILE_PREFIX, PointGravityCache
+from ..point import point_gravity
+
+
+@pytest.fixture(name="model")
+def fixture_model():
+    """
+    Computation points above a few point masses.
+    """
+    easting, northing = np.meshgrid(np.linspace(-100, 100, 8), np.linspace(-50, 50, 6))
+    coordinates = (easting, northing, np.full_like(easting, 10.0))
+    points = (
+        np.array([0.0, 30.0, -20.0]),
+        np.array([0.0, 10.0, 15.0]),
+        np.array([-40.0, -60.0, -30.0]),
+    )
+    masses = np.array([1e8, 2e8, -5e7])
+    return coordinates, points, masses
+
+
+def test_cache_hits(model):
+    """
+    Check that repeated forward models are served from memory
+    """
+    coordinates, points, masses = model
+    cache = PointGravityCache()
+    first = cache(coordinates, points, masses, "g_z")
+    npt.assert_allclose(first, point_gravity(coordinates, points, masses, "g_z"))
+    assert not first.flags.writeable
+    # Same values on different arrays must hit the cache
+    second = cache(tuple(i.copy() for i in coordinates), points, list(masses), "g_z")
+    assert second is first
+    assert cache.stats == {"hits": 1, "disk_hits": 0, "misses": 1, "evictions": 0}
+    assert len(cache) == 1
+    assert cache.key(coordinates, points, masses, "g_z") in cache
+
+
+@pytest.mark.parametrize(
+    "change",
+    ("coordinates", "points", "masses", "field", "dtype"),
+)
+def test_cache_changed_inputs(model, change):
+    """
+    Check that changing any input misses the cache
+    """
+    coordinates, points, masses = model
+    cache = PointGravityCache()
+    cache(coordinates, points, masses, "g_z")
+    kwargs = {"field": "g_z", "dtype": "float64"}
+    if change == "coordinates":
+        coordinates = (coordinates[0] + 1e-9, *coordinates[1:])
+    elif change == "points":
+        points = (points[0], points[1], points[2] - 1)
+    elif change == "masses":
+        masses = masses.copy()
+        masses[0] *= 2
+    elif change == "field":
+        kwargs["field"] = "g_e"
+    else:
+        kwargs["dtype"] = "float32"
+    result = cache(coordinates, points, masses, **kwargs)
+    assert cache.stats["misses"] == 2
+    assert cache.stats["hits"] == 0
+    npt.assert_allclose(result, point_gravity(coordinates, points, masses, **kwargs))
+
+
+def test_cache_invalidate_and_evict(model):
+    """
+    Check invalidation of a key and the eviction of least recently used results
+    """
+    coordinates, points, masses = model
+    size = coordinates[0].size * 8
+    cache = PointGravityCache(max_bytes=2 * size)
+    keys = [cache.key(coordinates, points, masses, f) for f in ("g_z", "g_e", "g_n")]
+    cache(coordinates, points, masses, "g_z")
+    cache(coordinates, points, masses, "g_e")
+    # Use g_z, so g_e is the least recently used one
+    cache(coordinates, points, masses, "g_z")
+    cache(coordinates, points, masses, "g_n")
+    assert cache.stats["evictions"] == 1
+    assert cache.nbytes == 2 * size
+    assert keys[0] in cache and keys[2] in cache
+    assert keys[1] not in cache
+    cache.invalidate(keys[0])
+    assert keys[0] not in cache
+    assert cache.nbytes == size
+    cache(coordinates, points, masses, "g_z")
+    assert cache.stats["misses"] == 4
+
+
+def test_cache_disk(model, tmp_path):
+    """
+    Check that results on disk are shared between caches and cleared safely
+    """
+    coordinates, points, masses = model
+    directory = tmp_path / "cache"
+    cache = PointGravityCache(directory=directory)
+    expected = cache(coordinates, points, masses, "g_z")
+    key = cache.key(coordinates, points, masses, "g_z")
+    assert os.listdir(directory) == [f"{FILE_PREFIX}{key}.npy"]
+    # A new cache (e.g. on another run) loads the result from disk
+    other = PointGravityCache(directory=directory)
+    assert key in other
+    result = other(coordinates, points, masses, "g_z")
+    assert other.stats["disk_hits"] == 1
+    assert isinstance(result, np.memmap)
+    npt.assert_array_equal(result, expected)
+    # Disk hits are promoted to the in-memory store
+    assert len(other) == 1
+    assert other(coordinates, points, masses, "g_z") is result
+    assert other.stats["hits"] == 1
+    assert other.stats["disk_hits"] == 1
+    del result
+    # Clearing removes only the files written by the cache
+    np.save(directory / "mine.npy", np.zeros(3))
+    (directory / "notes.txt").write_text("keep me")
+    other.clear()
+    assert sorted(os.listdir(directory)) == ["mine.npy", "notes.txt"]
+    # The first cache still holds the result in memory
+    assert key in cache
+    cache.clear(disk=False)
+    assert len(cache) == 0
+    assert key not in cache
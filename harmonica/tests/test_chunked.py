@@ -0,0 +1,121 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Test the lazy forward modelling over chunked arrays.
+"""
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from ..chunked import FIELD_UNITS, point_gravity_chunked
+from ..point import point_gravity
+
+da = pytest.importorskip("dask.array")
+
+
+@pytest.fixture(name="model")
+def fixture_model():
+    """
+    Computation points on a grid above a set of random point masses
+    """
+    rng = np.random.default_rng(0)
+    easting, northing = np.meshgrid(np.linspace(-1e3, 1e3, 24), np.linspace(0, 2e3, 18))
+    coordinates = (easting, northing, np.full_like(easting, 50.0))
+    points = tuple(rng.uniform(-1e3, 1e3, 150) for _ in range(3))
+    points = (points[0], points[1] + 1e3, points[2] - 1.5e3)
+    masses = rng.uniform(-1e9, 1e9, 150)
+    return coordinates, points, masses
+
+
+@pytest.mark.parametrize("field", ("potential", "g_z", "g_ze"))
+def test_point_gravity_chunked(model, field):
+    """
+    Check the chunked forward model against the in-memory one
+    """
+    coordinates, points, masses = model
+    expected = point_gravity(coordinates, points, masses, field)
+    chunked = tuple(da.from_array(i, chunks=(7, 10)) for i in coordinates)
+    result = point_gravity_chunked(chunked, points, masses, field)
+    assert isinstance(result, da.Array)
+    assert result.chunks == chunked[0].chunks
+    npt.assert_allclose(result.compute(), expected, rtol=1e-12)
+
+
+def test_point_gravity_chunked_shared_sources(model):
+    """
+    Check that every chunk reads the point masses from a single graph node
+    """
+    from dask.core import get_dependencies
+    from dask.local import get_sync
+
+    coordinates, points, masses = model
+    chunked = tuple(da.from_array(i, chunks=(6, 6)) for i in coordinates)
+    result = point_gravity_chunked(chunked, points, masses, "g_z")
+    graph = dict(result.__dask_graph__())
+    shared = set.intersection(
+        *(set(get_dependencies(graph, key)) for key in result.__dask_keys__()[0])
+    )
+    assert len(shared) == 1
+    sources_points, sources_masses = get_sync(graph, shared.pop())
+    npt.assert_equal(sources_points, points)
+    npt.assert_equal(sources_masses, masses)
+
+
+def test_point_gravity_chunked_xarray(model):
+    """
+    Check the chunked forward model on xarray.DataArray coordinates
+    """
+    xr = pytest.importorskip("xarray")
+    coordinates, points, masses = model
+    expected = point_gravity(coordinates, points, masses, "g_nz")
+    dims = ("northing", "easting")
+    coords = {"easting": coordinates[0][0], "northing": coordinates[1][:, 0]}
+    grid = tuple(
+        xr.DataArray(i, dims=dims, coords=coords).chunk({"easting": 8})
+        for i in coordinates
+    )
+    result = point_gravity_chunked(grid, points, masses, "g_nz")
+    assert isinstance(result, xr.DataArray)
+    assert result.dims == dims
+    assert result.name == "g_nz"
+    assert result.attrs["units"] == "Eotvos"
+    npt.assert_allclose(result.easting, coords["easting"])
+    npt.assert_allclose(result.compute().values, expected, rtol=1e-12)
+
+
+def test_field_units():
+    """
+    Check that every field of the Cartesian forward model has its units
+    """
+    fields = (
+        "potential",
+        "g_e",
+        "g_n",
+        "g_z",
+        "g_ee",
+        "g_nn",
+        "g_zz",
+        "g_en",
+        "g_ez",
+        "g_nz",
+        "g_ne",
+        "g_ze",
+        "g_zn",
+    )
+    assert set(FIELD_UNITS) == set(fields)
+
+
+def test_point_gravity_chunked_invalid(model):
+    """
+    Check that invalid arguments are rejected before building the graph
+    """
+    coordinates, points, masses = model
+    with pytest.raises(ValueError, match="Invalid threads_per_task"):
+        point_gravity_chunked(coordinates, points, masses, "g_z", threads_per_task=0)
+    with pytest.raises(ValueError, match="mismatch the number of points"):
+        point_gravity_chunked(coordinates, points, masses[:-1], "g_z")
@@ -0,0 +1,123 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Test the compression of point-mass models by mass lumping.
+"""
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from ..compression import lump_point_masses
+from ..point import point_gravity
+
+
+@pytest.fixture(name="model")
+def fixture_model():
+    """
+    Random point masses of both signs under a regular grid of stations.
+    """
+    rng = np.random.default_rng(42)
+    size = 3000
+    points = (
+        rng.uniform(-5e3, 5e3, size),
+        rng.uniform(-5e3, 5e3, size),
+        rng.uniform(-12e3, -8e3, size),
+    )
+    masses = rng.uniform(1e8, 1e9, size) * rng.choice([1, -1], size, p=[0.8, 0.2])
+    easting, northing = np.meshgrid(
+        np.linspace(-6e3, 6e3, 31), np.linspace(-6e3, 6e3, 31)
+    )
+    coordinates = (easting, northing, np.zeros_like(easting))
+    return coordinates, points, masses
+
+
+@pytest.mark.parametrize("quadrupole", (False, True))
+@pytest.mark.parametrize(
+    "field, tolerance",
+    (("potential", 1e-4), ("g_z", 1e-3), ("g_e", 1e-3), ("g_zz", 1e-2)),
+)
+def test_lump_point_masses_tolerance(model, field, tolerance, quadrupole):
+    """
+    Check that the compressed model is within the tolerance and smaller
+    """
+    coordinates, points, masses = model
+    new_points, new_masses = lump_point_masses(
+        coordinates, points, masses, field, tolerance, quadrupole=quadrupole
+    )
+    assert new_masses.size < 0.7 * masses.size
+    expected = point_gravity(coordinates, points, masses, field)
+    result = point_gravity(coordinates, new_points, new_masses, field)
+    assert np.abs(result - expected).max() <= tolerance
+    # Lumping keeps the total mass of each sign
+    npt.assert_allclose(new_masses[new_masses > 0].sum(), masses[masses > 0].sum())
+    npt.assert_allclose(new_masses[new_masses < 0].sum(), masses[masses < 0].sum())
+
+
+def test_lump_point_masses_tolerance_shallow():
+    """
+    Check the tolerance for sources right below the stations
+    """
+    rng = np.random.default_rng(0)
+    points = (
+        rng.uniform(-1e3, 1e3, 2000),
+        rng.uniform(-1e3, 1e3, 2000),
+        rng.uniform(-800, -50, 2000),
+    )
+    masses = rng.uniform(1e6, 1e7, 2000)
+    easting = np.linspace(-1e3, 1e3, 21)
+    coordinates = (easting, np.zeros_like(easting), np.zeros_like(easting))
+    tolerance = 0.05
+    new_points, new_masses = lump_point_masses(
+        coordinates, points, masses, "g_z", tolerance, leaf_size=4
+    )
+    assert new_masses.size < masses.size
+    error = point_gravity(coordinates, new_points, new_masses, "g_z") - point_gravity(
+        coordinates, points, masses, "g_z"
+    )
+    assert np.abs(error).max() <= tolerance
+
+
+def test_lump_point_masses_spherical():
+    """
+    Check the tolerance of a model compressed on spherical coordinates
+    """
+    rng = np.random.default_rng(1)
+    points = (
+        rng.uniform(-2, 2, 1000),
+        rng.uniform(-2, 2, 1000),
+        6371e3 - rng.uniform(200e3, 300e3, 1000),
+    )
+    masses = rng.uniform(1e12, 1e13, 1000)
+    longitude, latitude = np.meshgrid(np.linspace(-5, 5, 15), np.linspace(-5, 5, 15))
+    coordinates = (longitude, latitude, np.full_like(longitude, 6371e3 + 1e3))
+    tolerance = 1e-2
+    new_points, new_masses = lump_point_masses(
+        coordinates, points, masses, "g_z", tolerance, coordinate_system="spherical"
+    )
+    assert new_masses.size < masses.size
+    expected = point_gravity(
+        coordinates, points, masses, "g_z", coordinate_system="spherical"
+    )
+    result = point_gravity(
+        coordinates, new_points, new_masses, "g_z", coordinate_system="spherical"
+    )
+    assert np.abs(result - expected).max() <= tolerance
+
+
+def test_lump_point_masses_invalid():
+    """
+    Check errors raised with invalid arguments
+    """
+    coordinates = ([0.0], [0.0], [0.0])
+    points = ([0.0, 1.0], [0.0, 1.0], [-10.0, -10.0])
+    with pytest.raises(ValueError, match="Invalid tolerance"):
+        lump_point_masses(coordinates, points, [1.0, 1.0], "g_z", 0)
+    with pytest.raises(ValueError, match="Invalid leaf_size"):
+        lump_point_masses(coordinates, points, [1.0, 1.0], "g_z", 1, leaf_size=0)
+    with pytest.raises(ValueError, match="mismatch"):
+        lump_point_masses(coordinates, points, [1.0], "g_z", 1)
@@ -0,0 +1,243 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Test the binary exports of grids and point sources.
+"""
+
+import json
+import zlib
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from ..export import write_grid, write_sources
+from ..sources import SourceStore, read_sources
+
+
+@pytest.fixture(name="grid")
+def fixture_grid():
+    """
+    Coordinates and values of a small grid
+    """
+    easting = np.linspace(-100, 100, 7)
+    northing = np.linspace(0, 50, 11)
+    values = np.random.default_rng(0).normal(size=(northing.size, easting.size))
+    return easting, northing, values
+
+
+def as_blocks(values, sizes):
+    """
+    Split the rows of a grid into blocks of the given sizes.
+    """
+    start = 0
+    for size in sizes:
+        yield values[start : start + size]
+        start += size
+
+
+def read_zarr(path, name):
+    """
+    Read an array of a Zarr directory without Zarr.
+    """
+    with open(path / name / ".zarray") as file:
+        metadata = json.load(file)
+    with open(path / name / ".zattrs") as file:
+        attrs = json.load(file)
+    shape, chunks = metadata["shape"], metadata["chunks"]
+    rows = np.full((-(-shape[0] // chunks[0]) * chunks[0], *shape[1:]), np.nan)
+    for chunk in sorted((path / name).glob("[0-9]*")):
+        data = chunk.read_bytes()
+        if metadata["compressor"] is not None:
+            data = zlib.decompress(data)
+        start = int(chunk.name.split(".")[0]) * chunks[0]
+        block = np.frombuffer(data, dtype=metadata["dtype"])
+        rows[start : start + chunks[0]] = block.reshape(chunks)
+    return rows[: shape[0]], metadata, attrs
+
+
+@pytest.mark.parametrize("blocks", (None, (4, 4, 3), (11,), (1,) * 11))
+@pytest.mark.parametrize("compress", (True, False))
+def test_write_grid_npy_npz(tmp_path, grid, blocks, compress):
+    """
+    Check the round trip through .npy and .npz files
+    """
+    easting, northing, values = grid
+    for extension in (".npy", ".npz"):
+        path = tmp_path / f"grid{extension}"
+        data = values if blocks is None else as_blocks(values, blocks)
+        write_grid(path, easting, northing, data, name="g_e", compress=compress)
+        if extension == ".npy":
+            npt.assert_equal(np.load(path), values)
+        else:
+            with np.load(path) as archive:
+                assert set(archive.files) == {"easting", "northing", "g_e"}
+                npt.assert_equal(archive["easting"], easting)
+                npt.assert_equal(archive["northing"], northing)
+                npt.assert_equal(archive["g_e"], values)
+
+
+@pytest.mark.parametrize("extension", (".h5", ".hdf5", ".nc"))
+@pytest.mark.parametrize("blocks", (None, (5, 6)))
+def test_write_grid_hdf5(tmp_path, grid, extension, blocks):
+    """
+    Check the round trip through HDF5 files and their dimension scales
+    """
+    h5py = pytest.importorskip("h5py")
+    easting, northing, values = grid
+    path = tmp_path / f"grid{extension}"
+    data = values if blocks is None else as_blocks(values, blocks)
+    write_grid(path, easting, northing, data, units="Eotvos", block_rows=4)
+    with h5py.File(path, "r") as file:
+        dataset = file["g_z"]
+        npt.assert_equal(dataset[()], values)
+        assert dataset.chunks == (4, easting.size)
+        assert dataset.attrs["units"] == "Eotvos"
+        npt.assert_equal(dataset.dims[0][0][()], northing)
+        npt.assert_equal(dataset.dims[1][0][()], easting)
+        assert dataset.dims[0][0].name == "/northing"
+
+
+@pytest.mark.parametrize("blocks", (None, (3, 3, 5), (1,) * 11))
+@pytest.mark.parametrize("compress", (True, False))
+def test_write_grid_zarr(tmp_path, grid, blocks, compress):
+    """
+    Check the round trip through a Zarr directory
+    """
+    easting, northing, values = grid
+    path = tmp_path / "grid.zarr"
+    data = values if blocks is None else as_blocks(values, blocks)
+    write_grid(path, easting, northing, data, block_rows=4, compress=compress)
+    result, metadata, attrs = read_zarr(path, "g_z")
+    npt.assert_equal(result, values)
+    assert metadata["chunks"] == [4, easting.size]
+    assert attrs == {"_ARRAY_DIMENSIONS": ["northing", "easting"], "units": "mGal"}
+    assert sorted(i.name for i in (path / "g_z").glob("[0-9]*")) == [
+        "0.0",
+        "1.0",
+        "2.0",
+    ]
+    npt.assert_equal(read_zarr(path, "easting")[0], easting)
+    npt.assert_equal(read_zarr(path, "northing")[0], northing)
+
+
+def test_write_grid_zarr_overwrite(tmp_path, grid):
+    """
+    Check that no chunk of an overwritten Zarr directory is left behind
+    """
+    easting, northing, values = grid
+    path = tmp_path / "grid.zarr"
+    write_grid(path, easting, northing, values, name="old", block_rows=2)
+    write_grid(path, easting[:3], northing[:4], values[:4, :3], block_rows=2)
+    assert sorted(i.name for i in path.iterdir()) == [
+        ".zattrs",
+        ".zgroup",
+        "easting",
+        "g_z",
+        "northing",
+    ]
+    assert sorted(i.name for i in (path / "g_z").glob("[0-9]*")) == ["0.0", "1.0"]
+    npt.assert_equal(read_zarr(path, "g_z")[0], values[:4, :3])
+    npt.assert_equal(read_zarr(path, "easting")[0], easting[:3])
+
+
+def test_write_grid_xarray(tmp_path, grid):
+    """
+    Check that xarray reads the coordinates of the Zarr directory
+    """
+    pytest.importorskip("zarr")
+    xr = pytest.importorskip("xarray")
+    easting, northing, values = grid
+    path = tmp_path / "grid.zarr"
+    write_grid(path, easting, northing, as_blocks(values, (6, 5)), block_rows=4)
+    with xr.open_zarr(path, consolidated=False) as dataset:
+        npt.assert_equal(dataset.g_z.values, values)
+        npt.assert_equal(dataset.easting.values, easting)
+        assert dataset.g_z.attrs["units"] == "mGal"
+
+
+def test_write_grid_invalid(tmp_path, grid):
+    """
+    Check errors raised with invalid arguments
+    """
+    easting, northing, values = grid
+    with pytest.raises(ValueError, match="Unsupported file extension"):
+        write_grid(tmp_path / "grid.txt", easting, northing, values)
+    with pytest.raises(ValueError, match="Invalid block_rows"):
+        write_grid(tmp_path / "grid.npy", easting, northing, values, block_rows=0)
+    with pytest.raises(ValueError, match="Invalid values"):
+        write_grid(tmp_path / "grid.npy", easting, northing, values.T)
+    with pytest.raises(ValueError, match="Invalid block"):
+        write_grid(tmp_path / "grid.npy", easting, northing, [values[:, :3]])
+    for blocks in ([values[:5], values[:5]], [values, values[:1]]):
+        with pytest.raises(ValueError, match="Invalid number of rows"):
+            write_grid(tmp_path / "grid.npz", easting, northing, iter(blocks))
+
+
+@pytest.mark.parametrize("extension", (".csv", ".txt", ".npz", ".h5", ".nc"))
+def test_write_sources(tmp_path, extension):
+    """
+    Check the round trip of point sources, with names that need quoting
+    """
+    if extension in (".h5", ".nc"):
+        h5py = pytest.importorskip("h5py")
+    names = ["plain", "a,b", 'say "hi"', "semi;colon", "  spaced", "tab\there"]
+    store = SourceStore()
+    store.extend_arrays(
+        names,
+        [0.1, -2.5, 1e10, 3.0, 4.0, 5.0],
+        [10.0, 1 / 3, 20.0, 30.0, 40.0, 50.0],
+        [100.0, -200.0, 300.5, 1e-3, 5.0, 6.0],
+        y=[1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+    )
+    store.extend_arrays(None, [7.0], [70.0], [700.0])
+    path = tmp_path / f"sources{extension}"
+    write_sources(path, store)
+    result, x, z, rho, bad_rows = read_sources(path)
+    npt.assert_equal(result, [*(i.strip() for i in names), "p7"])
+    npt.assert_equal(x, store.x)
+    npt.assert_equal(z, store.z)
+    npt.assert_equal(rho, store.rho)
+    assert bad_rows.size == 0
+    # The northing is written too
+    if extension == ".npz":
+        with np.load(path) as data:
+            npt.assert_equal(data["y"], store.y)
+    elif extension in (".h5", ".nc"):
+        with h5py.File(path, "r") as file:
+            npt.assert_equal(file["y"][()], store.y)
+    else:
+        lines = path.read_text().splitlines()
+        assert lines[0] == "name,x,y,z,rho"
+        assert lines[2] == '"a,b",-2.5,2.0,0.3333333333333333,-200.0'
+        assert lines[3] == '"say ""hi""",10000000000.0,3.0,20.0,300.5'
+
+
+def test_write_sources_blocks(tmp_path):
+    """
+    Check that CSV files written in several blocks keep every source
+    """
+    from ..export import _write_sources_csv
+
+    store = SourceStore()
+    store.extend_arrays(
+        [f"s,{i}" for i in range(10)], np.arange(10), np.ones(10), np.ones(10)
+    )
+    path = tmp_path / "sources.csv"
+    columns = {"name": store.names.astype(str), "x": store.x, "z": store.z}
+    _write_sources_csv(path, {**columns, "rho": store.rho}, block_size=3)
+    names, x, _, _, _ = read_sources(path)
+    npt.assert_equal(names, store.names)
+    npt.assert_equal(x, np.arange(10))
+
+
+def test_write_sources_invalid(tmp_path):
+    """
+    Check that unsupported formats are rejected
+    """
+    with pytest.raises(ValueError, match="Unsupported file extension"):
+        write_sources(tmp_path / "sources.xlsx", SourceStore())
@@ -0,0 +1,394 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Test the helpers for Tk applications that don't need a display.
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy.testing as npt
+import pytest
+
+from ..gui import (
+    BufferPool,
+    ComputeWorker,
+    FrameScheduler,
+    SourceList,
+    Superseded,
+    viewport_resolution,
+)
+from ..sources import SourceStore
+
+
+class FakeWidget:
+    """
+    Stand-in for a Tk widget that runs the ``after`` callbacks on demand.
+    """
+
+    def __init__(self):
+        self.callbacks = {}
+        self.delays = {}
+        self._ids = 0
+
+    def after(self, delay, callback, *args):
+        self._ids += 1
+        self.callbacks[self._ids] = (callback, args)
+        self.delays[self._ids] = delay
+        return self._ids
+
+    def after_cancel(self, identifier):
+        self.callbacks.pop(identifier, None)
+        self.delays.pop(identifier, None)
+
+    def run(self):
+        """
+        Run the callbacks scheduled so far (not the ones they schedule).
+        """
+        scheduled = list(self.callbacks)
+        for identifier in scheduled:
+            if identifier in self.callbacks:
+                callback, args = self.callbacks.pop(identifier)
+                del self.delays[identifier]
+                callback(*args)
+
+
+def wait_until(condition, timeout=5):
+    """
+    Wait until a condition is true or fail after a timeout.
+    """
+    start = time.perf_counter()
+    while not condition():
+        assert time.perf_counter() - start < timeout, "Timed out"
+        time.sleep(0.005)
+
+
+def test_buffer_pool_reuse():
+    """
+    Check that arrays given back are reused for the same shapes only
+    """
+    pool = BufferPool()
+    grid, profile = pool.take((3, 4), 5)
+    assert grid.shape == (3, 4) and profile.shape == (5,)
+    pool.give(grid, profile)
+    again = pool.take((3, 4), 5)
+    assert again[0] is grid and again[1] is profile
+    # Nothing left to reuse
+    assert pool.take((3, 4), 5)[0] is not grid
+    # Arrays with other shapes are dropped
+    pool.give(grid, profile)
+    other = pool.take((6, 2), 5)
+    assert other[0] is not grid and other[0].shape == (6, 2)
+    assert pool.take((3, 4), 5)[0] is not grid
+
+
+def test_compute_worker_results():
+    """
+    Check that results reach on_result when the widget polls
+    """
+    widget = FakeWidget()
+    results = []
+    worker = ComputeWorker(widget, lambda x: 2 * x, results.append)
+    worker.submit(21)
+    wait_until(lambda: not worker.busy)
+    assert not results
+    widget.run()
+    assert results == [42]
+    # The worker keeps polling
+    assert len(widget.callbacks) == 1
+
+
+def test_compute_worker_superseded():
+    """
+    Check that superseded requests stop early and their results are dropped
+    """
+    widget = FakeWidget()
+    started, release = threading.Event(), threading.Event()
+    results, computed = [], []
+
+    def compute(value, is_stale):
+        if value == "first":
+            started.set()
+            release.wait(timeout=5)
+            if is_stale():
+                raise Superseded()
+        computed.append(value)
+        return value
+
+    worker = ComputeWorker(widget, compute, results.append, pass_stale_check=True)
+    worker.submit("first")
+    started.wait(timeout=5)
+    worker.submit("second")
+    # Only the latest waiting request is computed
+    worker.submit("third")
+    release.set()
+    wait_until(lambda: not worker.busy)
+    widget.run()
+    assert computed == ["third"]
+    assert results == ["third"]
+
+
+def test_compute_worker_cancel():
+    """
+    Check that cancelling discards the result of the running request
+    """
+    widget = FakeWidget()
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def compute(value):
+        started.set()
+        release.wait(timeout=5)
+        return value
+
+    worker = ComputeWorker(widget, compute, results.append)
+    worker.submit(1)
+    started.wait(timeout=5)
+    worker.cancel()
+    release.set()
+    wait_until(lambda: not worker.busy)
+    widget.run()
+    assert not results
+
+
+def test_compute_worker_generator():
+    """
+    Check that partial results are delivered and superseded generators closed
+    """
+    widget = FakeWidget()
+    results = []
+    closed = threading.Event()
+    step = threading.Semaphore(0)
+
+    def compute(levels):
+        try:
+            for level in range(levels):
+                step.acquire(timeout=5)
+                yield level
+        finally:
+            closed.set()
+
+    worker = ComputeWorker(widget, compute, results.append)
+    worker.submit(3)
+    for _ in range(3):
+        step.release()
+    wait_until(lambda: not worker.busy)
+    widget.run()
+    assert results == [0, 1, 2]
+    # Supersede a generator after its first value
+    closed.clear()
+    worker.submit(10)
+    step.release()
+    wait_until(lambda: worker.running)
+    worker.cancel()
+    step.release()
+    assert closed.wait(timeout=5)
+    wait_until(lambda: not worker.busy)
+    widget.run()
+    assert results == [0, 1, 2]
+
+
+def test_compute_worker_errors():
+    """
+    Check that errors go to on_error or are raised on the polling thread
+    """
+
+    def compute(value):
+        raise ValueError(f"Bad value {value}")
+
+    widget = FakeWidget()
+    errors = []
+    worker = ComputeWorker(widget, compute, print, on_error=errors.append)
+    worker.submit(3)
+    wait_until(lambda: not worker.busy)
+    widget.run()
+    assert [str(i) for i in errors] == ["Bad value 3"]
+    widget = FakeWidget()
+    worker = ComputeWorker(widget, compute, print)
+    worker.submit(4)
+    wait_until(lambda: not worker.busy)
+    with pytest.raises(ValueError, match="Bad value 4"):
+        widget.run()
+    # Polling continues after the error
+    assert list(widget.delays.values()) == [worker.poll_interval]
+
+
+def test_frame_scheduler_coalesce():
+    """
+    Check that requests under the same key run once per frame, in order
+    """
+    widget = FakeWidget()
+    scheduler = FrameScheduler(widget, interval=16, order=("resize", "compute", "draw"))
+    calls = []
+    for size in range(5):
+        scheduler.request("resize", calls.append, ("resize", size))
+    scheduler.request("other", calls.append, ("other",))
+    scheduler.request("draw", calls.append, ("draw",))
+    scheduler.request("compute", calls.append, ("compute",))
+    # A single frame is scheduled for the whole burst
+    assert list(widget.delays.values()) == [16]
+    widget.run()
+    assert calls == [("resize", 4), ("compute",), ("draw",), ("other",)]
+    assert not widget.callbacks
+
+
+def test_frame_scheduler_requests_from_callbacks():
+    """
+    Check that keys that didn't run yet run on the same frame, others later
+    """
+    widget = FakeWidget()
+    scheduler = FrameScheduler(widget, order=("resize", "draw"))
+    calls = []
+
+    def resize():
+        calls.append("resize")
+        scheduler.request("draw", draw)
+
+    def draw():
+        calls.append("draw")
+        if calls.count("draw") == 1:
+            scheduler.request("draw", draw)
+
+    scheduler.request("resize", resize)
+    widget.run()
+    assert calls == ["resize", "draw"]
+    # The draw requested by the draw itself waits for the next frame
+    assert len(widget.callbacks) == 1
+    widget.run()
+    assert calls == ["resize", "draw", "draw"]
+    assert not widget.callbacks
+
+
+def test_frame_scheduler_defer_cancel_flush():
+    """
+    Check deferred calls, cancellations and flushes
+    """
+    widget = FakeWidget()
+    scheduler = FrameScheduler(widget)
+    calls = []
+    for size in range(3):
+        scheduler.defer("settle", 200, calls.append, size)
+    # Only the last deferral is kept
+    assert list(widget.delays.values()) == [200]
+    widget.run()
+    assert not calls
+    widget.run()
+    assert calls == [2]
+    # Cancel pending and deferred calls
+    scheduler.request("draw", calls.append, "draw")
+    scheduler.defer("settle", 200, calls.append, "settle")
+    scheduler.cancel("draw")
+    scheduler.cancel("settle")
+    widget.run()
+    widget.run()
+    assert calls == [2]
+    # Flush runs the pending calls right away and drops the scheduled frame
+    scheduler.request("draw", calls.append, "draw")
+    scheduler.flush()
+    assert calls == [2, "draw"]
+    assert not widget.callbacks
+
+
+def test_frame_scheduler_error():
+    """
+    Check that a failing callback doesn't stop later frames
+    """
+    widget = FakeWidget()
+    scheduler = FrameScheduler(widget, order=("compute", "draw"))
+    calls = []
+
+    def compute():
+        raise RuntimeError("Failed")
+
+    scheduler.request("compute", compute)
+    scheduler.request("draw", calls.append, "draw")
+    with pytest.raises(RuntimeError, match="Failed"):
+        widget.run()
+    # The draw that didn't run goes to the next frame
+    assert len(widget.callbacks) == 1
+    widget.run()
+    assert calls == ["draw"]
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    (
+        ("", None),
+        ("   ", None),
+        ("x>100", [2, 3, 4]),
+        ("x>=100", [1, 2, 3, 4]),
+        ("z=20", [0, 3]),
+        ("z==20 rho<0", [3]),
+        ("rho!=0", [0, 1, 3, 4]),
+        ("x<1e2", [0]),
+        ("x>-.5e1 x<150", [0, 1]),
+        ("DYKE", [1, 3]),
+        ("dyke x>150", [3]),
+        ("sill", []),
+        ("x>abc", []),
+        ("p5", [4]),
+        ("P", [0, 4]),
+    ),
+)
+def test_source_list_match(query, expected):
+    """
+    Check the parsing of the filter terms of the source list
+    """
+    store = SourceStore()
+    store.extend_arrays(
+        ["Sphere", "Dyke A", "Block", "dyke b"],
+        [0, 100, 150, 200],
+        [20, 10, 30, 20],
+        [500, 300, 0, -200],
+    )
+    # Sources without names get generated ones (p5)
+    store.extend_arrays(None, [300], [40], [100])
+    result = SourceList._match(SimpleNamespace(store=store), query)
+    if expected is None:
+        assert result is None
+    else:
+        npt.assert_equal(result, expected)
+
+
+@pytest.fixture(name="axes")
+def fixture_axes():
+    """
+    Axes of 200 x 100 pixels on a figure of 400 x 200 pixels
+    """
+    matplotlib = pytest.importorskip("matplotlib")
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    figure = plt.figure(figsize=(4, 2), dpi=100)
+    yield figure.add_axes((0.25, 0.25, 0.5, 0.5))
+    plt.close(figure)
+
+
+@pytest.mark.parametrize(
+    "max_size, min_size, expected",
+    (
+        (None, 16, (200, 100)),
+        (128, 16, (128, 100)),
+        (64, 16, (64, 64)),
+        (None, 150, (200, 150)),
+        (120, 150, (120, 120)),
+    ),
+)
+def test_viewport_resolution(axes, max_size, min_size, expected):
+    """
+    Check that the grid size follows the axes pixels within the limits
+    """
+    assert viewport_resolution(axes, max_size, min_size) == expected
+
+
+def test_viewport_resolution_dpi(axes):
+    """
+    Check that the DPI of the figure is accounted for
+    """
+    axes.figure.set_dpi(200)
+    assert viewport_resolution(axes) == (400, 200)
@@ -0,0 +1,97 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Test the hierarchical low-rank sensitivity matrix.
+"""
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from ..hmatrix import point_sensitivity_hmatrix
+from ..point import point_gravity
+from .utils import dense_sensitivity, relative_error
+
+
+@pytest.fixture(name="cartesian_model")
+def fixture_cartesian_model():
+    """
+    Scattered computation points above scattered point masses.
+    """
+    rng = np.random.default_rng(3)
+    coordinates = (
+        rng.uniform(-5e3, 5e3, 600),
+        rng.uniform(-5e3, 5e3, 600),
+        rng.uniform(0, 100, 600),
+    )
+    points = (
+        rng.uniform(-5e3, 5e3, 500),
+        rng.uniform(-5e3, 5e3, 500),
+        rng.uniform(-2e3, -500, 500),
+    )
+    return coordinates, points
+
+
+@pytest.mark.parametrize("field", ("potential", "g_z", "g_ez"))
+def test_hmatrix_matvec_rmatvec(cartesian_model, field):
+    """
+    Check the products of the H-matrix against the dense matrix
+    """
+    coordinates, points = cartesian_model
+    hmatrix = point_sensitivity_hmatrix(
+        coordinates, points, field, tolerance=1e-6, leaf_size=16
+    )
+    # Some blocks must be compressed for the test to be meaningful
+    assert hmatrix.ranks.size > 0
+    assert hmatrix.compression_ratio > 1
+    dense = dense_sensitivity(coordinates, points, field)
+    assert relative_error(hmatrix.todense(), dense) < 1e-5
+    rng = np.random.default_rng(0)
+    masses = rng.uniform(-1e9, 1e9, dense.shape[1])
+    residuals = rng.normal(size=dense.shape[0])
+    assert relative_error(hmatrix.matvec(masses), dense @ masses) < 1e-5
+    assert relative_error(hmatrix.rmatvec(residuals), dense.T @ residuals) < 1e-5
+    npt.assert_allclose(
+        hmatrix @ masses, point_gravity(coordinates, points, masses, field), rtol=1e-4
+    )
+
+
+def test_hmatrix_spherical_grid():
+    """
+    Check the H-matrix on 2-D grids of spherical coordinates
+    """
+    longitude, latitude = np.meshgrid(np.linspace(0, 20, 18), np.linspace(-10, 10, 10))
+    coordinates = (longitude, latitude, np.full_like(longitude, 6371e3))
+    longitude_p, latitude_p = np.meshgrid(np.linspace(1, 19, 12), np.linspace(-9, 9, 8))
+    points = (longitude_p, latitude_p, np.full_like(longitude_p, 6271e3))
+    hmatrix = point_sensitivity_hmatrix(
+        coordinates,
+        points,
+        "g_z",
+        coordinate_system="spherical",
+        tolerance=1e-8,
+        leaf_size=16,
+    )
+    assert hmatrix.shape == (longitude.size, longitude_p.size)
+    dense = dense_sensitivity(coordinates, points, "g_z", coordinate_system="spherical")
+    masses = np.random.default_rng(1).uniform(1e9, 1e10, longitude_p.size)
+    npt.assert_allclose(hmatrix.matvec(masses), dense @ masses, rtol=1e-6)
+    npt.assert_allclose(
+        hmatrix.rmatvec(np.ones(longitude.size)), dense.sum(axis=0), rtol=1e-6
+    )
+
+
+def test_hmatrix_invalid_vector(cartesian_model):
+    """
+    Check errors raised with vectors of the wrong size
+    """
+    coordinates, points = cartesian_model
+    hmatrix = point_sensitivity_hmatrix(coordinates, points, "g_z", leaf_size=16)
+    with pytest.raises(ValueError, match="mismatch the number of columns"):
+        hmatrix.matvec(np.ones(3))
+    with pytest.raises(ValueError, match="mismatch the number of rows"):
+        hmatrix.rmatvec(np.ones(3))
@@ -0,0 +1,120 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Test the Morton reordering of points.
+"""
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from ..ordering import (
+    DEFAULT_PERMUTATION_CACHE_BYTES,
+    clear_permutation_cache,
+    morton_codes,
+    morton_permutation,
+    permutation_cache_nbytes,
+    set_permutation_cache_size,
+)
+from ..point import point_gravity
+
+
+@pytest.fixture(name="empty_cache")
+def fixture_empty_cache():
+    """
+    Start from an empty permutation cache and restore its size afterwards
+    """
+    clear_permutation_cache()
+    yield
+    set_permutation_cache_size(DEFAULT_PERMUTATION_CACHE_BYTES)
+    clear_permutation_cache()
+
+
+def random_points(size, seed=0):
+    """
+    Build randomly scattered points.
+    """
+    rng = np.random.default_rng(seed)
+    return tuple(rng.uniform(-1e3, 1e3, size) for _ in range(3))
+
+
+def test_morton_codes_order():
+    """
+    Check that the Morton codes follow the Z-order curve on a 2 x 2 x 2 cube
+    """
+    easting, northing, upward = np.meshgrid([0, 1], [0, 1], [0, 1], indexing="ij")
+    codes = morton_codes((easting, northing, upward), bits=1)
+    expected = easting.ravel() + 2 * northing.ravel() + 4 * upward.ravel()
+    npt.assert_equal(codes, expected)
+
+
+def test_morton_codes_invalid_bits():
+    """
+    Check that the number of bits is validated
+    """
+    with pytest.raises(ValueError, match="Invalid bits"):
+        morton_codes(random_points(10), bits=22)
+
+
+@pytest.mark.parametrize("field", ("potential", "g_z", "g_ez"))
+@pytest.mark.usefixtures("empty_cache")
+def test_point_gravity_reorder(field):
+    """
+    Check that reordering the points along a Morton curve doesn't change the
+    result
+    """
+    coordinates = random_points((20, 30), seed=1)
+    coordinates = (*coordinates[:2], coordinates[2] + 2e3)
+    points = random_points(500, seed=2)
+    masses = np.random.default_rng(3).uniform(-1e10, 1e10, 500)
+    expected = point_gravity(coordinates, points, masses, field)
+    result = point_gravity(coordinates, points, masses, field, reorder=True)
+    assert result.shape == expected.shape
+    npt.assert_allclose(result, expected, rtol=1e-10)
+    # Second call goes through the cached permutations
+    assert permutation_cache_nbytes() > 0
+    result = point_gravity(coordinates, points, masses, field, reorder=True)
+    npt.assert_allclose(result, expected, rtol=1e-10)
+
+
+@pytest.mark.usefixtures("empty_cache")
+def test_morton_permutation_cache():
+    """
+    Check that permutations are cached and that the cache is limited by bytes
+    """
+    first = morton_permutation(random_points(100, seed=1))
+    assert morton_permutation(random_points(100, seed=1)) is first
+    assert permutation_cache_nbytes() == first.nbytes
+    # Room for two permutations only: the least recently used is evicted
+    set_permutation_cache_size(2 * first.nbytes)
+    second = morton_permutation(random_points(100, seed=2))
+    morton_permutation(random_points(100, seed=1))
+    morton_permutation(random_points(100, seed=3))
+    assert permutation_cache_nbytes() == 2 * first.nbytes
+    assert morton_permutation(random_points(100, seed=1)) is first
+    assert morton_permutation(random_points(100, seed=2)) is not second
+    # Permutations bigger than the cache aren't stored
+    clear_permutation_cache()
+    morton_permutation(random_points(1000))
+    assert permutation_cache_nbytes() == 0
+
+
+@pytest.mark.usefixtures("empty_cache")
+def test_morton_permutation_cache_disabled():
+    """
+    Check that a zero size disables and empties the cache
+    """
+    first = morton_permutation(random_points(100))
+    previous = set_permutation_cache_size(0)
+    assert previous == DEFAULT_PERMUTATION_CACHE_BYTES
+    assert permutation_cache_nbytes() == 0
+    permutation = morton_permutation(random_points(100))
+    npt.assert_equal(permutation, first)
+    assert permutation is not first
+    assert permutation_cache_nbytes() == 0
+    with pytest.raises(ValueError, match="Invalid max_bytes"):
+        set_permutation_cache_size(-1)
@@ -0,0 +1,143 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Test the forward modelling of point masses.
+"""
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from ..point import point_gravity, regular_longitude_grids
+
+
+def global_grid(nlon, latitudes, radius, first_longitude=0.0):
+    """
+    Build a global grid regular in longitude.
+    """
+    longitude = first_longitude + 360 / nlon * np.arange(nlon)
+    longitude, latitude = np.meshgrid(longitude, latitudes)
+    return longitude, latitude, np.full_like(longitude, radius)
+
+
+@pytest.mark.parametrize("field", ("potential", "g_z"))
+@pytest.mark.parametrize("first_longitude", (0.0, 7.5, -180.0))
+def test_point_gravity_fft_longitude(field, first_longitude):
+    """
+    Check the FFT path on global grids against the direct loop
+    """
+    nlon = 36
+    coordinates = global_grid(nlon, np.linspace(-80, 80, 9), 6371e3 + 10e3)
+    points = global_grid(nlon, np.linspace(-85, 85, 5), 6371e3 - 100e3, first_longitude)
+    masses = np.random.default_rng(0).uniform(-1e15, 1e15, points[0].shape)
+    assert regular_longitude_grids(coordinates, points, masses) is not None
+    result = point_gravity(
+        coordinates, points, masses, field, coordinate_system="spherical"
+    )
+    assert result.shape == coordinates[0].shape
+    # Flattened arrays don't go through the FFT path
+    flat = tuple(i.ravel() for i in coordinates)
+    flat_points = tuple(i.ravel() for i in points)
+    assert regular_longitude_grids(flat, flat_points, masses.ravel()) is None
+    expected = point_gravity(
+        flat, flat_points, masses.ravel(), field, coordinate_system="spherical"
+    )
+    npt.assert_allclose(
+        result.ravel(), expected, rtol=1e-9, atol=1e-12 * np.abs(expected).max()
+    )
+
+
+def test_regular_longitude_grids_not_regular():
+    """
+    Check that grids that aren't regular and global aren't detected
+    """
+    coordinates = global_grid(36, [0.0, 10.0], 6371e3)
+    points = global_grid(36, [-10.0], 6300e3)
+    masses = np.ones(36)
+    assert regular_longitude_grids(coordinates, points, masses) is not None
+    # Different number of longitudes
+    assert (
+        regular_longitude_grids(coordinates, global_grid(18, [0.0], 6e6), masses)
+        is None
+    )
+    # Not covering the whole globe
+    regional = tuple(i[:, :30] for i in coordinates)
+    assert regular_longitude_grids(regional, points, masses) is None
+    # Latitude changing along a row
+    tilted = (coordinates[0], coordinates[1] + np.arange(36) * 0.1, coordinates[2])
+    assert regular_longitude_grids(tilted, points, masses) is None
+
+
+@pytest.fixture(name="model")
+def fixture_model():
+    """
+    Computation points above a set of random point masses
+    """
+    rng = np.random.default_rng(0)
+    easting, northing = np.meshgrid(np.linspace(-1e3, 1e3, 15), np.linspace(0, 2e3, 9))
+    coordinates = (easting, northing, np.full_like(easting, 50.0))
+    points = tuple(rng.uniform(-1e3, 1e3, 200) for _ in range(3))
+    points = (points[0], points[1] + 1e3, points[2] - 1.5e3)
+    masses = rng.uniform(-1e9, 1e9, 200)
+    return coordinates, points, masses
+
+
+@pytest.mark.parametrize("field", ("potential", "g_z", "g_ne"))
+def test_point_gravity_out(model, field):
+    """
+    Check that the result is written in and returned as the out array
+    """
+    coordinates, points, masses = model
+    expected = point_gravity(coordinates, points, masses, field)
+    out = np.full(coordinates[0].shape, np.nan)
+    result = point_gravity(coordinates, points, masses, field, out=out)
+    assert result is out
+    npt.assert_allclose(out, expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize("reorder", (False, True))
+def test_point_gravity_accumulate(model, reorder):
+    """
+    Check that accumulating groups of sources adds up to the full model
+    """
+    coordinates, points, masses = model
+    expected = point_gravity(coordinates, points, masses, "g_z")
+    out = np.zeros(coordinates[0].shape)
+    for group in np.array_split(np.arange(masses.size), 3):
+        point_gravity(
+            coordinates,
+            tuple(i[group] for i in points),
+            masses[group],
+            "g_z",
+            out=out,
+            accumulate=True,
+            reorder=reorder,
+        )
+    npt.assert_allclose(out, expected, rtol=1e-10)
+    # Without accumulate the previous content of out is discarded
+    point_gravity(coordinates, points, masses, "g_z", out=out, reorder=reorder)
+    npt.assert_allclose(out, expected, rtol=1e-10)
+
+
+def test_point_gravity_invalid_out(model):
+    """
+    Check that invalid out arrays are rejected
+    """
+    coordinates, points, masses = model
+    shape = coordinates[0].shape
+    with pytest.raises(ValueError, match="requires an 'out' array"):
+        point_gravity(coordinates, points, masses, "g_z", accumulate=True)
+    with pytest.raises(TypeError, match="Invalid out of type"):
+        point_gravity(coordinates, points, masses, "g_z", out=np.zeros(shape).tolist())
+    with pytest.raises(ValueError, match="Invalid out with shape"):
+        point_gravity(coordinates, points, masses, "g_z", out=np.zeros(shape[::-1]))
+    with pytest.raises(ValueError, match="Invalid out with dtype"):
+        point_gravity(
+            coordinates, points, masses, "g_z", out=np.zeros(shape, dtype="float32")
+        )
+    with pytest.raises(ValueError, match="writeable C-contiguous"):
+        point_gravity(coordinates, points, masses, "g_z", out=np.zeros(shape[::-1]).T)
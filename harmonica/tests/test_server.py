@@ -0,0 +1,207 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Test the local forward modelling server.
+"""
+
+import io
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from ..point import dispatcher, point_gravity
+from ..server import ForwardModellingServer, request_point_gravity
+
+
+@pytest.fixture(name="server_url")
+def fixture_server_url():
+    """
+    Run a server on a free port of localhost.
+
+    The warmup is limited to a single field to keep the tests fast, but it
+    still starts the parallel runtime of Numba on the main thread: starting it
+    from the batching thread hangs the interpreter on exit with the TBB
+    threading layer.
+    """
+    server = ForwardModellingServer(
+        ("127.0.0.1", 0),
+        batch_window=0.2,
+        warmup=(("cartesian", "g_z"),),
+        warmup_dtypes=("float64",),
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    yield f"http://{host}:{port}"
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture(name="sources")
+def fixture_sources():
+    """
+    A few point masses below the origin.
+    """
+    points = ([0.0, 100.0, -50.0], [0.0, 20.0, 80.0], [-100.0, -150.0, -80.0])
+    masses = [1e9, 2e9, -5e8]
+    return points, masses
+
+
+def post(url, body, query="field=g_z"):
+    """
+    Send a raw request to the server and return the status and the body.
+    """
+    request = urllib.request.Request(
+        f"{url}/point_gravity?{query}", data=body, method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, error.read()
+
+
+def npz(**arrays):
+    """
+    Write arrays to the body of a request.
+    """
+    body = io.BytesIO()
+    np.savez(body, **arrays)
+    return body.getvalue()
+
+
+@pytest.mark.parametrize("field", ("potential", "g_z", "g_nz"))
+def test_server_round_trip(server_url, sources, field):
+    """
+    Check that the server returns the same field as point_gravity
+    """
+    points, masses = sources
+    easting, northing = np.meshgrid(
+        np.linspace(-200, 200, 7), np.linspace(-100, 100, 5)
+    )
+    coordinates = (easting, northing, np.full_like(easting, 10.0))
+    result = request_point_gravity(server_url, coordinates, points, masses, field)
+    assert result.shape == easting.shape
+    npt.assert_allclose(
+        result, point_gravity(coordinates, points, masses, field), rtol=1e-12
+    )
+
+
+def test_server_batch(server_url, sources):
+    """
+    Check concurrent requests sharing the same sources
+    """
+    points, masses = sources
+    coordinates = [
+        (
+            np.linspace(-100, 100, 10 + i),
+            np.full(10 + i, float(i)),
+            np.full(10 + i, 5.0),
+        )
+        for i in range(6)
+    ]
+    results = [None] * len(coordinates)
+    # Release every request at once so they arrive within the batch window
+    barrier = threading.Barrier(len(coordinates))
+
+    def send(index):
+        barrier.wait()
+        results[index] = request_point_gravity(
+            server_url, coordinates[index], points, masses, "g_z"
+        )
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for coords, result in zip(coordinates, results):
+        npt.assert_allclose(result, point_gravity(coords, points, masses, "g_z"))
+    with urllib.request.urlopen(f"{server_url}/metrics") as response:
+        metrics = json.loads(response.read())
+    assert metrics["requests"] == 6
+    assert metrics["errors"] == 0
+    assert metrics["batches"] < 6
+    assert metrics["mean_batch_size"] > 1
+
+
+@pytest.mark.parametrize(
+    "arrays, query, message",
+    (
+        ({"coordinates": np.zeros((2, 4))}, "field=g_z", b"Invalid coordinates"),
+        ({"points": np.zeros((2, 3))}, "field=g_z", b"Invalid points"),
+        ({"masses": np.ones(2)}, "field=g_z", b"mismatch the number of points"),
+        ({}, "field=g_zzz", b"not recognized"),
+        ({}, "field=g_e&coordinate_system=spherical", b"not implemented"),
+        ({}, "coordinate_system=cartesian", b"Missing 'field'"),
+    ),
+)
+def test_server_malformed_request(server_url, sources, arrays, query, message):
+    """
+    Check that malformed requests are rejected without affecting the others
+    """
+    points, masses = sources
+    coordinates = (np.linspace(-100, 100, 4), np.zeros(4), np.full(4, 5.0))
+    valid = {
+        "coordinates": np.stack(coordinates),
+        "points": np.stack(points),
+        "masses": np.asarray(masses),
+    }
+    responses = {}
+
+    def send(name, body, query):
+        responses[name] = post(server_url, body, query)
+
+    # Send a valid request with the same sources at the same time, so both
+    # would end up on the same batch
+    threads = [
+        threading.Thread(target=send, args=("bad", npz(**{**valid, **arrays}), query)),
+        threading.Thread(target=send, args=("good", npz(**valid), "field=g_z")),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    status, body = responses["bad"]
+    assert status == 400
+    assert message in body
+    status, body = responses["good"]
+    assert status == 200
+    npt.assert_allclose(
+        np.load(io.BytesIO(body)), point_gravity(coordinates, points, masses, "g_z")
+    )
+
+
+def test_server_warmup():
+    """
+    Check that the warmup compiles every loop and result type of a field
+    """
+    server = ForwardModellingServer(
+        ("127.0.0.1", 0),
+        warmup=(("spherical", "potential"),),
+        warmup_dtypes=("float64", "float32"),
+    )
+    server.server_close()
+    for parallel_over in ("stations", "sources"):
+        forward = dispatcher("spherical", True, "potential", parallel_over)
+        outputs = {str(signature[-1].dtype) for signature in forward.signatures}
+        assert outputs == {"float64", "float32"}
+
+
+def test_server_not_found(server_url):
+    """
+    Check unknown paths
+    """
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(f"{server_url}/unknown")
+    assert error.value.code == 404
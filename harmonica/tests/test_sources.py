@@ -0,0 +1,365 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Test the columnar storage and the reading of point sources.
+"""
+
+import sys
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from ..sources import SourceHistory, SourceStore, read_sources
+
+
+@pytest.mark.parametrize(
+    "text",
+    ("", "a", "Body", "body1", "DY", "pt", "Pt1", "t10", "t0", "05", "7", "x", "1x"),
+)
+def test_names_containing(text):
+    """
+    Check the name search against comparing every name
+    """
+    store = SourceStore(prefix="Pt")
+    names = [f"Body{i % 13}" for i in range(200)] + ["Dyke", "dyke 05"]
+    store.extend_arrays(names, np.arange(202), np.ones(202), np.ones(202))
+    store.extend_arrays(None, np.arange(150), np.ones(150), np.ones(150))
+    expected = [text.lower() in name.lower() for name in store.names.tolist()]
+    npt.assert_equal(store.names_containing(text), expected)
+    # Names added after a search are found too
+    store.append(("New body 7", 0, 1, 1))
+    assert store.names_containing(text)[-1] == (text.lower() in "new body 7")
+
+
+def make_store(size=5):
+    """
+    Build a store with a few named sources.
+    """
+    store = SourceStore(capacity=size)
+    store.extend_arrays(
+        [f"s{i}" for i in range(size)],
+        np.arange(size) * 10.0,
+        np.arange(size) + 1.0,
+        np.full(size, 100.0),
+        y=np.arange(size) * -1.0,
+    )
+    return store
+
+
+def as_list(store):
+    """
+    Return the sources of a store as tuples, with their northing.
+    """
+    return [(*source, y) for source, y in zip(store, store.y.tolist())]
+
+
+@pytest.mark.parametrize(
+    "change",
+    (
+        lambda store: store.__setitem__(1, ("new", -1, 2, 3)),
+        lambda store: store.pop(0),
+        lambda store: store.pop(),
+        lambda store: store.clear(),
+        lambda store: store.extend_arrays(["a", "b"], [1, 2], [3, 4], [5, 6]),
+        lambda store: store.extend_arrays(None, [1], [3], [5], y=[7]),
+        lambda store: store.append(("a", 1, 2, 3)),
+        lambda store: store.update([0, 2], names="moved", x=0, y=9),
+        lambda store: store.delete(slice(1, 3)),
+    ),
+)
+def test_source_store_copy_isolation(change):
+    """
+    Check that changing a store or its copy doesn't change the other
+    """
+    store = make_store()
+    expected = as_list(store)
+    # Change the copy
+    snapshot = store.copy()
+    change(snapshot)
+    assert as_list(store) == expected
+    changed = as_list(snapshot)
+    # Change the store
+    snapshot = store.copy()
+    change(store)
+    assert as_list(snapshot) == expected
+    assert as_list(store) == changed
+    # Later changes to the store don't reach the copy either
+    store.append(("later", 1, 2, 3))
+    store.update(slice(None), rho=-1)
+    assert as_list(snapshot) == expected
+
+
+def test_source_store_read_only_columns():
+    """
+    Check that the columns can't be changed through the arrays
+    """
+    store = make_store()
+    snapshot = store.copy()
+    for column in (store.x, store.y, store.z, store.rho, snapshot.x):
+        with pytest.raises(ValueError):
+            column[0] = 0
+    assert store.x[0] == snapshot.x[0] == 0
+
+
+def test_source_history_undo_redo():
+    """
+    Check that undo and redo walk the recorded states in order
+    """
+    store = make_store(3)
+    history = SourceHistory(store)
+    assert not history.undo() and not history.redo()
+    states = [as_list(store)]
+    for index in range(3):
+        history.record()
+        store[index] = (f"edit{index}", index, 1, 1)
+        states.append(as_list(store))
+    for state in reversed(states[:-1]):
+        assert history.undo()
+        assert as_list(store) == state
+    assert not history.can_undo and not history.undo()
+    for state in states[1:]:
+        assert history.redo()
+        assert as_list(store) == state
+    assert not history.can_redo and not history.redo()
+    # A new change after undoing discards the states that could be redone
+    history.undo()
+    history.undo()
+    history.record()
+    store.append(("new", 0, 1, 1))
+    assert not history.can_redo and not history.redo()
+    assert history.undo()
+    assert as_list(store) == states[1]
+    assert history.undo()
+    assert as_list(store) == states[0]
+    assert not history.undo()
+    history.clear()
+    assert not history.can_undo and not history.can_redo
+
+
+def test_source_history_limit():
+    """
+    Check that only the last limit changes can be undone
+    """
+    store = make_store(3)
+    history = SourceHistory(store, limit=2)
+    for index in range(4):
+        history.record()
+        store.append((f"new{index}", index, 1, 1))
+    assert [history.undo() for _ in range(3)] == [True, True, False]
+    assert len(store) == 5
+
+
+def test_source_history_max_bytes():
+    """
+    Check that the oldest states are dropped beyond max_bytes
+    """
+    store = make_store(50)
+    state_bytes = store._codes.nbytes + store._values.nbytes
+    history = SourceHistory(store, max_bytes=2.5 * state_bytes)
+    sizes = []
+    for _ in range(5):
+        history.record()
+        # Recording doesn't copy the arrays until the store changes
+        sizes.append(history.nbytes)
+        store.update([0], rho=len(sizes))
+    assert sizes == [state_bytes, 2 * state_bytes] + [2 * state_bytes] * 3
+    assert history.nbytes == 2 * state_bytes
+    assert [history.undo() for _ in range(3)] == [True, True, False]
+    npt.assert_equal(store.rho[0], 3)
+    # The last state is kept even if it takes more than max_bytes
+    history = SourceHistory(store, max_bytes=1)
+    for _ in range(3):
+        history.record()
+        store.update([0], rho=0)
+    assert history.undo()
+    assert not history.undo()
+
+
+def write_text(tmp_path, text, name="sources.csv"):
+    """
+    Write a catalogue to a text file and return its path.
+    """
+    path = tmp_path / name
+    path.write_text(text)
+    return path
+
+
+@pytest.mark.parametrize(
+    "text",
+    (
+        "name,x,z,rho\nA,1.5,10,100\nB,2.5,20,-50\n",
+        "Label; Easting; Depth; Density\nA; 1.5; 10; 100\n\nB; 2.5; 20; -50\n",
+        "id\tlon\tz\tdens\nA\t1.5\t10\t100\nB\t2.5\t20\t-50\n",
+        "rho,name,depth,x\n100,A,10,1.5\n-50,B,20,2.5\n",
+        "A 1.5 10 100\nB   2.5 20 -50\n",
+        "A,1.5,10,100\nB,2.5,20,-50\n",
+    ),
+)
+def test_read_sources_header_and_aliases(tmp_path, text):
+    """
+    Check that columns are found by their names or by position
+    """
+    names, x, z, rho, bad_rows = read_sources(write_text(tmp_path, text))
+    npt.assert_equal(names, ["A", "B"])
+    npt.assert_allclose(x, [1.5, 2.5])
+    npt.assert_allclose(z, [10, 20])
+    npt.assert_allclose(rho, [100, -50])
+    assert bad_rows.size == 0
+
+
+@pytest.mark.parametrize("header", ("", "x,z,rho\n"))
+def test_read_sources_without_names(tmp_path, header):
+    """
+    Check catalogues with three columns, with and without a header
+    """
+    path = write_text(tmp_path, header + "1,10,100\n2,20,200\n")
+    names, x, z, rho, bad_rows = read_sources(path)
+    assert names is None
+    npt.assert_allclose(x, [1, 2])
+    npt.assert_allclose(z, [10, 20])
+    npt.assert_allclose(rho, [100, 200])
+    assert bad_rows.size == 0
+
+
+@pytest.mark.parametrize("label", ("upward", "Height", "elevation"))
+def test_read_sources_upward(tmp_path, label):
+    """
+    Check that vertical columns positive upwards are turned into depths
+    """
+    path = write_text(tmp_path, f"x,{label},rho\n1,-10,100\n2,-20,200\n3,5,300\n")
+    _, x, z, rho, bad_rows = read_sources(path)
+    npt.assert_allclose(x, [1, 2])
+    npt.assert_allclose(z, [10, 20])
+    npt.assert_allclose(rho, [100, 200])
+    npt.assert_equal(bad_rows, [3])
+    # A depth column takes precedence
+    path = write_text(tmp_path, f"x,{label},depth,rho\n1,-10,30,100\n")
+    npt.assert_allclose(read_sources(path)[2], [30])
+
+
+def test_read_sources_bad_rows(tmp_path):
+    """
+    Check that invalid rows are rejected and reported together
+    """
+    text = (
+        "name,x,z,rho\n"
+        "A,1,10,100\n"
+        "B,abc,10,100\n"
+        "C,3,-5,100\n"
+        "\n"
+        "D,4,10,0\n"
+        "E,5,nan,100\n"
+        "F,6,inf,100\n"
+        "G,7,70,700\n"
+    )
+    names, x, z, rho, bad_rows = read_sources(write_text(tmp_path, text))
+    npt.assert_equal(names, ["A", "G"])
+    npt.assert_allclose(x, [1, 7])
+    npt.assert_equal(bad_rows, [2, 3, 4, 5, 6])
+
+
+@pytest.mark.parametrize("header", ("", "name,x,z,rho\n"))
+def test_read_sources_ragged_rows(tmp_path, header):
+    """
+    Check that rows with a different number of fields are rejected
+    """
+    text = header + 'A,1,10,100\nB,2,20,200,extra\nC,3\n"D, quoted",4,40,400\n'
+    names, x, z, rho, bad_rows = read_sources(write_text(tmp_path, text))
+    npt.assert_equal(names, ["A", "D, quoted"])
+    npt.assert_allclose(x, [1, 4])
+    npt.assert_allclose(z, [10, 40])
+    npt.assert_allclose(rho, [100, 400])
+    npt.assert_equal(bad_rows, [2, 3])
+    # Whitespace separated files
+    path = write_text(tmp_path, "1 10 100\n2 20 200 9\n3 30 300\n", "sources.txt")
+    _, x, _, _, bad_rows = read_sources(path)
+    npt.assert_allclose(x, [1, 3])
+    npt.assert_equal(bad_rows, [2])
+
+
+def test_read_sources_ragged_rows_without_pandas(tmp_path, monkeypatch):
+    """
+    Check the numpy.loadtxt path with well formed and ragged rows
+    """
+    monkeypatch.setitem(sys.modules, "pandas", None)
+    path = write_text(tmp_path, "name,x,z,rho\nA,1,10,100\nB,x,20,200\n")
+    names, x, _, _, bad_rows = read_sources(path)
+    npt.assert_equal(names, ["A"])
+    npt.assert_allclose(x, [1])
+    npt.assert_equal(bad_rows, [2])
+    path = write_text(tmp_path, "name,x,z,rho\nA,1,10,100\nB,2,20,200,9\nC,3,30,300\n")
+    names, x, _, _, bad_rows = read_sources(path)
+    npt.assert_equal(names, ["A", "C"])
+    npt.assert_equal(bad_rows, [2])
+
+
+def test_read_sources_npz(tmp_path):
+    """
+    Check catalogues stored as named arrays in a .npz file
+    """
+    path = tmp_path / "sources.npz"
+    np.savez(
+        path,
+        name=np.array(["A", "B", "C"]),
+        easting=[1.0, 2.0, 3.0],
+        depth=[10.0, 0.0, 30.0],
+        density=[100.0, 200.0, 300.0],
+        extra=np.zeros((3, 2)),
+    )
+    names, x, z, rho, bad_rows = read_sources(path)
+    npt.assert_equal(names, ["A", "C"])
+    npt.assert_allclose(x, [1, 3])
+    npt.assert_allclose(z, [10, 30])
+    npt.assert_allclose(rho, [100, 300])
+    npt.assert_equal(bad_rows, [2])
+
+
+def test_read_sources_hdf5(tmp_path):
+    """
+    Check catalogues stored as datasets in an HDF5 file
+    """
+    h5py = pytest.importorskip("h5py")
+    path = tmp_path / "sources.h5"
+    with h5py.File(path, "w") as file:
+        file.create_dataset("name", data=["A", "B"], dtype=h5py.string_dtype())
+        file.create_dataset("x", data=[1.0, 2.0])
+        file.create_dataset("z", data=[10.0, 20.0])
+        file.create_dataset("rho", data=[100.0, 200.0])
+    names, x, z, rho, bad_rows = read_sources(path)
+    npt.assert_equal(names, ["A", "B"])
+    npt.assert_allclose(z, [10, 20])
+    assert bad_rows.size == 0
+
+
+def test_read_sources_excel(tmp_path):
+    """
+    Check catalogues stored on a sheet of an Excel file
+    """
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("openpyxl")
+    path = tmp_path / "sources.xlsx"
+    frame = pd.DataFrame(
+        {"Name": ["A", "B"], "X": [1.0, 2.0], "Depth": [10.0, -1.0], "Rho": [1, 2]}
+    )
+    with pd.ExcelWriter(path) as writer:
+        frame.iloc[:0].to_excel(writer, sheet_name="empty", index=False)
+        frame.to_excel(writer, sheet_name="sources", index=False)
+    names, x, z, rho, bad_rows = read_sources(path, sheet="sources")
+    npt.assert_equal(names, ["A"])
+    npt.assert_allclose(x, [1])
+    npt.assert_equal(bad_rows, [2])
+
+
+def test_read_sources_invalid(tmp_path):
+    """
+    Check errors raised with files that can't hold sources
+    """
+    with pytest.raises(ValueError, match="No data found"):
+        read_sources(write_text(tmp_path, "\n\n"))
+    with pytest.raises(ValueError, match="Invalid number of columns"):
+        read_sources(write_text(tmp_path, "1,2\n3,4\n"))
@@ -0,0 +1,172 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Test the forward modelling of point masses streamed from files.
+"""
+
+import time
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from ..point import point_gravity
+from ..streaming import (
+    CARTESIAN_COLUMNS,
+    _prefetch,
+    point_gravity_streaming,
+    read_source_chunks,
+)
+
+
+@pytest.fixture(name="sources")
+def fixture_sources():
+    """
+    Random point masses given as a dictionary of columns.
+    """
+    rng = np.random.default_rng(5)
+    size = 2500
+    return {
+        "easting": rng.uniform(-1e3, 1e3, size),
+        "northing": rng.uniform(-1e3, 1e3, size),
+        "upward": rng.uniform(-500, -50, size),
+        "mass": rng.uniform(-1e8, 1e8, size),
+    }
+
+
+@pytest.fixture(name="coordinates")
+def fixture_coordinates():
+    """
+    Grid of computation points above the point masses.
+    """
+    easting, northing = np.meshgrid(
+        np.linspace(-1e3, 1e3, 9), np.linspace(-1e3, 1e3, 7)
+    )
+    return easting, northing, np.full_like(easting, 20.0)
+
+
+def write_sources(path, sources):
+    """
+    Write the columns of the point masses to a file chosen by its extension.
+    """
+    extension = path.suffix
+    if extension == ".npz":
+        np.savez_compressed(path, **sources)
+    elif extension == ".h5":
+        h5py = pytest.importorskip("h5py")
+        with h5py.File(path, "w") as file:
+            for name, array in sources.items():
+                file.create_dataset(name, data=array)
+    else:
+        pyarrow = pytest.importorskip("pyarrow")
+        import pyarrow.parquet
+
+        pyarrow.parquet.write_table(pyarrow.table(sources), path)
+
+
+@pytest.mark.parametrize("extension", (".npz", ".h5", ".parquet"))
+def test_read_source_chunks(tmp_path, sources, extension):
+    """
+    Check that the chunks put together give back the point masses
+    """
+    path = tmp_path / f"sources{extension}"
+    write_sources(path, sources)
+    chunks = list(read_source_chunks(path, chunk_size=1000))
+    assert [chunk[0].size for chunk in chunks] == [1000, 1000, 500]
+    for name, column in zip(CARTESIAN_COLUMNS, zip(*chunks)):
+        npt.assert_array_equal(np.hstack(column), sources[name])
+
+
+@pytest.mark.parametrize("extension", (".npz", ".h5", ".parquet"))
+@pytest.mark.parametrize("field", ("potential", "g_z", "g_ne"))
+def test_point_gravity_streaming(tmp_path, sources, coordinates, extension, field):
+    """
+    Check that streaming the point masses matches the in-memory forward model
+    """
+    path = tmp_path / f"sources{extension}"
+    write_sources(path, sources)
+    result = point_gravity_streaming(
+        coordinates, read_source_chunks(path, chunk_size=700), field
+    )
+    points = tuple(sources[name] for name in CARTESIAN_COLUMNS[:3])
+    expected = point_gravity(coordinates, points, sources["mass"], field)
+    assert result.shape == coordinates[0].shape
+    npt.assert_allclose(
+        result, expected, rtol=1e-10, atol=1e-14 * np.abs(expected).max()
+    )
+
+
+def test_point_gravity_streaming_spherical():
+    """
+    Check streaming point masses in spherical coordinates
+    """
+    rng = np.random.default_rng(6)
+    points = (
+        rng.uniform(-10, 10, 600),
+        rng.uniform(-10, 10, 600),
+        rng.uniform(6.2e6, 6.3e6, 600),
+    )
+    masses = rng.uniform(1e12, 1e13, 600)
+    coordinates = (np.linspace(-5, 5, 11), np.zeros(11), np.full(11, 6.38e6))
+    chunks = (
+        tuple(i[start : start + 250] for i in (*points, masses))
+        for start in range(0, 600, 250)
+    )
+    result = point_gravity_streaming(
+        coordinates, chunks, "g_z", coordinate_system="spherical", prefetch=2
+    )
+    npt.assert_allclose(
+        result,
+        point_gravity(
+            coordinates, points, masses, "g_z", coordinate_system="spherical"
+        ),
+        rtol=1e-10,
+    )
+
+
+def test_point_gravity_streaming_reader_error(coordinates):
+    """
+    Check that errors raised while reading the chunks reach the caller
+    """
+
+    def chunks():
+        yield (np.zeros(3), np.zeros(3), np.full(3, -10.0), np.ones(3))
+        raise OSError("Broken file")
+
+    with pytest.raises(OSError, match="Broken file"):
+        point_gravity_streaming(coordinates, chunks(), "g_z")
+
+
+@pytest.mark.parametrize("prefetch", (1, 3))
+def test_prefetch_chunks_in_memory(prefetch):
+    """
+    Check that the reader never gets more than prefetch chunks ahead
+    """
+    read = []
+
+    def chunks():
+        for i in range(8):
+            read.append(i)
+            yield (np.zeros(2), np.zeros(2), np.full(2, -10.0), np.full(2, i))
+
+    held = []
+    for index, chunk in enumerate(_prefetch(chunks(), prefetch)):
+        # Give the reader time to read as far ahead as it can
+        time.sleep(0.05)
+        held.append(len(read) - index)
+        assert chunk[3][0] == index
+    assert max(held) == prefetch + 1
+
+
+def test_read_source_chunks_invalid(tmp_path):
+    """
+    Check errors raised with unsupported files
+    """
+    with pytest.raises(ValueError, match="Unsupported file extension"):
+        read_source_chunks(tmp_path / "sources.csv")
+    with pytest.raises(ValueError, match="Invalid prefetch"):
+        point_gravity_streaming(([0.0], [0.0], [0.0]), [], "g_z", prefetch=0)
@@ -0,0 +1,158 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Test the incremental updates of the grids of point masses.
+"""
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from ..superposition import FieldLayerCache, gravity_grid, sample_polyline
+
+
+@pytest.fixture(name="grid")
+def fixture_grid():
+    """
+    Grid coordinates and a profile across it
+    """
+    easting = np.linspace(-500, 500, 41)
+    northing = np.linspace(-300, 300, 25)
+    profile = sample_polyline([-500, 0, 500], [-300, 100, 300], 64)[:2]
+    return easting, northing, profile
+
+
+def random_sources(size, seed=0):
+    """
+    Build a list of (easting, northing, depth, mass) point masses.
+    """
+    rng = np.random.default_rng(seed)
+    return list(
+        zip(
+            rng.uniform(-400, 400, size).tolist(),
+            rng.uniform(-200, 200, size).tolist(),
+            rng.uniform(20, 200, size).tolist(),
+            rng.uniform(-1e9, 1e9, size).tolist(),
+        )
+    )
+
+
+def as_columns(sources):
+    """
+    Convert a list of point masses into the columns used by gravity_grid.
+    """
+    return tuple(np.array(i, dtype=np.float64) for i in zip(*sources))
+
+
+def check_against_rebuild(cache, grid, sources):
+    """
+    Check the incremental total against a full evaluation of the sources.
+    """
+    easting, northing, profile = grid
+    result, values = cache.total(easting, northing, as_columns(sources), profile)
+    expected, expected_values = gravity_grid(
+        easting, northing, as_columns(sources), profile=profile
+    )
+    scale = np.abs(expected).max()
+    npt.assert_allclose(result, expected, rtol=0, atol=1e-10 * scale)
+    if profile is None:
+        assert values is None
+    else:
+        npt.assert_allclose(values, expected_values, rtol=0, atol=1e-10 * scale)
+
+
+def test_field_layer_cache_add_edit_delete(grid):
+    """
+    Check that incremental additions, edits and deletions match a rebuild
+    """
+    cache = FieldLayerCache(parallel=False)
+    sources = random_sources(20)
+    check_against_rebuild(cache, grid, sources)
+    assert cache.stats["rebuilds"] == 1
+    # Add a point mass
+    sources.append(random_sources(1, seed=1)[0])
+    assert cache.pending(grid[0], grid[1], as_columns(sources), grid[2]) == 1
+    check_against_rebuild(cache, grid, sources)
+    # Edit the mass of a point mass: remove the old layer and add the new one
+    easting, northing, depth, mass = sources[3]
+    sources[3] = (easting, northing, depth, 2 * mass)
+    check_against_rebuild(cache, grid, sources)
+    # Move a point mass
+    sources[7] = (sources[7][0] + 10, *sources[7][1:])
+    check_against_rebuild(cache, grid, sources)
+    # Delete a point mass
+    deleted = sources.pop(0)
+    check_against_rebuild(cache, grid, sources)
+    assert cache.stats["rebuilds"] == 1
+    # Undoing the deletion reuses the cached layer
+    hits = cache.stats["hits"]
+    sources.insert(0, deleted)
+    assert cache.pending(grid[0], grid[1], as_columns(sources), grid[2]) == 0
+    check_against_rebuild(cache, grid, sources)
+    assert cache.stats["hits"] == hits + 1
+    assert cache.stats["rebuilds"] == 1
+
+
+def test_field_layer_cache_duplicates(grid):
+    """
+    Check that repeated point masses are added and removed as many times
+    """
+    cache = FieldLayerCache(parallel=False)
+    sources = random_sources(10)
+    check_against_rebuild(cache, grid, sources)
+    sources.extend([sources[2], sources[2]])
+    check_against_rebuild(cache, grid, sources)
+    sources.remove(sources[2])
+    check_against_rebuild(cache, grid, sources)
+    assert cache.stats["rebuilds"] == 1
+
+
+def test_field_layer_cache_rebuilds(grid):
+    """
+    Check when the total is rebuilt instead of updated
+    """
+    easting, northing, profile = grid
+    cache = FieldLayerCache(max_updates=2, parallel=False)
+    sources = random_sources(10)
+    check_against_rebuild(cache, grid, sources)
+    # Changing the grid or the profile rebuilds the total
+    check_against_rebuild(cache, (easting[::2], northing, profile), sources)
+    assert cache.stats["rebuilds"] == 2
+    check_against_rebuild(cache, (easting[::2], northing, None), sources)
+    assert cache.stats["rebuilds"] == 3
+    assert cache.pending(easting, northing, as_columns(sources)) is None
+    # Replacing most of the point masses rebuilds the total
+    check_against_rebuild(cache, (easting, northing, None), sources)
+    sources = sources[:3] + random_sources(7, seed=1)
+    check_against_rebuild(cache, (easting, northing, None), sources)
+    assert cache.stats["rebuilds"] == 5
+    # Rebuilt after max_updates incremental updates
+    for seed in (2, 3, 4):
+        sources.append(random_sources(1, seed=seed)[0])
+        check_against_rebuild(cache, (easting, northing, None), sources)
+    assert cache.stats["rebuilds"] == 6
+
+
+def test_field_layer_cache_max_bytes(grid):
+    """
+    Check that the cached layers are evicted beyond max_bytes
+    """
+    easting, northing, profile = grid
+    layer_bytes = easting.size * northing.size * 8 + profile[0].size * 8
+    cache = FieldLayerCache(max_bytes=2 * layer_bytes, parallel=False)
+    sources = random_sources(10)
+    check_against_rebuild(cache, grid, sources)
+    for seed in (1, 2, 3):
+        sources.append(random_sources(1, seed=seed)[0])
+        check_against_rebuild(cache, grid, sources)
+    assert cache.stats["misses"] == 3
+    assert cache.stats["evictions"] == 1
+    assert cache.nbytes == 2 * layer_bytes
+    cache.clear()
+    assert cache.nbytes == 0
+    check_against_rebuild(cache, grid, sources)
+    assert cache.stats["rebuilds"] == 2
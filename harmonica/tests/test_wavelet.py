@@ -0,0 +1,139 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Test the wavelet-compressed sensitivity matrix.
+"""
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from .. import wavelet
+from ..wavelet import (
+    haar_transform,
+    inverse_haar_transform,
+    point_sensitivity_wavelet,
+)
+from .utils import dense_sensitivity, relative_error
+
+
+@pytest.fixture(name="mesh_model")
+def fixture_mesh_model():
+    """
+    Computation points above a regular mesh of point masses.
+
+    The mesh has sizes that aren't powers of two, so the transform pads it.
+    """
+    easting, northing = np.meshgrid(
+        np.linspace(-2e3, 2e3, 15), np.linspace(-2e3, 2e3, 13)
+    )
+    coordinates = (easting, northing, np.full_like(easting, 10.0))
+    points = np.meshgrid(
+        np.linspace(-1e3, 1e3, 10),
+        np.linspace(-1e3, 1e3, 6),
+        np.linspace(-900, -300, 3),
+        indexing="ij",
+    )
+    return coordinates, points
+
+
+def test_haar_transform_round_trip():
+    """
+    Check that the inverse transform recovers the original array
+    """
+    array = np.random.default_rng(0).normal(size=(2, 3, 6, 10))
+    levels = (1, 2, 3)
+    coefficients = haar_transform(array, levels)
+    npt.assert_allclose(
+        inverse_haar_transform(coefficients, levels, array.shape[1:]), array
+    )
+    # The transform is orthonormal
+    npt.assert_allclose(np.linalg.norm(coefficients), np.linalg.norm(array))
+
+
+@pytest.mark.parametrize("field", ("potential", "g_z", "g_nn"))
+def test_wavelet_matrix_lossless(mesh_model, field):
+    """
+    Check the products without dropping coefficients against the dense matrix
+    """
+    coordinates, points = mesh_model
+    matrix = point_sensitivity_wavelet(
+        coordinates, points, field, tolerance=0, chunk_size=50
+    )
+    dense = dense_sensitivity(coordinates, points, field)
+    assert matrix.shape == dense.shape
+    npt.assert_allclose(matrix.todense(), dense, rtol=1e-10, atol=0)
+    rng = np.random.default_rng(1)
+    masses = rng.uniform(-1e9, 1e9, dense.shape[1])
+    residuals = rng.normal(size=dense.shape[0])
+    assert relative_error(matrix.matvec(masses), dense @ masses) < 1e-12
+    assert relative_error(matrix @ masses, dense @ masses) < 1e-12
+    assert relative_error(matrix.rmatvec(residuals), dense.T @ residuals) < 1e-12
+
+
+def test_wavelet_matrix_tolerance(mesh_model):
+    """
+    Check that dropping coefficients keeps the error within its bound
+    """
+    coordinates, points = mesh_model
+    tolerance = 5e-2
+    matrix = point_sensitivity_wavelet(coordinates, points, "g_z", tolerance=tolerance)
+    dense = dense_sensitivity(coordinates, points, "g_z")
+    assert matrix.nnz < 0.6 * dense.size
+    masses = np.random.default_rng(2).uniform(1e8, 1e9, dense.shape[1])
+    # Error of each element bounded by tolerance * |row| * |masses|
+    bound = tolerance * np.linalg.norm(dense, axis=1) * np.linalg.norm(masses)
+    assert np.all(np.abs(matrix.matvec(masses) - dense @ masses) <= bound)
+    assert relative_error(matrix.todense(), dense) <= tolerance
+    residuals = np.ones(dense.shape[0])
+    npt.assert_allclose(matrix.rmatvec(residuals), matrix.todense().T @ residuals)
+
+
+def test_wavelet_matrix_chunks_from_bytes(mesh_model, monkeypatch):
+    """
+    Check that the chunks of rows fit in max_bytes and give the same matrix
+    """
+    coordinates, points = mesh_model
+    rows = []
+
+    def recording_transform(array, levels):
+        rows.append(array.shape[0])
+        return haar_transform(array, levels)
+
+    monkeypatch.setattr(wavelet, "haar_transform", recording_transform)
+    expected = point_sensitivity_wavelet(coordinates, points, "g_z", tolerance=1e-2)
+    assert rows == [coordinates[0].size]
+    # Padded mesh of 16 x 8 x 4 elements, 64 bytes each while thresholding
+    rows.clear()
+    matrix = point_sensitivity_wavelet(
+        coordinates, points, "g_z", tolerance=1e-2, max_bytes=10 * 512 * 64
+    )
+    assert max(rows) == 10
+    assert sum(rows) == coordinates[0].size
+    npt.assert_allclose(matrix.todense(), expected.todense())
+    # At least one row per chunk
+    rows.clear()
+    point_sensitivity_wavelet(coordinates, points, "g_z", max_bytes=1)
+    assert set(rows) == {1}
+
+
+def test_wavelet_matrix_invalid(mesh_model):
+    """
+    Check errors raised with invalid arguments
+    """
+    coordinates, points = mesh_model
+    with pytest.raises(ValueError, match="Invalid tolerance"):
+        point_sensitivity_wavelet(coordinates, points, "g_z", tolerance=1)
+    with pytest.raises(ValueError, match="mismatch the mesh shape"):
+        point_sensitivity_wavelet(coordinates, points, "g_z", shape=(2, 2, 2))
+    with pytest.raises(ValueError, match="Invalid chunk_size"):
+        point_sensitivity_wavelet(coordinates, points, "g_z", chunk_size=0)
+    matrix = point_sensitivity_wavelet(coordinates, points, "g_z")
+    with pytest.raises(ValueError, match="mismatch the number of columns"):
+        matrix.matvec(np.ones(3))
+    with pytest.raises(ValueError, match="mismatch the number of rows"):
+        matrix.rmatvec(np.ones(3))
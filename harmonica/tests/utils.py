@@ -0,0 +1,38 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Utilities shared by the tests.
+"""
+
+import numpy as np
+
+from ..point import point_gravity
+
+
+def dense_sensitivity(coordinates, points, field, coordinate_system="cartesian"):
+    """
+    Build the dense sensitivity matrix one point mass at a time.
+    """
+    points = tuple(np.ravel(i) for i in points[:3])
+    columns = [
+        point_gravity(
+            coordinates,
+            tuple(i[j : j + 1] for i in points),
+            [1.0],
+            field,
+            coordinate_system=coordinate_system,
+        ).ravel()
+        for j in range(points[0].size)
+    ]
+    return np.column_stack(columns)
+
+
+def relative_error(result, expected):
+    """
+    Compute the relative error between two arrays on the Frobenius norm.
+    """
+    return np.linalg.norm(result - expected) / np.linalg.norm(expected)
@@ -0,0 +1,420 @@
+# Copyright (c) 2018 The Harmonica Developers.
+# Distributed under the terms of the BSD 3-Clause License.
+# SPDX-License-Identifier: BSD-3-Clause
+#
+# This code is part of the Fatiando a Terra project (https://www.fatiando.org)
+#
+"""
+Wavelet-compressed representation of the point-mass sensitivity matrix.
+"""
+
+import numpy as np
+
+from .point import (
+    check_coordinate_system,
+    get_field_factor,
+    get_kernel,
+    prepare_sensitivity_coordinates,
+    sensitivity_dispatcher,
+)
+
+# Bytes of working memory per element of a chunk of rows: the dense block,
+# its padded wavelet coefficients and the arrays used to threshold them
+_CHUNK_BYTES_PER_ELEMENT = 64
+
+
+class WaveletMatrix:
+    """
+    Sensitivity matrix whose rows are stored as sparse Haar wavelet coefficients.
+
+    The rows of the matrix are transformed with an orthonormal 3-D Haar
+    wavelet transform over the mesh of point masses, so the product between a
+    row and a vector of masses equals the product between their wavelet
+    coefficients. Only the coefficients kept after thresholding are stored.
+
+    Don't create instances of this class directly, use
+    :func:`point_sensitivity_wavelet` instead.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Shape of the full matrix.
+    mesh_shape : tuple of int
+        Shape of the mesh of point masses.
+    levels : tuple of int
+        Number of levels of the wavelet transform along each axis of the mesh.
+    data : 1d-array
+        Wavelet coefficients kept on every row.
+    indices : 1d-array of int
+        Index of each coefficient in the wavelet domain.
+    indptr : 1d-array of int
+        Coefficients of the row ``i`` are stored in
+        ``data[indptr[i]:indptr[i + 1]]``.
+    """
+
+    def __init__(self, shape, mesh_shape, levels, data, indices, indptr):
+        self.shape = shape
+        self.mesh_shape = mesh_shape
+        self.levels = levels
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.dtype = data.dtype
+
+    @property
+    def nnz(self):
+        """
+        Number of stored wavelet coefficients.
+        """
+        return self.data.size
+
+    @property
+    def nbytes(self):
+        """
+        Number of bytes used to store the wavelet coefficients.
+        """
+        return self.data.nbytes + self.indices.nbytes + self.indptr.nbytes
+
+    @property
+    def compression_ratio(self):
+        """
+        Ratio between the memory needed by the dense matrix and this one.
+        """
+        dense_nbytes = self.shape[0] * self.shape[1] * self.dtype.itemsize
+        return dense_nbytes / max(self.nbytes, 1)
+
+    def _row_indices(self):
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def matvec(self, vector):
+        """
+        Compute the product between the matrix and a vector.
+
+        Parameters
+        ----------
+        vector : 1d-array
+            Vector with as many elements as columns has the matrix, e.g. the
+            masses of the point masses.
+
+        Returns
+        -------
+        result : 1d-array
+            Vector with as many elements as rows has the matrix, e.g. the field
+            on every computation point.
+        """
+        vector = np.asarray(vector).ravel()
+        if vector.size != self.shape[1]:
+            raise ValueError(
+                f"Number of elements in vector ({vector.size}) "
+                + f"mismatch the number of columns of the matrix ({self.shape[1]})"
+            )
+        coefficients = haar_transform(
+            vector.reshape(self.mesh_shape)[np.newaxis], self.levels
+        ).ravel()
+        return np.bincount(
+            self._row_indices(),
+            weights=self.data * coefficients[self.indices],
+            minlength=self.shape[0],
+        )
+
+    def rmatvec(self, vector):
+        """
+        Compute the product between the transpose of the matrix and a vector.
+
+        Parameters
+        ----------
+        vector : 1d-array
+            Vector with as many elements as rows has the matrix, e.g. the
+            residuals on every computation point.
+
+        Returns
+        -------
+        result : 1d-array
+            Vector with as many elements as columns has the matrix.
+        """
+        vector = np.asarray(vector).ravel()
+        if vector.size != self.shape[0]:
+            raise ValueError(
+                f"Number of elements in vector ({vector.size}) "
+                + f"mismatch the number of rows of the matrix ({self.shape[0]})"
+            )
+        padded_shape = _padded_shape(self.mesh_shape, self.levels)
+        coefficients = np.bincount(
+            self.indices,
+            weights=self.data * vector[self._row_indices()],
+            minlength=np.prod(padded_shape),
+        )
+        result = inverse_haar_transform(
+            coefficients.reshape((1, *padded_shape)), self.levels, self.mesh_shape
+        )
+        return result.ravel()
+
+    def __matmul__(self, vector):
+        return self.matvec(vector)
+
+    def dot(self, vector):
+        """
+        Compute the product between the matrix and a vector.
+
+        Same as :meth:`WaveletMatrix.matvec`.
+        """
+        return self.matvec(vector)
+
+    def todense(self):
+        """
+        Assemble the full matrix as a dense array.
+        """
+        padded_shape = _padded_shape(self.mesh_shape, self.levels)
+        coefficients = np.zeros((self.shape[0], np.prod(padded_shape)))
+        coefficients[self._row_indices(), self.indices] = self.data
+        rows = inverse_haar_transform(
+            coefficients.reshape((self.shape[0], *padded_shape)),
+            self.levels,
+            self.mesh_shape,
+        )
+        return rows.reshape(self.shape)
+
+
+def point_sensitivity_wavelet(
+    coordinates,
+    points,
+    field,
+    coordinate_system="cartesian",
+    shape=None,
+    tolerance=1e-3,
+    levels=None,
+    chunk_size=None,
+    max_bytes=256 * 2**20,
+    parallel=True,
+    dtype="float64",
+):
+    r"""
+    Build a wavelet-compressed sensitivity matrix for point masses on a mesh.
+
+    The sensitivity (or Jacobian) matrix relates the masses of the point
+    masses with the gravitational field they generate on the computation
+    points: its element :math:`(i, j)` is the ``field`` generated on the
+    :math:`i`-th computation point by a unit mass located on the :math:`j`-th
+    point mass, in the same units as :func:`harmonica.point.point_gravity`.
+
+    The point masses must be the nodes of a regular 3-D mesh. Every row of the
+    matrix is transformed into an orthonormal Haar wavelet basis over that
+    mesh and its smallest coefficients are dropped, keeping the relative
+    error of each row below ``tolerance``. Rows are computed in chunks that
+    take about ``max_bytes`` of working memory with the same kernels used by
+    :func:`harmonica.point.point_mass_cartesian` and
+    :func:`harmonica.point.point_mass_spherical`, so the dense matrix is never
+    held in memory.
+
+    Parameters
+    ----------
+    coordinates : list of arrays
+        Coordinates of the computation points, given as in
+        :func:`harmonica.point.point_gravity`.
+    points : list of arrays
+        Coordinates of the point masses, given as in
+        :func:`harmonica.point.point_gravity`. They must be the nodes of
+        a regular mesh, ordered so the arrays can be reshaped into ``shape``.
+    field : str
+        Gravitational field that wants to be computed. Same options as in
+        :func:`harmonica.point.point_gravity`.
+    coordinate_system : str (optional)
+        Coordinate system of the computation points and the point masses.
+        Available coordinates systems: ``cartesian``, ``spherical``.
+        Default ``cartesian``.
+    shape : tuple of int or None (optional)
+        Shape of the mesh of point masses. If None, the shape of the arrays in
+        ``points`` is used. Default None.
+    tolerance : float (optional)
+        Maximum relative error (in the Euclidean norm) on each row of the
+        matrix introduced by dropping wavelet coefficients. Default ``1e-3``.
+    levels : int or None (optional)
+        Maximum number of levels of the wavelet transform. If None, each axis
+        of the mesh is transformed until it can't be halved anymore.
+        Default None.
+    chunk_size : int or None (optional)
+        Number of rows computed and transformed at once. If None, it's chosen
+        so each chunk needs about ``max_bytes`` of working memory (at least
+        one row per chunk). Default None.
+    max_bytes : int (optional)
+        Working memory used to compute each chunk of rows when ``chunk_size``
+        is None. Default 256 MiB.
+    parallel : bool (optional)
+        If True the rows will be computed in parallel using Numba built-in
+        parallelization. Default True.
+    dtype : data-type (optional)
+        Data type of the stored coefficients. Default to ``np.float64``.
+
+    Returns
+    -------
+    matrix : :class:`WaveletMatrix`
+        Compressed sensitivity matrix, with ``matvec`` and ``rmatvec``
+        methods.
+
+    Notes
+    -----
+    Because the transform is orthonormal, the error of every element of
+    ``matrix.matvec(masses)`` is bounded by ``tolerance`` times the norm of
+    the corresponding row times the norm of ``masses``.
+    """
+    check_coordinate_system(
+        coordinate_system, valid_coord_systems=("cartesian", "spherical")
+    )
+    if not 0 <= tolerance < 1:
+        raise ValueError(
+            f"Invalid tolerance '{tolerance}'. It must be between 0 and 1."
+        )
+    if shape is None:
+        shape = np.shape(points[0])
+    shape = tuple(int(i) for i in shape)
+    if len(shape) == 2:
+        shape = (1, *shape)
+    if len(shape) != 3:
+        raise ValueError(f"Invalid mesh shape '{shape}'. It must have 3 dimensions.")
+    nsources = int(np.prod(shape))
+    if np.size(points[0]) != nsources:
+        raise ValueError(
+            f"Number of point masses ({np.size(points[0])}) "
+            + f"mismatch the mesh shape {shape}"
+        )
+    if levels is None:
+        levels = max(shape)
+    axis_levels = tuple(min(levels, int(np.log2(n))) if n > 1 else 0 for n in shape)
+    kernel = get_kernel(coordinate_system, field)
+    factor = get_field_factor(field)
+    function = sensitivity_dispatcher(coordinate_system, parallel)
+    stations = prepare_sensitivity_coordinates(coordinates, coordinate_system)
+    sources = prepare_sensitivity_coordinates(points, coordinate_system)
+    columns = np.arange(nsources)
+    nstations = stations[0].size
+    if chunk_size is None:
+        padded_size = int(np.prod(_padded_shape(shape, axis_levels)))
+        chunk_size = max(1, max_bytes // (padded_size * _CHUNK_BYTES_PER_ELEMENT))
+    if chunk_size < 1:
+        raise ValueError(f"Invalid chunk_size '{chunk_size}'. It must be positive.")
+    data, indices, counts = [], [], []
+    for start in range(0, nstations, chunk_size):
+        rows = np.arange(start, min(start + chunk_size, nstations))
+        block = np.empty((rows.size, nsources), dtype=np.float64)
+        function(*stations, *sources, rows, columns, block, kernel)
+        block *= factor
+        coefficients = haar_transform(block.reshape((rows.size, *shape)), axis_levels)
+        coefficients = coefficients.reshape(rows.size, -1)
+        chunk_data, chunk_indices, chunk_counts = _threshold(coefficients, tolerance)
+        data.append(chunk_data.astype(dtype))
+        indices.append(chunk_indices)
+        counts.append(chunk_counts)
+    counts = np.hstack(counts)
+    indptr = np.zeros(nstations + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    indices = np.hstack(indices)
+    index_dtype = np.int32 if indices.size and indices.max() < 2**31 else np.int64
+    return WaveletMatrix(
+        (nstations, nsources),
+        shape,
+        axis_levels,
+        np.hstack(data),
+        indices.astype(index_dtype),
+        indptr,
+    )
+
+
+def _threshold(coefficients, tolerance):
+    """
+    Drop the smallest coefficients of each row keeping its relative error.
+
+    Returns the kept coefficients, their indices and the number of
+    coefficients kept on each row.
+    """
+    energy = coefficients**2
+    order = np.argsort(energy, axis=1)
+    cumulative = np.cumsum(np.take_along_axis(energy, order, axis=1), axis=1)
+    budget = tolerance**2 * energy.sum(axis=1)
+    ndrop = (cumulative <= budget[:, np.newaxis]).sum(axis=1)
+    keep = np.arange(coefficients.shape[1]) >= ndrop[:, np.newaxis]
+    # Store the kept coefficients of each row sorted by index
+    kept_order = np.where(keep, order, coefficients.shape[1])
+    kept_order.sort(axis=1)
+    counts = coefficients.shape[1] - ndrop
+    rows = np.repeat(np.arange(coefficients.shape[0]), counts)
+    indices = kept_order[np.arange(coefficients.shape[1]) < counts[:, np.newaxis]]
+    return coefficients[rows, indices], indices, counts
+
+
+def _padded_shape(shape, levels):
+    """
+    Pad each axis to a multiple of 2 to the power of its number of levels.
+    """
+    return tuple(-(-n // 2**level) * 2**level for n, level in zip(shape, levels))
+
+
+def haar_transform(array, levels):
+    """
+    Compute the orthonormal 3-D Haar wavelet transform of a batch of arrays.
+
+    Parameters
+    ----------
+    array : 4d-array
+        Batch of 3-D arrays, with the batch on the first axis.
+    levels : tuple of int
+        Number of levels of the transform along each of the three axes.
+        Arrays are padded with zeros so every axis is divisible by 2 to the
+        power of its number of levels.
+
+    Returns
+    -------
+    coefficients : 4d-array
+        Wavelet coefficients of each array of the batch.
+    """
+    padded_shape = _padded_shape(array.shape[1:], levels)
+    result = np.zeros((array.shape[0], *padded_shape), dtype=np.float64)
+    result[(slice(None), *(slice(0, n) for n in array.shape[1:]))] = array
+    sizes = list(padded_shape)
+    for level in range(max(levels)):
+        for axis in range(3):
+            if level >= levels[axis]:
+                continue
+            low = tuple(slice(0, n) for n in sizes)
+            view = np.moveaxis(result[(slice(None), *low)], axis + 1, -1)
+            even, odd = view[..., 0::2], view[..., 1::2]
+            transformed = np.concatenate((even + odd, even - odd), axis=-1)
+            view[...] = transformed / np.sqrt(2)
+        sizes = [n // 2 if level < levels[i] else n for i, n in enumerate(sizes)]
+    return result
+
+
+def inverse_haar_transform(coefficients, levels, shape):
+    """
+    Compute the inverse of :func:`haar_transform`.
+
+    Parameters
+    ----------
+    coefficients : 4d-array
+        Batch of wavelet coefficients, with the batch on the first axis.
+    levels : tuple of int
+        Number of levels of the transform along each of the three axes.
+    shape : tuple of int
+        Shape of the original 3-D arrays, used to remove the padding.
+
+    Returns
+    -------
+    array : 4d-array
+        Batch of 3-D arrays.
+    """
+    result = np.array(coefficients, dtype=np.float64)
+    for level in reversed(range(max(levels))):
+        sizes = [
+            n // 2 ** min(level, levels[i]) for i, n in enumerate(result.shape[1:])
+        ]
+        for axis in reversed(range(3)):
+            if level >= levels[axis]:
+                continue
+            low = tuple(slice(0, n) for n in sizes)
+            view = np.moveaxis(result[(slice(None), *low)], axis + 1, -1)
+            half = view.shape[-1] // 2
+            approximation, detail = view[..., :half], view[..., half:]
+            even = (approximation + detail) / np.sqrt(2)
+            odd = (approximation - detail) / np.sqrt(2)
+            view[..., 0::2] = even
+            view[..., 1::2] = odd
+    return result[(slice(None), *(slice(0, n) for n in shape))]